@@ -1,7 +1,9 @@
 # -*- coding: utf-8 -*-
 from django.contrib import admin
 
-from .models import Transaction
+from .models import (
+    AccountSequence, AccountTxCursor, Transaction, TransactionStatusEvent
+)
 
 
 class TransactionAdmin(admin.ModelAdmin):
@@ -9,3 +11,21 @@ class TransactionAdmin(admin.ModelAdmin):
                     'currency', 'value', 'ledger_index', 'status')
 
 admin.site.register(Transaction, TransactionAdmin)
+
+
+class AccountTxCursorAdmin(admin.ModelAdmin):
+    list_display = ('account', 'ledger_index', 'ledger_index_min', 'updated')
+
+admin.site.register(AccountTxCursor, AccountTxCursorAdmin)
+
+
+class AccountSequenceAdmin(admin.ModelAdmin):
+    list_display = ('account', 'sequence', 'updated')
+
+admin.site.register(AccountSequence, AccountSequenceAdmin)
+
+
+class TransactionStatusEventAdmin(admin.ModelAdmin):
+    list_display = ('created', 'transaction', 'old_status', 'status')
+
+admin.site.register(TransactionStatusEvent, TransactionStatusEventAdmin)
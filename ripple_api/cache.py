@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+Short-lived caches of `book_offers` results and reserve parameters.
+"""
+
+# system imports:
+from collections import OrderedDict
+import threading
+import time
+
+# local imports:
+from .connection import get_setting
+
+
+DEFAULT_BOOK_CACHE_SIZE = 128
+# reserves change only by validators voting, every 256 ledgers at most
+DEFAULT_RESERVE_TTL = 600
+
+
+class _Entry(object):
+
+    def __init__(self, value, ledger_index, created):
+        self.value = value
+        self.ledger_index = ledger_index
+        self.created = created
+
+
+class _Pending(object):
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class LedgerCache(object):
+    """
+    Thread-safe LRU cache of rippled results that are valid within one
+    ledger.
+
+    An entry expires after `ttl` seconds or as soon as a newer ledger
+    than the one it was read from is observed with `observe_ledger`.
+    Concurrent misses of the same key are collapsed into one load.
+
+    Params:
+        `ttl`:
+            Seconds an entry is kept at most.
+
+        `maxsize`:
+            Maximum number of entries, least recently used ones are
+            evicted first.
+    """
+
+    def __init__(self, ttl, maxsize=DEFAULT_BOOK_CACHE_SIZE):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.ledger_index = None
+        self.hits = 0
+        self.misses = 0
+        self.collapsed = 0
+        self._entries = OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def observe_ledger(self, ledger_index):
+        """
+        Marks entries read from ledgers before `ledger_index` as stale.
+        """
+        if not ledger_index:
+            return
+        with self._lock:
+            if self.ledger_index is None or ledger_index > self.ledger_index:
+                self.ledger_index = ledger_index
+
+    def _fresh(self, entry, now):
+        if now - entry.created >= self.ttl:
+            return False
+        return entry.ledger_index is None or self.ledger_index is None or \
+            entry.ledger_index >= self.ledger_index
+
+    def get(self, key, load, get_ledger_index=None):
+        """
+        Returns cached value of `key` or the result of `load()`.
+
+        `get_ledger_index` takes loaded value and returns index of the
+        ledger it was read from.
+        """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None and self._fresh(entry, time.time()):
+                self._entries[key] = entry
+                self.hits += 1
+                return entry.value
+
+            pending = self._pending.get(key)
+            leader = pending is None
+            if leader:
+                pending = self._pending[key] = _Pending()
+                self.misses += 1
+            else:
+                self.collapsed += 1
+
+        if not leader:
+            pending.event.wait()
+            if pending.error is not None:
+                raise pending.error
+            return pending.value
+
+        try:
+            pending.value = load()
+        except Exception as e:
+            pending.error = e
+            raise
+        finally:
+            ledger_index = None
+            if pending.error is None and get_ledger_index is not None:
+                ledger_index = get_ledger_index(pending.value)
+            self.observe_ledger(ledger_index)
+            with self._lock:
+                del self._pending[key]
+                if pending.error is None:
+                    self._entries[key] = _Entry(
+                        pending.value, ledger_index, time.time())
+                    while len(self._entries) > self.maxsize:
+                        self._entries.popitem(last=False)
+            pending.event.set()
+
+        return pending.value
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'collapsed': self.collapsed,
+                'size': len(self._entries),
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_book_cache = None
+_book_cache_lock = threading.Lock()
+
+
+def get_book_cache():
+    """
+    Returns process-wide `book_offer` cache or None if it is disabled.
+    Configured with django settings:
+
+        * ``RIPPLE_API_BOOK_CACHE_TTL`` - seconds, cache is disabled if not
+          set
+        * ``RIPPLE_API_BOOK_CACHE_SIZE``
+    """
+    global _book_cache
+
+    if _book_cache is None:
+        ttl = get_setting('RIPPLE_API_BOOK_CACHE_TTL')
+        if not ttl:
+            return None
+        with _book_cache_lock:
+            if _book_cache is None:
+                _book_cache = LedgerCache(
+                    ttl, get_setting('RIPPLE_API_BOOK_CACHE_SIZE',
+                                     DEFAULT_BOOK_CACHE_SIZE))
+    return _book_cache
+
+
+_reserve_cache = None
+_reserve_cache_lock = threading.Lock()
+
+
+def get_reserve_cache():
+    """
+    Returns process-wide cache of account reserve parameters. Configured
+    with ``RIPPLE_API_RESERVE_TTL`` django setting.
+    """
+    global _reserve_cache
+
+    if _reserve_cache is None:
+        with _reserve_cache_lock:
+            if _reserve_cache is None:
+                _reserve_cache = LedgerCache(get_setting(
+                    'RIPPLE_API_RESERVE_TTL', DEFAULT_RESERVE_TTL))
+    return _reserve_cache
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+Non-blocking client for the functions of ``ripple_api.ripple_api``.
+"""
+
+# thirdparty imports:
+from concurrent.futures import ThreadPoolExecutor
+
+# local imports:
+from . import ripple_api
+from .connection import get_setting
+
+
+DEFAULT_MAX_WORKERS = 20
+
+
+class AsyncRippleClient(object):
+    """
+    Runs rippled calls in a thread pool and returns
+    ``concurrent.futures.Future`` objects instead of blocking the caller.
+
+    Every call goes through `call_api`, so servers are tried in the same
+    order, errors are raised as the same `RippleApiError` and requests
+    share keep-alive sessions and the per server concurrency limit
+    (``RIPPLE_API_SERVER_CONCURRENCY``) with the blocking functions.
+
+    Params:
+        `servers`, `server_url`, `api_user`, `api_password`, `timeout`:
+            Connection options passed to every call, as in `call_api`.
+
+        `max_workers`:
+            Maximum number of calls run at once. Defaults to
+            ``RIPPLE_API_CLIENT_MAX_WORKERS`` setting or 20.
+
+    Usage:
+
+        from concurrent.futures import as_completed
+
+        with AsyncRippleClient() as client:
+            futures = [client.balance(account, None, 'USD')
+                       for account in accounts]
+            for future in as_completed(futures):
+                print future.result()
+    """
+
+    def __init__(self, servers=None, server_url=None, api_user=None,
+                 api_password=None, timeout=5, max_workers=None):
+        self.connection = {
+            'servers': servers,
+            'server_url': server_url,
+            'api_user': api_user,
+            'api_password': api_password,
+            'timeout': timeout,
+        }
+        if max_workers is None:
+            max_workers = get_setting('RIPPLE_API_CLIENT_MAX_WORKERS',
+                                      DEFAULT_MAX_WORKERS)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+    def close(self, wait=True):
+        """
+        Stops accepting new calls, waiting for running ones if `wait`.
+        """
+        self._executor.shutdown(wait=wait)
+
+    def run(self, func, *args, **kwargs):
+        """
+        Schedules ``func(*args, **kwargs)`` with client connection options
+        and returns its future.
+        """
+        for key, value in self.connection.items():
+            kwargs.setdefault(key, value)
+        return self._executor.submit(func, *args, **kwargs)
+
+    def call_api(self, data, **kwargs):
+        return self.run(ripple_api.call_api, data, **kwargs)
+
+    def account_info(self, account, **kwargs):
+        return self.run(ripple_api.account_info, account, **kwargs)
+
+    def account_tx(self, account, **kwargs):
+        return self.run(ripple_api.account_tx, account, **kwargs)
+
+    def tx(self, transaction_id, **kwargs):
+        return self.run(ripple_api.tx, transaction_id, **kwargs)
+
+    def path_find(self, account, destination, amount, **kwargs):
+        return self.run(ripple_api.path_find, account, destination, amount,
+                        **kwargs)
+
+    def sign(self, account, secret, destination, amount, **kwargs):
+        return self.run(ripple_api.sign, account, secret, destination,
+                        amount, **kwargs)
+
+    def submit(self, tx_blob, **kwargs):
+        return self.run(ripple_api.submit, tx_blob, **kwargs)
+
+    def balance(self, account, issuers, currency, **kwargs):
+        return self.run(ripple_api.balance, account, issuers, currency,
+                        **kwargs)
+
+    def balances(self, account, **kwargs):
+        return self.run(ripple_api.balances, account, **kwargs)
+
+    def is_trust_set(self, trusts, peer, **kwargs):
+        return self.run(ripple_api.is_trust_set, trusts, peer, **kwargs)
+
+    def book_offer(self, taker_pays_curr, taker_pays_curr_issuer,
+                   taker_gets_curr, taker_gets_curr_issuer, **kwargs):
+        return self.run(ripple_api.book_offer, taker_pays_curr,
+                        taker_pays_curr_issuer, taker_gets_curr,
+                        taker_gets_curr_issuer, **kwargs)
+
@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+"""
+Tracking of submitted transactions until they are validated.
+
+Instead of a worker sleeping between `tx` polls of its own transaction,
+transactions are registered with a `ConfirmationTracker` which checks all
+of them at once and completes their futures.
+"""
+
+# system imports:
+import logging
+import threading
+import time
+
+# thirdparty imports:
+from concurrent.futures import Future
+
+# local imports:
+from .ripple_api import RippleApiError, tx_many, validated_ledger_index
+
+
+# seconds, about one ledger close
+DEFAULT_POLL_INTERVAL = 4
+
+logger = logging.getLogger(__name__)
+
+
+class _Pending(object):
+
+    def __init__(self, last_ledger_sequence, deadline=None):
+        self.future = Future()
+        self.last_ledger_sequence = last_ledger_sequence
+        # time after which the transaction is not tracked, None for never
+        self.deadline = deadline
+
+
+class ConfirmationTracker(object):
+    """
+    Resolves futures of submitted transactions in bulk.
+
+    Every poll checks all tracked transactions with one batch of `tx` calls.
+    A future gets `tx` result as soon as the transaction is in a validated
+    ledger, or ``RippleApiError('txnExpired', ...)`` once a validated ledger
+    is past its ``LastLedgerSequence`` and it still is not validated.
+
+    Polls are made by a background thread, which runs only while there are
+    tracked transactions. `observe_ledger` wakes it up when a new ledger
+    is validated, e.g. from the ledger stream.
+
+    Params:
+        `servers`, `server_url`, `api_user`, `api_password`, `timeout`:
+            Connection options, as in `call_api`.
+
+        `poll_interval`:
+            Seconds between polls. None to poll only when `poll` is called.
+    """
+
+    def __init__(self, servers=None, server_url=None, api_user=None,
+                 api_password=None, timeout=5,
+                 poll_interval=DEFAULT_POLL_INTERVAL):
+        self.connection = {
+            'servers': servers,
+            'server_url': server_url,
+            'api_user': api_user,
+            'api_password': api_password,
+            'timeout': timeout,
+        }
+        self.poll_interval = poll_interval
+        self.ledger_index = None
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def track(self, tx_hash, last_ledger_sequence=None, callback=None,
+              timeout=None):
+        """
+        Starts tracking transaction `tx_hash` and returns its
+        ``concurrent.futures.Future``. `callback` is called with the future
+        when it is done. After `timeout` seconds the transaction is
+        untracked by the next poll, unless it is tracked without timeout
+        too.
+        """
+        deadline = time.time() + timeout if timeout is not None else None
+        with self._lock:
+            pending = self._pending.get(tx_hash)
+            if pending is None:
+                pending = self._pending[tx_hash] = _Pending(
+                    last_ledger_sequence, deadline)
+            else:
+                if last_ledger_sequence:
+                    pending.last_ledger_sequence = last_ledger_sequence
+                if deadline is None or pending.deadline is None:
+                    pending.deadline = None
+                else:
+                    pending.deadline = max(pending.deadline, deadline)
+            self._start()
+
+        if callback is not None:
+            pending.future.add_done_callback(callback)
+        return pending.future
+
+    def untrack(self, tx_hash):
+        """
+        Stops tracking transaction `tx_hash`, its future is cancelled.
+        """
+        with self._lock:
+            pending = self._pending.pop(tx_hash, None)
+        if pending is not None:
+            pending.future.cancel()
+
+    def pending(self):
+        """
+        Returns hashes of tracked transactions.
+        """
+        with self._lock:
+            return list(self._pending)
+
+    def observe_ledger(self, ledger_index):
+        """
+        Tells that ledger `ledger_index` is validated.
+        """
+        if self._update_ledger_index(ledger_index):
+            self._wakeup.set()
+
+    def _update_ledger_index(self, ledger_index):
+        with self._lock:
+            if self.ledger_index is None or ledger_index > self.ledger_index:
+                self.ledger_index = ledger_index
+            return bool(self._pending)
+
+    def poll(self):
+        """
+        Checks all tracked transactions and resolves validated and expired
+        ones, transactions past their `track` timeout are untracked.
+        Returns number of resolved transactions.
+        """
+        now = time.time()
+        with self._lock:
+            expired = [self._pending.pop(tx_hash)
+                       for tx_hash, item in self._pending.items()
+                       if item.deadline is not None and item.deadline <= now]
+            pending = dict(self._pending)
+        # callbacks are called outside of the lock
+        for item in expired:
+            item.future.cancel()
+        if not pending:
+            return 0
+
+        if any(item.last_ledger_sequence for item in pending.values()):
+            self._update_ledger_index(
+                validated_ledger_index(**self.connection))
+        # read before `tx` calls, so transactions validated meanwhile are
+        # not taken for expired
+        ledger_index = self.ledger_index
+
+        responses = tx_many(list(pending), **self.connection)
+
+        resolved = 0
+        for tx_hash, response in responses.items():
+            last_ledger_sequence = pending[tx_hash].last_ledger_sequence
+            if isinstance(response, RippleApiError):
+                if response.error != 'txnNotFound':
+                    logger.error('Unable to check %s: %s', tx_hash, response)
+                    continue
+            elif response.get('validated'):
+                resolved += self._resolve(tx_hash, result=response)
+                continue
+
+            if last_ledger_sequence and ledger_index is not None and \
+                    ledger_index > last_ledger_sequence:
+                resolved += self._resolve(tx_hash, error=RippleApiError(
+                    'txnExpired', '',
+                    'Not validated by ledger %s' % last_ledger_sequence))
+        return resolved
+
+    def _resolve(self, tx_hash, result=None, error=None):
+        with self._lock:
+            pending = self._pending.pop(tx_hash, None)
+        if pending is None:
+            return 0
+        if error is not None:
+            pending.future.set_exception(error)
+        else:
+            pending.future.set_result(result)
+        return 1
+
+    def _start(self):
+        if self._thread is None and self.poll_interval is not None:
+            self._thread = threading.Thread(target=self._run,
+                                            name='ConfirmationTracker')
+            self._thread.daemon = True
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+            try:
+                self.poll()
+            except Exception:
+                logger.exception('Confirmation poll failed')
+            with self._lock:
+                if not self._pending:
+                    self._thread = None
+                    return
+
+
+_trackers = {}
+_trackers_lock = threading.Lock()
+
+
+def get_confirmation_tracker(servers=None, timeout=5):
+    """
+    Returns process-wide confirmation tracker for `servers`.
+
+    `timeout` of its requests is set only when the tracker is created, the
+    next calls get the same tracker whatever `timeout` they pass.
+    """
+    key = tuple(server.get('RIPPLE_API_URL') for server in servers or ())
+    with _trackers_lock:
+        tracker = _trackers.get(key)
+        if tracker is None:
+            tracker = _trackers[key] = ConfirmationTracker(
+                servers=servers, timeout=timeout)
+    return tracker
+
+
+def observe_ledger(ledger_index):
+    """
+    Tells every confirmation tracker of the process that ledger
+    `ledger_index` is validated.
+    """
+    with _trackers_lock:
+        trackers = list(_trackers.values())
+    for tracker in trackers:
+        tracker.observe_ledger(ledger_index)
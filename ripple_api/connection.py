@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+"""
+Keep-alive HTTP sessions used to talk to rippled servers.
+
+Every rippled url gets its own ``requests.Session`` so that consecutive
+JSON-RPC calls reuse already opened TCP/TLS connections instead of doing a
+handshake per request.
+"""
+
+# system imports:
+from collections import deque
+import threading
+import time
+
+# thirdparty imports:
+import requests
+from requests.adapters import HTTPAdapter
+
+
+DEFAULT_POOL_CONNECTIONS = 10
+DEFAULT_POOL_MAXSIZE = 10
+DEFAULT_KEEP_ALIVE = True
+DEFAULT_CONNECTION_LIFETIME = 300
+DEFAULT_SERVER_CONCURRENCY = None
+LATENCY_SAMPLES = 100
+LATENCY_MIN_SAMPLES = 20
+
+
+def get_setting(name, default=None):
+    """
+    Returns django setting `name` or `default` if django is not available
+    or not configured.
+    """
+    try:
+        from django.conf import settings
+        from django.core.exceptions import ImproperlyConfigured
+    except ImportError:
+        return default
+
+    try:
+        return getattr(settings, name, default)
+    except ImproperlyConfigured:
+        return default
+
+
+class SessionPool(object):
+    """
+    Thread-safe registry of keep-alive sessions, one per server url.
+
+    Params:
+        `pool_connections`:
+            Number of connection pools cached by the session adapter.
+
+        `pool_maxsize`:
+            Maximum number of connections kept open per server.
+
+        `keep_alive`:
+            False, to close connection after every request.
+
+        `lifetime`:
+            Seconds after which session is dropped and its connections are
+            reopened. None or 0 to keep sessions forever.
+
+        `session_factory`:
+            Callable that returns new session-like object with `post`
+            and `close` methods. Allows to plug another transport.
+
+        `server_concurrency`:
+            Maximum number of requests in flight per server, shared by all
+            threads. None for no limit.
+    """
+
+    def __init__(self, pool_connections=DEFAULT_POOL_CONNECTIONS,
+                 pool_maxsize=DEFAULT_POOL_MAXSIZE,
+                 keep_alive=DEFAULT_KEEP_ALIVE,
+                 lifetime=DEFAULT_CONNECTION_LIFETIME,
+                 session_factory=None,
+                 server_concurrency=DEFAULT_SERVER_CONCURRENCY):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.keep_alive = keep_alive
+        self.lifetime = lifetime
+        self.session_factory = session_factory or self._create_session
+        self.server_concurrency = server_concurrency
+        self._sessions = {}
+        self._limiters = {}
+        self._lock = threading.Lock()
+
+    def _create_session(self):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.pool_connections,
+                              pool_maxsize=self.pool_maxsize)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        if not self.keep_alive:
+            session.headers['Connection'] = 'close'
+        return session
+
+    def get(self, url):
+        """
+        Returns session for `url`, creating it if there is no session yet
+        or the existing one has outlived its lifetime.
+        """
+        now = time.time()
+
+        with self._lock:
+            session, created = self._sessions.get(url, (None, None))
+            # expired session is not closed, other threads may still be
+            # sending requests with it. Its connections are closed once it
+            # is garbage collected.
+            if session is not None and self.lifetime and \
+                    now - created >= self.lifetime:
+                session = None
+            if session is None:
+                session = self.session_factory()
+                self._sessions[url] = (session, now)
+
+        return session
+
+    def limiter(self, url):
+        """
+        Returns context manager that limits number of concurrent requests
+        to `url`.
+        """
+        if not self.server_concurrency:
+            return _no_limit
+
+        with self._lock:
+            limiter = self._limiters.get(url)
+            if limiter is None:
+                limiter = threading.BoundedSemaphore(self.server_concurrency)
+                self._limiters[url] = limiter
+        return limiter
+
+    def close(self):
+        """
+        Closes all sessions and their connections.
+        """
+        with self._lock:
+            sessions = [session for session, _ in self._sessions.values()]
+            self._sessions = {}
+
+        for session in sessions:
+            session.close()
+
+
+class LatencyStats(object):
+    """
+    Thread-safe window of the last response times of every server url.
+    """
+
+    def __init__(self, size=LATENCY_SAMPLES, min_samples=LATENCY_MIN_SAMPLES):
+        self.size = size
+        self.min_samples = min_samples
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def add(self, url, seconds):
+        with self._lock:
+            samples = self._samples.get(url)
+            if samples is None:
+                samples = self._samples[url] = deque(maxlen=self.size)
+            samples.append(seconds)
+
+    def percentile(self, url, percentile, default=None):
+        """
+        Returns `percentile` (0-100) of recent response times of `url`
+        or `default` if there are not enough samples yet.
+        """
+        with self._lock:
+            samples = sorted(self._samples.get(url, ()))
+
+        if len(samples) < self.min_samples:
+            return default
+        index = int(round(percentile / 100.0 * (len(samples) - 1)))
+        return samples[index]
+
+    def clear(self):
+        with self._lock:
+            self._samples = {}
+
+
+latency_stats = LatencyStats()
+
+
+class _NoLimit(object):
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_no_limit = _NoLimit()
+
+_session_pool = None
+_session_pool_lock = threading.Lock()
+
+
+def get_session_pool():
+    """
+    Returns process-wide session pool configured from django settings:
+
+        * ``RIPPLE_API_POOL_CONNECTIONS``
+        * ``RIPPLE_API_POOL_MAXSIZE``
+        * ``RIPPLE_API_KEEP_ALIVE``
+        * ``RIPPLE_API_CONNECTION_LIFETIME``
+        * ``RIPPLE_API_SERVER_CONCURRENCY``
+    """
+    global _session_pool
+
+    if _session_pool is None:
+        with _session_pool_lock:
+            if _session_pool is None:
+                _session_pool = SessionPool(
+                    pool_connections=get_setting(
+                        'RIPPLE_API_POOL_CONNECTIONS',
+                        DEFAULT_POOL_CONNECTIONS),
+                    pool_maxsize=get_setting(
+                        'RIPPLE_API_POOL_MAXSIZE', DEFAULT_POOL_MAXSIZE),
+                    keep_alive=get_setting(
+                        'RIPPLE_API_KEEP_ALIVE', DEFAULT_KEEP_ALIVE),
+                    lifetime=get_setting(
+                        'RIPPLE_API_CONNECTION_LIFETIME',
+                        DEFAULT_CONNECTION_LIFETIME),
+                    server_concurrency=get_setting(
+                        'RIPPLE_API_SERVER_CONCURRENCY',
+                        DEFAULT_SERVER_CONCURRENCY),
+                )
+    return _session_pool
+
+
+def set_session_pool(pool):
+    """
+    Replaces process-wide session pool, e.g. with one that uses custom
+    `session_factory`. Previous pool is closed.
+    """
+    global _session_pool
+
+    with _session_pool_lock:
+        previous, _session_pool = _session_pool, pool
+
+    if previous is not None and previous is not pool:
+        previous.close()
+
+
+def get_session(url):
+    """
+    Returns keep-alive session for rippled `url`.
+    """
+    return get_session_pool().get(url)
+
+
+def server_limiter(url):
+    """
+    Returns context manager that limits concurrent requests to `url`.
+    """
+    return get_session_pool().limiter(url)
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+Transaction fee estimation.
+
+Instead of a fixed fee, transactions are built with the fee rippled
+currently asks for to get into the open ledger, as reported by its ``fee``
+method. Results are cached for a few seconds, so a burst of transactions
+costs one request.
+"""
+
+# system imports:
+from decimal import Decimal, ROUND_UP
+import logging
+import threading
+
+# local imports:
+from .cache import LedgerCache
+from .connection import get_setting
+
+
+# drops, the fee used before estimation and the default cap
+DEFAULT_FEE = 10000
+DEFAULT_FEE_TTL = 10
+DEFAULT_FEE_POLICY = 'open_ledger'
+
+# policy name -> field of ``drops`` in `fee` result
+FEE_POLICIES = {
+    # lowest fee to get into the queue when the open ledger is full
+    'minimum': 'minimum_fee',
+    # lowest fee to get into the open ledger right away
+    'open_ledger': 'open_ledger_fee',
+    # fee paid by transactions in the last validated ledger
+    'median': 'median_fee',
+}
+
+logger = logging.getLogger(__name__)
+
+
+class FeeOracle(object):
+    """
+    Picks fees from results of rippled ``fee`` method.
+
+    Params:
+        `ttl`:
+            Seconds a `fee` result is used for.
+
+        `policy`:
+            One of `FEE_POLICIES`, which fee level of the open ledger to pay.
+
+        `multiplier`:
+            Factor the fee of the level is multiplied by, e.g. 1.2 to stay
+            above it while the load grows.
+
+        `max_fee`:
+            Cap in drops. Also used when the fee can't be read from rippled.
+    """
+
+    def __init__(self, ttl=DEFAULT_FEE_TTL, policy=DEFAULT_FEE_POLICY,
+                 multiplier=1, max_fee=DEFAULT_FEE):
+        if policy not in FEE_POLICIES:
+            raise ValueError('Unknown fee policy: %s' % policy)
+        self.policy = policy
+        self.multiplier = Decimal(str(multiplier))
+        self.max_fee = int(max_fee)
+        self.cache = LedgerCache(ttl)
+
+    def choose(self, result):
+        """
+        Returns fee in drops for `fee` method `result`.
+        """
+        drops = Decimal(result['drops'][FEE_POLICIES[self.policy]])
+        fee = int((drops * self.multiplier).to_integral_value(ROUND_UP))
+        return min(fee, self.max_fee)
+
+    def fee(self, key, load):
+        """
+        Returns fee in drops. `load()` makes `fee` request, its result is
+        cached by `key`, e.g. servers it was sent to.
+        """
+        def load_fee():
+            result = load()
+            return self.choose(result), result.get('ledger_current_index')
+
+        try:
+            fee, ledger_index = self.cache.get(key, load_fee, _ledger_index)
+        except Exception, e:
+            logger.warning('Unable to estimate fee, using %s drops: %s',
+                           self.max_fee, e)
+            return self.max_fee
+        return fee
+
+
+def _ledger_index(value):
+    return value[1]
+
+
+_fee_oracle = None
+_fee_oracle_lock = threading.Lock()
+
+
+def get_fee_oracle():
+    """
+    Returns process-wide fee oracle. Configured with django settings:
+
+        * ``RIPPLE_API_FEE_TTL``
+        * ``RIPPLE_API_FEE_POLICY``
+        * ``RIPPLE_API_FEE_MULTIPLIER``
+        * ``RIPPLE_API_MAX_FEE``
+    """
+    global _fee_oracle
+
+    if _fee_oracle is None:
+        with _fee_oracle_lock:
+            if _fee_oracle is None:
+                _fee_oracle = FeeOracle(
+                    ttl=get_setting('RIPPLE_API_FEE_TTL', DEFAULT_FEE_TTL),
+                    policy=get_setting('RIPPLE_API_FEE_POLICY',
+                                       DEFAULT_FEE_POLICY),
+                    multiplier=get_setting('RIPPLE_API_FEE_MULTIPLIER', 1),
+                    max_fee=get_setting('RIPPLE_API_MAX_FEE', DEFAULT_FEE))
+    return _fee_oracle
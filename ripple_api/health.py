@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+"""
+Per-process health tracking of rippled servers.
+
+`call_api` reports every request outcome here and asks for the order in
+which configured servers should be tried.
+"""
+
+# system imports:
+import threading
+import time
+
+# local imports:
+from .connection import get_setting
+
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+DEFAULT_ALPHA = 0.2
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RESET_TIMEOUT = 30
+DEFAULT_MAX_LEDGER_LAG = 3
+# ledger indexes observed earlier than that are not used for lag check
+LEDGER_INDEX_TTL = 60
+# seconds added to server score for 100% error rate
+ERROR_PENALTY = 5
+
+# rippled errors which mean the server itself is not able to answer
+SERVER_ERRORS = frozenset([
+    'amendmentBlocked', 'noClosed', 'noCurrent', 'noNetwork', 'notReady',
+    'notSynced', 'slowDown', 'tooBusy',
+])
+
+
+class ServerHealth(object):
+    """
+    Health figures of one server.
+    """
+
+    def __init__(self):
+        self.latency = None
+        self.error_rate = 0.0
+        self.failures = 0
+        self.state = CLOSED
+        self.opened_at = None
+        self.probe_started_at = None
+        self.ledger_index = None
+        self.ledger_observed_at = None
+
+
+class HealthTracker(object):
+    """
+    Thread-safe registry of `ServerHealth` per server url.
+
+    Params:
+        `alpha`:
+            Weight of the newest sample in latency and error rate moving
+            averages.
+
+        `failure_threshold`:
+            Number of consecutive failures that opens server circuit.
+            Requests are not sent to a server with open circuit while
+            others are available.
+
+        `reset_timeout`:
+            Seconds after which one probe request is let through an open
+            circuit (half-open state). Success closes the circuit.
+
+        `max_ledger_lag`:
+            Server whose ``ledger_current_index`` is behind the best known
+            one by more than this number of ledgers is tried after
+            servers that are in sync.
+    """
+
+    def __init__(self, alpha=DEFAULT_ALPHA,
+                 failure_threshold=DEFAULT_FAILURE_THRESHOLD,
+                 reset_timeout=DEFAULT_RESET_TIMEOUT,
+                 max_ledger_lag=DEFAULT_MAX_LEDGER_LAG):
+        self.alpha = alpha
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_ledger_lag = max_ledger_lag
+        self._servers = {}
+        self._lock = threading.Lock()
+
+    def _get(self, url):
+        health = self._servers.get(url)
+        if health is None:
+            health = self._servers[url] = ServerHealth()
+        return health
+
+    def _average(self, average, value):
+        if average is None:
+            return value
+        return self.alpha * value + (1 - self.alpha) * average
+
+    def record_success(self, url, latency, ledger_index=None):
+        with self._lock:
+            health = self._get(url)
+            health.latency = self._average(health.latency, latency)
+            health.error_rate = self._average(health.error_rate, 0.0)
+            health.failures = 0
+            health.state = CLOSED
+            health.probe_started_at = None
+            if ledger_index:
+                health.ledger_index = ledger_index
+                health.ledger_observed_at = time.time()
+
+    def record_failure(self, url):
+        with self._lock:
+            health = self._get(url)
+            health.error_rate = self._average(health.error_rate, 1.0)
+            health.failures += 1
+            health.probe_started_at = None
+            if health.state == HALF_OPEN or \
+                    health.failures >= self.failure_threshold:
+                health.state = OPEN
+                health.opened_at = time.time()
+
+    def _best_ledger_index(self, now):
+        indexes = [
+            health.ledger_index for health in self._servers.values()
+            if health.ledger_index and
+            now - health.ledger_observed_at < LEDGER_INDEX_TTL
+        ]
+        return max(indexes) if indexes else None
+
+    def _ledger_lag(self, health, best, now):
+        if best is None or not health.ledger_index or \
+                now - health.ledger_observed_at >= LEDGER_INDEX_TTL:
+            return None
+        return best - health.ledger_index
+
+    def _available(self, health, now):
+        if health.state == CLOSED:
+            return True
+        if health.state == OPEN and \
+                now - health.opened_at >= self.reset_timeout:
+            health.state = HALF_OPEN
+        # one probe at a time, a lost probe is retried after reset timeout
+        return health.state == HALF_OPEN and (
+            health.probe_started_at is None or
+            now - health.probe_started_at >= self.reset_timeout)
+
+    def _score(self, health):
+        return (health.latency or 0.0) + ERROR_PENALTY * health.error_rate
+
+    def order(self, servers):
+        """
+        Returns `servers` ordered from the healthiest one. Servers with
+        open circuit are left out unless no other server is available.
+        """
+        now = time.time()
+        available = []
+        unavailable = []
+
+        with self._lock:
+            best = self._best_ledger_index(now)
+            for position, server_config in enumerate(servers):
+                health = self._get(server_config.get('RIPPLE_API_URL', ''))
+                lag = self._ledger_lag(health, best, now)
+                lagging = lag is not None and lag > self.max_ledger_lag
+                key = (lagging, self._score(health), position)
+                if self._available(health, now):
+                    available.append((key, server_config, health))
+                else:
+                    unavailable.append((key, server_config, health))
+
+            if not available:
+                return [server_config for _, server_config, _ in
+                        sorted(unavailable, key=lambda item: item[0])]
+
+            available.sort(key=lambda item: item[0])
+            for _, _, health in available:
+                if health.state == HALF_OPEN:
+                    health.probe_started_at = now
+            return [server_config for _, server_config, _ in available]
+
+    def ledger_index(self, max_age=LEDGER_INDEX_TTL):
+        """
+        Returns the highest ``ledger_current_index`` seen in the last
+        `max_age` seconds or None.
+        """
+        now = time.time()
+        with self._lock:
+            indexes = [
+                health.ledger_index for health in self._servers.values()
+                if health.ledger_index and
+                now - health.ledger_observed_at < max_age
+            ]
+        return max(indexes) if indexes else None
+
+    def snapshot(self):
+        """
+        Returns dict of server url to its health figures, e.g. for metrics.
+        """
+        now = time.time()
+        with self._lock:
+            best = self._best_ledger_index(now)
+            return dict(
+                (url, {
+                    'state': health.state,
+                    'latency': health.latency,
+                    'error_rate': health.error_rate,
+                    'failures': health.failures,
+                    'ledger_index': health.ledger_index,
+                    'ledger_lag': self._ledger_lag(health, best, now),
+                    'score': self._score(health),
+                })
+                for url, health in self._servers.items()
+            )
+
+    def reset(self):
+        with self._lock:
+            self._servers = {}
+
+
+_health_tracker = None
+_health_tracker_lock = threading.Lock()
+
+
+def get_health_tracker():
+    """
+    Returns process-wide health tracker configured from django settings:
+
+        * ``RIPPLE_API_HEALTH_FAILURE_THRESHOLD``
+        * ``RIPPLE_API_HEALTH_RESET_TIMEOUT``
+        * ``RIPPLE_API_HEALTH_MAX_LEDGER_LAG``
+    """
+    global _health_tracker
+
+    if _health_tracker is None:
+        with _health_tracker_lock:
+            if _health_tracker is None:
+                _health_tracker = HealthTracker(
+                    failure_threshold=get_setting(
+                        'RIPPLE_API_HEALTH_FAILURE_THRESHOLD',
+                        DEFAULT_FAILURE_THRESHOLD),
+                    reset_timeout=get_setting(
+                        'RIPPLE_API_HEALTH_RESET_TIMEOUT',
+                        DEFAULT_RESET_TIMEOUT),
+                    max_ledger_lag=get_setting(
+                        'RIPPLE_API_HEALTH_MAX_LEDGER_LAG',
+                        DEFAULT_MAX_LEDGER_LAG),
+                )
+    return _health_tracker
+
+
+def servers_health():
+    """
+    Returns health figures of every server seen by this process.
+    """
+    return get_health_tracker().snapshot()
@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+from django.conf import settings
+from django.core.management import BaseCommand
+
+from ripple_api.management.transaction_stream import TransactionStream
+
+
+class Command(BaseCommand):
+    help = 'Long running command that stores incoming transactions ' \
+           'as they are validated.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url', dest='url', default=None,
+            help='rippled WebSocket url, default is RIPPLE_WEBSOCKET_URL')
+
+    def handle(self, **options):
+        TransactionStream(settings.RIPPLE_ACCOUNT, url=options['url']).run()
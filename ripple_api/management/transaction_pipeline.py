@@ -0,0 +1,315 @@
+# -*- coding: utf-8 -*-
+"""
+Stages of transaction processing.
+
+Every stage takes a batch size and a time budget in seconds and returns
+number of transactions it handled, so the stages may be run one by one by
+`process_transactions`, scheduled separately as celery tasks, or looped by
+`Pipeline`.
+"""
+from collections import OrderedDict
+import datetime
+import logging
+import time
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from ripple_api.connection import get_setting
+from ripple_api.models import Transaction
+from ripple_api.ripple_api import tx_many
+from ripple_api.tasks import sign_batch_task, submit_batch_task
+from ripple_api.management.transaction_processors import (
+    check_submitted_transaction,
+    claim_transactions,
+    dispatch_status_events,
+    last_validated_ledger_index,
+    monitor_transactions,
+    format_log_message
+)
+
+
+# seconds the daemon sleeps at most between runs of an idle stage
+DEFAULT_MAX_SLEEP = 60
+# seconds after which transactions created by retry and return stages but
+# not signed, e.g. because the process was stopped, are signed again
+CREATED_MAX_AGE = 300
+
+# `interval` is the delay in seconds between runs of a stage which found
+# work, it grows up to `DEFAULT_MAX_SLEEP` while the stage is idle
+DEFAULT_STAGE_OPTIONS = {
+    'retry': {'batch_size': 100, 'time_budget': 60, 'interval': 60},
+    'monitor': {'batch_size': 200, 'time_budget': 270, 'interval': 10},
+    'return': {'batch_size': 100, 'time_budget': 60, 'interval': 10},
+    'submit': {'batch_size': 100, 'time_budget': 60, 'interval': 5},
+    'check': {'batch_size': 200, 'time_budget': 60, 'interval': 10},
+    'signals': {'batch_size': 200, 'time_budget': 60, 'interval': 1},
+}
+
+logger = logging.getLogger('ripple')
+
+
+def retry_failed_transactions(batch_size, time_budget):
+    logger.info('Retrying failed transactions')
+    deadline = time.time() + time_budget
+    count = sign_created_transactions(batch_size)
+    # retries failing now are retried by the next run
+    max_pk = Transaction.objects.filter(
+        status=Transaction.FAILURE
+    ).aggregate(Max('pk'))['pk__max']
+    last_pk = 0
+    while max_pk is not None and time.time() < deadline:
+        with claim_transactions(Transaction.FAILURE, last_pk, batch_size,
+                                max_pk) as failed_transactions:
+            if not failed_transactions:
+                break
+            last_pk = failed_transactions[-1].pk
+            retry_transactions = []
+            for transaction in failed_transactions:
+                logger.info(format_log_message('Found %s', transaction))
+
+                retry_transaction = Transaction.objects.create(
+                    account=transaction.account,
+                    destination=transaction.destination,
+                    currency=transaction.currency,
+                    value=transaction.value,
+                    status=Transaction.CREATED,
+                    parent=transaction.parent
+                )
+                retry_transactions.append(retry_transaction.pk)
+                logger.info(
+                    "New transaction created for returning %s",
+                    retry_transaction.pk
+                )
+                Transaction.objects.set_status(
+                    transaction, Transaction.FAIL_FIXED)
+                logger.info("Fixed the transaction")
+        # signed once the claim is committed, so that no rows are locked
+        # while rippled is asked
+        sign_batch_task.apply((retry_transactions, settings.RIPPLE_SECRET))
+        count += len(failed_transactions)
+    return count
+
+
+def sign_created_transactions(batch_size):
+    """
+    Signs up to `batch_size` transactions left created but not signed by
+    retry and return stages for `CREATED_MAX_AGE` seconds, e.g. because the
+    process was stopped before it signed them.
+    """
+    created_before = timezone.now() - datetime.timedelta(
+        seconds=CREATED_MAX_AGE)
+    transaction_pks = list(
+        Transaction.objects.filter(
+            status=Transaction.CREATED, created__lt=created_before
+        ).order_by('pk').values_list('pk', flat=True)[:batch_size]
+    )
+    if transaction_pks:
+        logger.info(format_log_message('Sign created: %s', transaction_pks))
+        sign_batch_task.apply((transaction_pks, settings.RIPPLE_SECRET))
+    return len(transaction_pks)
+
+
+def monitor(batch_size, time_budget):
+    return monitor_transactions(settings.RIPPLE_ACCOUNT, limit=batch_size,
+                                time_budget=time_budget)
+
+
+def return_funds(batch_size, time_budget):
+    logger.info('Returning failed stakes')
+    deadline = time.time() + time_budget
+    last_pk = 0
+    count = 0
+    while time.time() < deadline:
+        with claim_transactions(Transaction.MUST_BE_RETURN, last_pk,
+                                batch_size) as transactions:
+            if not transactions:
+                break
+            last_pk = transactions[-1].pk
+            returning_transactions = []
+            for transaction in transactions:
+                logger.info("Transaction %s must be return." % transaction.pk)
+
+                ret_transaction = Transaction.objects.create(
+                    account=settings.RIPPLE_ACCOUNT,
+                    destination=transaction.account,
+                    currency=transaction.currency,
+                    value=transaction.value,
+                    status=Transaction.CREATED,
+                    parent=transaction
+                )
+                returning_transactions.append(ret_transaction.pk)
+                Transaction.objects.set_status(
+                    transaction, Transaction.RETURNING)
+                logger.info(
+                    "New transaction created for returning %s",
+                    ret_transaction.pk
+                )
+        # created, not pending, so that the submit stage does not take them
+        # before they are signed once the claim is committed
+        sign_batch_task.apply(
+            (returning_transactions, settings.RIPPLE_SECRET))
+        count += len(transactions)
+    return count
+
+
+def submit_pending_transactions(batch_size, time_budget):
+    """
+    Submit transactions that was signed, but connection error occurred
+    when submit it.
+    """
+    logger.info(format_log_message('Submit pending transactions'))
+    deadline = time.time() + time_budget
+    last_pk = 0
+    count = 0
+    while time.time() < deadline:
+        with claim_transactions(Transaction.PENDING, last_pk,
+                                batch_size) as pending_transactions:
+            if not pending_transactions:
+                break
+            last_pk = pending_transactions[-1].pk
+            # other processes don't take them once the claim is committed
+            transaction_pks = [
+                transaction.pk for transaction in pending_transactions
+                if Transaction.objects.set_status(
+                    transaction, Transaction.SUBMITTING)
+            ]
+        logger.info(format_log_message('Submit: %s', transaction_pks))
+        submit_batch_task.apply((transaction_pks,))
+        count += len(transaction_pks)
+    return count
+
+
+def check_submitted_transactions(batch_size, time_budget):
+    """
+    Check final disposition of transactions.
+
+    Transactions which still may be validated before their
+    ``LastLedgerSequence`` are skipped, the others are final and are
+    checked once. Transactions left submitting by a stopped submit stage
+    are checked too once they are past ``LastLedgerSequence``.
+    """
+    logger.info(
+        format_log_message(
+            'Checking submitted transactions'
+        )
+    )
+    deadline = time.time() + time_budget
+
+    final = Q(status=Transaction.SUBMITTED)
+    ledger_index = None
+    if Transaction.objects.filter(
+            status__in=[Transaction.SUBMITTED, Transaction.SUBMITTING],
+            last_ledger_sequence__isnull=False).exists():
+        ledger_index = last_validated_ledger_index()
+        final = Q(status=Transaction.SUBMITTED) & (
+            Q(last_ledger_sequence__isnull=True) |
+            Q(last_ledger_sequence__lt=ledger_index)
+        ) | Q(status=Transaction.SUBMITTING,
+              last_ledger_sequence__lt=ledger_index)
+
+    last_pk = 0
+    count = 0
+    while time.time() < deadline:
+        submitted_transactions = list(
+            Transaction.objects.filter(
+                final, pk__gt=last_pk
+            ).order_by('pk')[:batch_size]
+        )
+        if not submitted_transactions:
+            break
+        last_pk = submitted_transactions[-1].pk
+
+        responses = tx_many(
+            [transaction.hash for transaction in submitted_transactions]
+        )
+        for transaction in submitted_transactions:
+            check_submitted_transaction(
+                transaction, responses[transaction.hash], ledger_index
+            )
+        count += len(submitted_transactions)
+    return count
+
+
+def dispatch_signals(batch_size, time_budget):
+    return dispatch_status_events(limit=batch_size, time_budget=time_budget)
+
+
+# in the order `process_transactions` runs them
+STAGES = OrderedDict([
+    ('retry', retry_failed_transactions),
+    ('monitor', monitor),
+    ('return', return_funds),
+    ('submit', submit_pending_transactions),
+    ('check', check_submitted_transactions),
+    ('signals', dispatch_signals),
+])
+
+
+def get_stage_options(stage):
+    """
+    Returns options of `stage`: defaults updated with
+    ``RIPPLE_API_PIPELINE[stage]`` setting.
+    """
+    options = dict(DEFAULT_STAGE_OPTIONS[stage])
+    options.update(get_setting('RIPPLE_API_PIPELINE', {}).get(stage, {}))
+    return options
+
+
+def run_stage(stage, batch_size=None, time_budget=None):
+    """
+    Runs `stage` with its configured options unless `batch_size` or
+    `time_budget` are given. Returns number of handled transactions.
+    """
+    options = get_stage_options(stage)
+    return STAGES[stage](
+        batch_size=batch_size or options['batch_size'],
+        time_budget=time_budget or options['time_budget'])
+
+
+class Pipeline(object):
+    """
+    Runs `stages` in a loop instead of on schedule.
+
+    A stage drains its queue batch by batch within its time budget. A
+    stage which found work runs again after its ``interval``, the delay of
+    an idle stage doubles after every run, up to `max_sleep` seconds.
+    """
+
+    def __init__(self, stages=None, batch_size=None, time_budget=None,
+                 max_sleep=DEFAULT_MAX_SLEEP):
+        self.stages = list(stages or STAGES)
+        self.batch_size = batch_size
+        self.time_budget = time_budget
+        self.max_sleep = max_sleep
+        self.delays = dict.fromkeys(self.stages, 0)
+        self.next_run = dict.fromkeys(self.stages, 0)
+
+    def step(self):
+        """
+        Runs stages which are due. Returns seconds till the next one is.
+        """
+        for stage in self.stages:
+            if time.time() < self.next_run[stage]:
+                continue
+            interval = get_stage_options(stage)['interval']
+            close_old_connections()
+            try:
+                count = run_stage(stage, self.batch_size, self.time_budget)
+            except Exception:
+                logger.exception('Stage %s failed', stage)
+                count = 0
+            if count:
+                self.delays[stage] = interval
+            else:
+                self.delays[stage] = min(
+                    max(self.delays[stage] * 2, interval),
+                    max(self.max_sleep, interval))
+            self.next_run[stage] = time.time() + self.delays[stage]
+        return max(min(self.next_run.values()) - time.time(), 0)
+
+    def run(self):
+        while True:
+            time.sleep(self.step())
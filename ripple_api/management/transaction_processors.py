@@ -1,17 +1,37 @@
 # -*- coding: utf-8 -*-
+from collections import OrderedDict
+from contextlib import contextmanager
 import datetime
+import json
 import logging
+import time
 from requests.exceptions import ConnectionError
 
-from ripple_api.models import Transaction
-from ripple_api.ripple_api import account_tx, RippleApiError
+from ripple_api.models import (
+    AccountTxCursor, Transaction, TransactionStatusEvent
+)
+from ripple_api.ripple_api import (
+    account_tx, validated_ledger_index, RippleApiError
+)
 
 from django.conf import settings
+from django.db import (
+    IntegrityError, connections, transaction as db_transaction
+)
 from django.db.models import Max
+from django.db.models.signals import post_save
+from django.utils import timezone
 
 
 PROCESS_TRANSACTIONS_LIMIT = 200
 PROCESS_TRANSACTIONS_TIMEOUT = 270
+# seconds an account_tx cursor is taken for a recently validated ledger
+CURSOR_MAX_AGE = 60
+# errors of account_tx with a marker or ledger range it can't resume from,
+# e.g. after rippled lost the ledger history the marker points to
+CURSOR_RESTART_ERRORS = (
+    'invalidParams', 'lgrIdxsInvalid', 'lgrIdxMalformed', 'lgrNotFound'
+)
 DEFAULT_MIN_LEDGER_INDEX = getattr(
     settings, 'RIPPLE_TRANSACTION_MONITOR_MIN_LEDGER_INDEX', -1
 )
@@ -38,9 +58,28 @@ def _get_min_ledger_index(account):
     return max(min_ledger_index, DEFAULT_MIN_LEDGER_INDEX)
 
 
-def _store_transaction(account, transaction):
+def _get_cursor(account):
     """
-    Stores transaction for `account` into database.
+    Gets `account_tx` ingestion cursor of `account`. New cursor starts
+    right after transactions of `account` already stored in database.
+    """
+    try:
+        return AccountTxCursor.objects.get(account=account)
+    except AccountTxCursor.DoesNotExist:
+        pass
+
+    ledger_index = _get_min_ledger_index(account)
+    # stored ledger may be only partially processed
+    return AccountTxCursor(
+        account=account,
+        ledger_index=ledger_index - 1 if ledger_index > 0 else None
+    )
+
+
+def _build_transaction(account, transaction):
+    """
+    Returns unsaved `Transaction` for incoming payment `transaction` of
+    `account` or None if it should not be stored.
     """
     tr_tx = transaction['tx']
     meta = transaction.get('meta', {})
@@ -50,37 +89,198 @@ def _store_transaction(account, transaction):
 
     amount = meta.get('delivered_amount') or tr_tx.get('Amount', {})
 
-    is_unprocessed = (
+    is_incoming_payment = (
         tr_tx['TransactionType'] == 'Payment' and
         tr_tx['Destination'] == account and
-        isinstance(amount, dict) and
-        not Transaction.objects.filter(hash=tr_tx['hash'])
+        isinstance(amount, dict)
+    )
+    if not is_incoming_payment:
+        return
+
+    return Transaction(
+        account=tr_tx['Account'],
+        hash=tr_tx['hash'],
+        received_hash=tr_tx['hash'],
+        destination=account,
+        ledger_index=tr_tx['ledger_index'],
+        destination_tag=tr_tx.get('DestinationTag'),
+        source_tag=tr_tx.get('SourceTag'),
+        status=Transaction.RECEIVED,
+        currency=amount['currency'],
+        issuer=amount['issuer'],
+        value=amount['value']
+    )
+
+
+def _store_transaction(account, transaction):
+    """
+    Stores transaction for `account` into database.
+    """
+    transaction_object = _build_transaction(account, transaction)
+
+    if transaction_object is None or \
+            Transaction.objects.filter(hash=transaction_object.hash).exists():
+        return
+
+    logger.info(
+        format_log_message(
+            'Saving transaction: %s', transaction
+        )
     )
-    if is_unprocessed:
+
+    _insert_transaction(transaction_object)
+
+
+def _insert_transaction(transaction_object):
+    """
+    Saves new `transaction_object` unless another process has stored the
+    same payment meanwhile. Returns ``True`` if it is saved.
+    """
+    try:
+        # savepoint, so that the outer database transaction goes on
+        with db_transaction.atomic():
+            transaction_object.save()
+    except IntegrityError:
         logger.info(
             format_log_message(
-                'Saving transaction: %s', transaction
+                "Transaction already stored: %s", transaction_object.hash
             )
         )
+        return False
 
-        transaction_object = Transaction.objects.create(
-            account=tr_tx['Account'],
-            hash=tr_tx['hash'],
-            destination=account,
-            ledger_index=tr_tx['ledger_index'],
-            destination_tag=tr_tx.get('DestinationTag'),
-            source_tag=tr_tx.get('SourceTag'),
-            status=Transaction.RECEIVED,
-            currency=amount['currency'],
-            issuer=amount['issuer'],
-            value=amount['value']
+    logger.info(
+        format_log_message(
+            "Transaction saved: %s", transaction_object
         )
+    )
+    return True
 
-        logger.info(
-            format_log_message(
-                "Transaction saved: %s", transaction_object
+
+def _store_transactions(account, transactions):
+    """
+    Stores page of `transactions` for `account` into database with one
+    query for already stored hashes, and one bulk insert where the database
+    returns primary keys of inserted rows.
+    """
+    transaction_objects = OrderedDict()
+    for transaction in transactions:
+        transaction_object = _build_transaction(account, transaction)
+        if transaction_object is not None:
+            transaction_objects.setdefault(
+                transaction_object.hash, transaction_object
             )
-        )
+
+    if not transaction_objects:
+        return
+
+    stored_hashes = set(
+        Transaction.objects.filter(
+            hash__in=transaction_objects.keys()
+        ).values_list('hash', flat=True)
+    )
+    new_objects = [
+        transaction_object
+        for tx_hash, transaction_object in transaction_objects.items()
+        if tx_hash not in stored_hashes
+    ]
+    if not new_objects:
+        return
+
+    features = connections[Transaction.objects.db].features
+    if getattr(features, 'can_return_ids_from_bulk_insert', False):
+        try:
+            with db_transaction.atomic():
+                Transaction.objects.bulk_create(new_objects)
+        except IntegrityError:
+            # some of them are stored by another process, they are
+            # inserted one by one below
+            for transaction_object in new_objects:
+                transaction_object.pk = None
+        else:
+            # bulk_create does not send post_save, which is used to get
+            # new transactions
+            for transaction_object in new_objects:
+                post_save.send(
+                    sender=Transaction, instance=transaction_object,
+                    created=True, update_fields=None, raw=False,
+                    using=transaction_object._state.db
+                )
+                logger.info(
+                    format_log_message(
+                        "Transaction saved: %s", transaction_object
+                    )
+                )
+            return
+
+    # only rows inserted here are signalled, not the ones stored by another
+    # ingester at the same time
+    for transaction_object in new_objects:
+        _insert_transaction(transaction_object)
+
+
+@contextmanager
+def claim_transactions(status, last_pk=0, limit=PROCESS_TRANSACTIONS_LIMIT,
+                       max_pk=None):
+    """
+    Selects up to `limit` transactions with `status` and primary key above
+    `last_pk`, and not above `max_pk` if given, and keeps them locked till
+    the end of the block, so that
+    several `process_transactions` running at once never take the same
+    transaction. The block should change their status.
+
+    Rows locked by another process are skipped where the database supports
+    ``SKIP LOCKED`` (Django 1.11+). Otherwise the query waits for them and
+    the database re-checks `status` once they are released.
+    """
+    with db_transaction.atomic():
+        queryset = Transaction.objects.filter(
+            status=status, pk__gt=last_pk
+        ).order_by('pk')
+        if max_pk is not None:
+            queryset = queryset.filter(pk__lte=max_pk)
+        yield list(_select_for_update(queryset)[:limit])
+
+
+def _select_for_update(queryset):
+    if getattr(connections[queryset.db].features,
+               'has_select_for_update_skip_locked', False):
+        return queryset.select_for_update(skip_locked=True)
+    return queryset.select_for_update()
+
+
+def dispatch_status_events(limit=PROCESS_TRANSACTIONS_LIMIT, time_budget=60):
+    """
+    Sends signals of status changes stored with ``RIPPLE_API_SIGNAL_OUTBOX``
+    setting, in the order they were saved, and deletes sent events.
+
+    Events are locked while being sent, so several dispatchers may run at
+    once. If a receiver fails, the event and the ones after it are sent
+    again by the next run. Returns number of sent events.
+    """
+    deadline = time.time() + time_budget
+    count = 0
+    while time.time() < deadline:
+        with db_transaction.atomic():
+            queryset = TransactionStatusEvent.objects.select_related(
+                'transaction').order_by('pk')
+            events = list(_select_for_update(queryset)[:limit])
+            if not events:
+                break
+
+            sent = []
+            for event in events:
+                try:
+                    event.send()
+                except Exception:
+                    logger.exception('Unable to send status event %s', event)
+                    break
+                sent.append(event.pk)
+
+            TransactionStatusEvent.objects.filter(pk__in=sent).delete()
+        count += len(sent)
+        if len(sent) < len(events):
+            break
+    return count
 
 
 def format_log_message(message, transaction=None, *args):
@@ -95,19 +295,115 @@ def format_log_message(message, transaction=None, *args):
         return message
 
 
-def monitor_transactions(account):
+def last_validated_ledger_index(max_age=CURSOR_MAX_AGE):
+    """
+    Returns index of a recently validated ledger. Taken from account_tx
+    cursors moved by `monitor_transactions` in the last `max_age` seconds,
+    so that no request is needed, or from rippled if there is no such
+    cursor, e.g. when monitor stage does not run.
+    """
+    ledger_index = AccountTxCursor.objects.filter(
+        updated__gte=timezone.now() - datetime.timedelta(seconds=max_age)
+    ).aggregate(Max('ledger_index'))['ledger_index__max']
+    if ledger_index is None or ledger_index < 0:
+        ledger_index = validated_ledger_index()
+    return ledger_index
+
+
+def _expired(transaction, ledger_index):
+    return transaction.last_ledger_sequence is not None and \
+        ledger_index is not None and \
+        ledger_index > transaction.last_ledger_sequence
+
+
+def check_submitted_transaction(transaction, response, ledger_index=None):
+    """
+    Sets final status of submitted `transaction` from its `tx` `response`,
+    which may also be `RippleApiError`. The status is set only if
+    `transaction` was not checked meanwhile, e.g. by confirmation tracker.
+
+    `ledger_index` is a validated ledger read before `response`. If it is
+    past ``LastLedgerSequence`` of a transaction which is not validated,
+    the transaction can't be validated anymore and is failed.
+    """
+    if isinstance(response, RippleApiError):
+        logger.error(
+            format_log_message(
+                "Error processing %s: %s", transaction, response
+            )
+        )
+        # held or queued transactions are not found until they are in a
+        # ledger, they fail only once LastLedgerSequence is passed
+        if response.error == 'txnExpired' or \
+                response.error == 'txnNotFound' and (
+                    transaction.last_ledger_sequence is None or
+                    _expired(transaction, ledger_index)):
+            logger.info(
+                format_log_message(
+                    'Setting transaction status to Failed for %s',
+                    transaction
+                )
+            )
+            Transaction.objects.set_status(transaction, Transaction.FAILURE)
+        return
+
+    logger.info(format_log_message(response))
+    status = response.get('meta', {}).get('TransactionResult')
+
+    if status == 'tesSUCCESS':
+        if not Transaction.objects.set_status(
+                transaction, Transaction.SUCCESS):
+            return
+
+        if transaction.parent:
+            Transaction.objects.set_status(
+                transaction.parent, Transaction.RETURNED)
+
+        logger.info(format_log_message(
+                "Transaction: %s to %s was complete.",
+                transaction, transaction.destination
+            )
+        )
+    elif response.get('validated') or _expired(transaction, ledger_index):
+        logger.info(
+            format_log_message(
+                'Setting transaction status to Failed for %s, result %s',
+                transaction, status
+            )
+        )
+        Transaction.objects.set_status(transaction, Transaction.FAILURE)
+    else:
+        logger.info("Transaction status: %s" % status)
+
+
+def monitor_transactions(account, limit=None, time_budget=None):
     """
     Gets new transactions for `account` and store them in DB.
+
+    Pages of `limit` transactions are read until there are no more or
+    `time_budget` seconds are spent. Returns number of read transactions.
     """
+    if limit is None:
+        limit = PROCESS_TRANSACTIONS_LIMIT
+    if time_budget is None:
+        time_budget = PROCESS_TRANSACTIONS_TIMEOUT
     start_time = datetime.datetime.now()
     logger.info(
         format_log_message(
             'Looking for new ripple transactions since last run'
         )
     )
-    ledger_min_index = _get_min_ledger_index(account)
-    marker = None
+    cursor = _get_cursor(account)
+    if cursor.marker:
+        ledger_min_index = cursor.ledger_index_min
+        marker = json.loads(cursor.marker)
+    else:
+        ledger_min_index = (
+            cursor.ledger_index + 1 if cursor.ledger_index is not None else -1
+        )
+        marker = None
     has_results = True
+    count = 0
 
     try:
         timeout = settings.RIPPLE_TIMEOUT
@@ -118,23 +414,33 @@ def monitor_transactions(account):
         try:
             response = account_tx(account,
                                   ledger_min_index,
-                                  limit=PROCESS_TRANSACTIONS_LIMIT,
+                                  forward=True,
+                                  limit=limit,
                                   marker=marker,
                                   timeout=timeout)
-        except (RippleApiError, ConnectionError), e:
+        except RippleApiError, e:
+            logger.error(format_log_message(e))
+            if marker is None or e.error not in CURSOR_RESTART_ERRORS:
+                break
+            # a stored marker would be rejected by every next run
+            marker, ledger_min_index = _restart_cursor(cursor)
+            continue
+        except ConnectionError, e:
             logger.error(format_log_message(e))
             break
 
         transactions = response['transactions']
         marker = response.get('marker')
         has_results = bool(marker)
+        count += len(transactions)
+
+        _store_transactions(account, transactions)
 
-        for transaction in transactions:
-            _store_transaction(account, transaction)
+        _advance_cursor(cursor, response, ledger_min_index, marker)
 
         transactions_timeout_reached = (
             datetime.datetime.now() - start_time >= datetime.timedelta(
-                seconds=PROCESS_TRANSACTIONS_TIMEOUT
+                seconds=time_budget
             )
         )
 
@@ -143,5 +449,55 @@ def monitor_transactions(account):
             logger.error(
                 'Process_transactions command terminated because '
                 '(%s seconds) timeout: %s',
-                PROCESS_TRANSACTIONS_TIMEOUT, unicode(marker)
+                time_budget, unicode(marker)
             )
+
+    return count
+
+
+def _restart_cursor(cursor):
+    """
+    Drops unfinished scan of `cursor`, so that the next `account_tx` starts
+    right after its last fully processed ledger. Returns marker and
+    ledger_index_min for the request.
+    """
+    logger.error(
+        format_log_message(
+            'Restarting account_tx scan of %s after ledger %s',
+            cursor.account, cursor.ledger_index
+        )
+    )
+    cursor.ledger_index_min = None
+    cursor.marker = ''
+    cursor.save()
+    ledger_min_index = (
+        cursor.ledger_index + 1 if cursor.ledger_index is not None else -1
+    )
+    return None, ledger_min_index
+
+
+def _advance_cursor(cursor, response, ledger_min_index, marker):
+    """
+    Saves progress of `account_tx` scan after one page of `response`.
+    Pages go in ascending ledger order, so every ledger before the last
+    transaction of an unfinished scan is fully processed.
+    """
+    if marker:
+        cursor.ledger_index_min = ledger_min_index
+        cursor.marker = json.dumps(marker)
+        transactions = response['transactions']
+        if transactions:
+            last_ledger_index = transactions[-1]['tx']['ledger_index'] - 1
+            cursor.ledger_index = _max_ledger_index(
+                cursor.ledger_index, last_ledger_index)
+    else:
+        cursor.ledger_index_min = None
+        cursor.marker = ''
+        cursor.ledger_index = _max_ledger_index(
+            cursor.ledger_index, response.get('ledger_index_max'))
+    cursor.save()
+
+
+def _max_ledger_index(*ledger_indexes):
+    ledger_indexes = [index for index in ledger_indexes if index is not None]
+    return max(ledger_indexes) if ledger_indexes else None
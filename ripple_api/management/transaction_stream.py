@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+import json
+import logging
+import socket
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections
+from django.utils import timezone
+
+from ripple_api.cache import get_book_cache
+from ripple_api.confirmation import observe_ledger
+from ripple_api.models import AccountTxCursor
+from ripple_api.ripple_api import RippleApiError
+from ripple_api.management.transaction_processors import (
+    monitor_transactions,
+    format_log_message,
+    _store_transaction
+)
+
+
+RECONNECT_DELAY = 5
+
+logger = logging.getLogger('ripple')
+
+
+def _stream_errors():
+    errors = (socket.error, EnvironmentError, ValueError)
+    try:
+        import websocket
+    except ImportError:
+        return errors
+    return errors + (websocket.WebSocketException,)
+
+
+def _create_connection(url, timeout):
+    try:
+        import websocket
+    except ImportError:
+        raise ImportError(
+            'websocket-client package is required to stream transactions')
+    return websocket.create_connection(url, timeout=timeout)
+
+
+class TransactionStream(object):
+    """
+    Stores incoming payments of `account` as they are validated, using
+    rippled `subscribe` stream over WebSocket.
+
+    After every (re)connect the gap since the last processed ledger is
+    filled with `monitor_transactions`, which pages `account_tx` from the
+    account ingestion cursor. Closed ledgers move the cursor forward, so
+    the gap stays small.
+
+    Params:
+        `account`:
+            Ripple account to watch.
+
+        `url`:
+            rippled WebSocket url. Defaults to ``RIPPLE_WEBSOCKET_URL``
+            setting.
+
+        `timeout`:
+            Seconds to wait for a message before connection is considered
+            dead.
+
+        `reconnect_delay`:
+            Seconds to wait before reconnecting.
+
+        `connect`:
+            Callable that takes url and timeout and returns connection
+            object with `send`, `recv` and `close` methods.
+    """
+
+    def __init__(self, account, url=None, timeout=60,
+                 reconnect_delay=RECONNECT_DELAY, connect=None):
+        self.account = account
+        self.url = url or settings.RIPPLE_WEBSOCKET_URL
+        self.timeout = timeout
+        self.reconnect_delay = reconnect_delay
+        self.connect = connect or _create_connection
+        self.connection = None
+
+    def run(self, reconnects=None):
+        """
+        Streams transactions until `reconnects` connections were lost.
+        None to stream forever. Connection, rippled and database errors
+        are logged and the stream reconnects after `reconnect_delay`.
+        """
+        while True:
+            try:
+                self._subscribe()
+                monitor_transactions(self.account)
+                while True:
+                    self.handle_message(json.loads(self.connection.recv()))
+            except _stream_errors() as e:
+                logger.error(format_log_message('Stream error: %s', e))
+            except RippleApiError as e:
+                logger.error(format_log_message('Ripple API error: %s', e))
+            except DatabaseError as e:
+                logger.error(format_log_message('Database error: %s', e))
+                # connection may be lost, next query opens a new one
+                close_old_connections()
+            finally:
+                self.close()
+
+            if reconnects is not None:
+                reconnects -= 1
+                if reconnects < 0:
+                    return
+            time.sleep(self.reconnect_delay)
+
+    def close(self):
+        if self.connection is not None:
+            try:
+                self.connection.close()
+            except Exception:
+                pass
+            self.connection = None
+
+    def _subscribe(self):
+        self.connection = self.connect(self.url, self.timeout)
+        self.connection.send(json.dumps({
+            'id': 'ripple_api',
+            'command': 'subscribe',
+            'accounts': [self.account],
+            'streams': ['ledger'],
+        }))
+        logger.info(format_log_message('Subscribed to %s', self.url))
+
+    def handle_message(self, message):
+        message_type = message.get('type')
+
+        if message_type == 'response' and message.get('status') == 'error':
+            raise RippleApiError(
+                message.get('error'),
+                message.get('error_code', 'no_code'),
+                message.get('error_message', 'no_message'),
+            )
+
+        elif message_type == 'transaction' and message.get('validated'):
+            transaction = {
+                'tx': dict(message['transaction'],
+                           ledger_index=message['ledger_index']),
+                'meta': message.get('meta', {}),
+            }
+            _store_transaction(self.account, transaction)
+
+        elif message_type == 'ledgerClosed':
+            # transactions of the closed ledger may still be on their way,
+            # update() does not set auto_now `updated`, which tells
+            # last_validated_ledger_index that the cursor is recent
+            AccountTxCursor.objects.filter(
+                account=self.account, marker='',
+                ledger_index__lt=message['ledger_index'] - 1
+            ).update(ledger_index=message['ledger_index'] - 1,
+                     updated=timezone.now())
+
+            book_cache = get_book_cache()
+            if book_cache is not None:
+                # offers read from the open ledger are outdated now
+                book_cache.observe_ledger(message['ledger_index'] + 1)
+
+            # transactions waiting for confirmation are checked right away
+            observe_ledger(message['ledger_index'])
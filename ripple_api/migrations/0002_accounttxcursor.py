@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = (
+        ('ripple_api', '0001_initial'),
+    )
+
+    operations = (
+        migrations.CreateModel(
+            name='AccountTxCursor',
+            fields=(
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('account', models.CharField(max_length=100, unique=True)),
+                ('ledger_index', models.IntegerField(blank=True, null=True)),
+                ('ledger_index_min', models.IntegerField(blank=True, null=True)),
+                ('marker', models.TextField(blank=True)),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ),
+        ),
+    )
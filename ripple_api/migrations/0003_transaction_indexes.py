@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = (
+        ('ripple_api', '0002_accounttxcursor'),
+    )
+
+    operations = (
+        migrations.AlterField(
+            model_name='transaction',
+            name='hash',
+            field=models.CharField(blank=True, db_index=True, max_length=100),
+        ),
+        migrations.AlterIndexTogether(
+            name='transaction',
+            index_together=set([('destination', 'status', 'ledger_index')]),
+        ),
+    )
@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = (
+        ('ripple_api', '0003_transaction_indexes'),
+    )
+
+    operations = (
+        migrations.CreateModel(
+            name='AccountSequence',
+            fields=(
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('account', models.CharField(max_length=100, unique=True)),
+                ('sequence', models.PositiveIntegerField(blank=True, null=True)),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ),
+        ),
+    )
@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = (
+        ('ripple_api', '0004_accountsequence'),
+    )
+
+    operations = (
+        migrations.AddField(
+            model_name='transaction',
+            name='last_ledger_sequence',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+    )
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = (
+        ('ripple_api', '0005_transaction_last_ledger_sequence'),
+    )
+
+    operations = (
+        migrations.CreateModel(
+            name='TransactionStatusEvent',
+            fields=(
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('old_status', models.SmallIntegerField(blank=True, choices=[(0, 'Transaction received'), (1, 'Transaction was processed'), (2, 'This transaction must be returned to user'), (3, 'Created new transaction for returning'), (4, 'Transaction was returned'), (5, 'Pending to submit'), (6, 'Transaction was submitted'), (7, 'Transaction was failed'), (8, 'Transaction was completed successfully'), (9, 'Transaction was created but not sign'), (10, 'Transaction was processed after successful submit'), (100, 'The failed transaction was fixed by a new retry')], null=True)),
+                ('status', models.SmallIntegerField(choices=[(0, 'Transaction received'), (1, 'Transaction was processed'), (2, 'This transaction must be returned to user'), (3, 'Created new transaction for returning'), (4, 'Transaction was returned'), (5, 'Pending to submit'), (6, 'Transaction was submitted'), (7, 'Transaction was failed'), (8, 'Transaction was completed successfully'), (9, 'Transaction was created but not sign'), (10, 'Transaction was processed after successful submit'), (100, 'The failed transaction was fixed by a new retry')])),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('transaction', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='status_events', to='ripple_api.Transaction')),
+            ),
+        ),
+    )
@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = (
+        ('ripple_api', '0006_transactionstatusevent'),
+    )
+
+    operations = (
+        migrations.AddField(
+            model_name='transaction',
+            name='received_hash',
+            field=models.CharField(blank=True, editable=False, max_length=100,
+                                   null=True),
+        ),
+        migrations.AlterUniqueTogether(
+            name='transaction',
+            unique_together=set([('received_hash', 'destination')]),
+        ),
+    )
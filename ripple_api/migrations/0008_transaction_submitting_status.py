@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = (
+        ('ripple_api', '0007_transaction_received_hash'),
+    )
+
+    operations = (
+        migrations.AlterField(
+            model_name='transaction',
+            name='status',
+            field=models.SmallIntegerField(choices=[(0, 'Transaction received'), (1, 'Transaction was processed'), (2, 'This transaction must be returned to user'), (3, 'Created new transaction for returning'), (4, 'Transaction was returned'), (5, 'Pending to submit'), (6, 'Transaction was submitted'), (7, 'Transaction was failed'), (8, 'Transaction was completed successfully'), (9, 'Transaction was created but not sign'), (10, 'Transaction was processed after successful submit'), (11, 'Transaction is being submitted'), (100, 'The failed transaction was fixed by a new retry')], default=0),
+        ),
+        migrations.AlterField(
+            model_name='transactionstatusevent',
+            name='old_status',
+            field=models.SmallIntegerField(blank=True, choices=[(0, 'Transaction received'), (1, 'Transaction was processed'), (2, 'This transaction must be returned to user'), (3, 'Created new transaction for returning'), (4, 'Transaction was returned'), (5, 'Pending to submit'), (6, 'Transaction was submitted'), (7, 'Transaction was failed'), (8, 'Transaction was completed successfully'), (9, 'Transaction was created but not sign'), (10, 'Transaction was processed after successful submit'), (11, 'Transaction is being submitted'), (100, 'The failed transaction was fixed by a new retry')], null=True),
+        ),
+        migrations.AlterField(
+            model_name='transactionstatusevent',
+            name='status',
+            field=models.SmallIntegerField(choices=[(0, 'Transaction received'), (1, 'Transaction was processed'), (2, 'This transaction must be returned to user'), (3, 'Created new transaction for returning'), (4, 'Transaction was returned'), (5, 'Pending to submit'), (6, 'Transaction was submitted'), (7, 'Transaction was failed'), (8, 'Transaction was completed successfully'), (9, 'Transaction was created but not sign'), (10, 'Transaction was processed after successful submit'), (11, 'Transaction is being submitted'), (100, 'The failed transaction was fixed by a new retry')]),
+        ),
+    )
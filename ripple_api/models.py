@@ -1,12 +1,78 @@
 # -*- coding: utf-8 -*-
-from django.db import models
-from django.utils.translation import ugettext_lazy as _
+import copy
 
-from model_utils import ModelTracker
+from django.core.exceptions import FieldError
+from django.db import models, transaction as db_transaction
+from django.utils.translation import ugettext_lazy as _
 
+from connection import get_setting
 from signals import transaction_status_changed, transaction_failure_send
 
 
+class StatusTracker(object):
+    """
+    Status of a transaction as it is saved in the database, with the
+    interface of ``model_utils.ModelTracker(fields=['status'])``.
+    """
+
+    def __init__(self, instance):
+        self.instance = instance
+
+    def previous(self, field):
+        """Returns saved value of `field`, None for new transactions"""
+        self._check_field(field)
+        return self.instance._saved_status
+
+    def has_changed(self, field):
+        """Returns ``True`` if `field` has changed from saved value"""
+        self._check_field(field)
+        if not self.instance.pk:
+            return True
+        return self.instance._saved_status != self.instance.status
+
+    def changed(self):
+        """Returns dict of changed fields with saved values"""
+        if self.instance.pk and self.has_changed('status'):
+            return {'status': self.instance._saved_status}
+        return {}
+
+    def _check_field(self, field):
+        if field != 'status':
+            raise FieldError('field "%s" not tracked' % field)
+
+
+class TransactionManager(models.Manager):
+
+    def set_status(self, transaction, status, old_status=None):
+        """
+        Changes status of saved `transaction` to `status` with one
+        ``UPDATE ... WHERE status = old_status``, so that of concurrent
+        changes from the same status only one succeeds. `old_status` is
+        the saved status of `transaction` by default.
+
+        Returns ``True`` and sends the signals `Transaction.save` would send
+        if the status is changed, ``False`` if it was not `old_status`.
+        """
+        if old_status is None:
+            old_status = transaction.status_tracker.previous('status')
+
+        if signal_outbox_enabled():
+            with db_transaction.atomic():
+                return self._set_status(transaction, status, old_status)
+        return self._set_status(transaction, status, old_status)
+
+    def _set_status(self, transaction, status, old_status):
+        updated = self.filter(
+            pk=transaction.pk, status=old_status
+        ).update(status=status)
+        if not updated:
+            return False
+
+        transaction.status = transaction._saved_status = status
+        send_status_signals([(transaction, old_status)])
+        return True
+
+
 class Transaction(models.Model):
     RECEIVED = 0
     PROCESSED = 1
@@ -19,6 +85,7 @@ class Transaction(models.Model):
     SUCCESS = 8
     CREATED = 9
     SUCCESS_PROCESSED = 10
+    SUBMITTING = 11
     FAIL_FIXED = 100
 
     STATUS_CHOICES = (
@@ -34,12 +101,17 @@ class Transaction(models.Model):
         (CREATED, _(u'Transaction was created but not sign')),
         (SUCCESS_PROCESSED,
             _(u'Transaction was processed after successful submit')),
+        (SUBMITTING, _(u'Transaction is being submitted')),
         (FAIL_FIXED, _(u'The failed transaction was fixed by a new retry'))
     )
 
     account = models.CharField(max_length=100)
     destination = models.CharField(max_length=100)
-    hash = models.CharField(max_length=100, blank=True)
+    hash = models.CharField(max_length=100, blank=True, db_index=True)
+    # hash of a payment stored by ingestion, so that it is stored once per
+    # destination however many ingesters run; None for other transactions
+    received_hash = models.CharField(max_length=100, null=True, blank=True,
+                                     editable=False)
     tx_blob = models.TextField(blank=True)
 
     currency = models.CharField(max_length=3)
@@ -49,13 +121,23 @@ class Transaction(models.Model):
     source_tag = models.IntegerField(null=True, blank=True)
     destination_tag = models.IntegerField(null=True, blank=True)
     ledger_index = models.IntegerField(null=True, blank=True)
+    # transaction can not be validated after this ledger
+    last_ledger_sequence = models.IntegerField(null=True, blank=True)
     status = models.SmallIntegerField(choices=STATUS_CHOICES, default=RECEIVED)
 
     parent = models.ForeignKey('self', null=True, blank=True,
                                related_name='returning_transaction')
     created = models.DateTimeField(auto_now_add=True)
 
-    status_tracker = ModelTracker(fields=['status'])
+    objects = TransactionManager()
+
+    class Meta:
+        index_together = (
+            ('destination', 'status', 'ledger_index'),
+        )
+        unique_together = (
+            ('received_hash', 'destination'),
+        )
 
     def __unicode__(self):
         return u'[%s] %s. %s %s from %s to %s' % (
@@ -63,15 +145,127 @@ class Transaction(models.Model):
             self.currency, self.account, self.destination
         )
 
+    def __init__(self, *args, **kwargs):
+        super(Transaction, self).__init__(*args, **kwargs)
+        # deferred status is not loaded
+        self._saved_status = self.__dict__.get('status') if self.pk else None
+
+    @property
+    def status_tracker(self):
+        return StatusTracker(self)
+
     def save(self, *args, **kwargs):
-        created = bool(self.pk)
-        super(Transaction, self).save(*args, **kwargs)
-
-        if created and self.status_tracker.previous('status') is not None:
-            transaction_status_changed.send(
-                sender=self.__class__,
-                instance=self,
-                old_status=self.status_tracker.previous('status')
-            )
-        if self.status == self.FAILURE:
-            transaction_failure_send.send(sender=self.__class__, instance=self)
+        old_status = self._saved_status if self.pk else None
+
+        if signal_outbox_enabled():
+            # status event is stored only with the status
+            with db_transaction.atomic():
+                super(Transaction, self).save(*args, **kwargs)
+                send_status_signals([(self, old_status)])
+        else:
+            super(Transaction, self).save(*args, **kwargs)
+            send_status_signals([(self, old_status)])
+
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'status' in update_fields:
+            self._saved_status = self.status
+
+
+def signal_outbox_enabled():
+    return get_setting('RIPPLE_API_SIGNAL_OUTBOX', False)
+
+
+def send_status_signals(changes):
+    """
+    Sends signals of saved statuses. `changes` is a list of (transaction,
+    old status) pairs, old status is None for new transactions.
+
+    With ``RIPPLE_API_SIGNAL_OUTBOX`` setting the changes are stored as
+    `TransactionStatusEvent` instead and the signals are sent later by
+    `dispatch_status_events`, so it should be called in the database
+    transaction which saved the statuses.
+    """
+    changes = [
+        (transaction, old_status) for transaction, old_status in changes
+        if old_status is not None or transaction.status == Transaction.FAILURE
+    ]
+    if not signal_outbox_enabled():
+        for transaction, old_status in changes:
+            _send_status_signals(transaction, old_status)
+        return
+
+    TransactionStatusEvent.objects.bulk_create(
+        TransactionStatusEvent(transaction=transaction, old_status=old_status,
+                               status=transaction.status)
+        for transaction, old_status in changes
+    )
+
+
+def _send_status_signals(transaction, old_status):
+    if old_status is not None:
+        transaction_status_changed.send(
+            sender=Transaction,
+            instance=transaction,
+            old_status=old_status
+        )
+    if transaction.status == Transaction.FAILURE:
+        transaction_failure_send.send(sender=Transaction, instance=transaction)
+
+
+class TransactionStatusEvent(models.Model):
+    """
+    Saved status of a transaction whose signals are not sent yet. Used with
+    ``RIPPLE_API_SIGNAL_OUTBOX`` setting, rows are deleted once the signals
+    are sent by `dispatch_status_events`.
+    """
+    transaction = models.ForeignKey(Transaction, related_name='status_events')
+    # None for new transactions
+    old_status = models.SmallIntegerField(
+        choices=Transaction.STATUS_CHOICES, null=True, blank=True)
+    status = models.SmallIntegerField(choices=Transaction.STATUS_CHOICES)
+    created = models.DateTimeField(auto_now_add=True)
+
+    def __unicode__(self):
+        return u'%s: %s -> %s' % (
+            self.transaction_id, self.old_status, self.status)
+
+    def send(self):
+        """
+        Sends signals of the event, with transaction status as it was saved.
+        """
+        # a copy, so that the loaded transaction keeps its saved status
+        transaction = copy.copy(self.transaction)
+        transaction.status = transaction._saved_status = self.status
+        _send_status_signals(transaction, self.old_status)
+
+
+class AccountTxCursor(models.Model):
+    """
+    Progress of `account_tx` ingestion for an account, so that next run of
+    transaction monitor resumes where the previous one stopped.
+    """
+    account = models.CharField(max_length=100, unique=True)
+    # last ledger whose transactions are all stored
+    ledger_index = models.IntegerField(null=True, blank=True)
+    # ledger_index_min and marker of unfinished scan
+    ledger_index_min = models.IntegerField(null=True, blank=True)
+    marker = models.TextField(blank=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    def __unicode__(self):
+        return u'%s: ledger %s' % (self.account, self.ledger_index)
+
+
+class AccountSequence(models.Model):
+    """
+    Next unused ``Sequence`` of an account signing transactions, so that
+    several transactions of the account may be signed and submitted before
+    the previous ones are validated.
+    """
+    account = models.CharField(max_length=100, unique=True)
+    # None until read from rippled, e.g. after resync
+    sequence = models.PositiveIntegerField(null=True, blank=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    def __unicode__(self):
+        return u'%s: %s' % (self.account, self.sequence)
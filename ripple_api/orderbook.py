@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+Order book parsed once from `book_offers` response for repeated quoting.
+"""
+
+# system imports:
+from bisect import bisect_right
+from decimal import Decimal
+
+
+def _value(taker_pays_or_gets):
+    if isinstance(taker_pays_or_gets, dict):
+        return Decimal(taker_pays_or_gets['value'])
+    return Decimal(taker_pays_or_gets)
+
+
+class OrderBook(object):
+    """
+    Cumulative amounts of book offers. Quoting an amount is a binary search
+    over the cumulative sums instead of a walk over the offers.
+
+    Params:
+        `offers`:
+            Offers as returned by `book_offers`, best first.
+
+        `status`:
+            Status of `book_offers` call.
+
+        `ledger_index`:
+            Ledger the offers were read from.
+    """
+
+    def __init__(self, offers, status='success', ledger_index=None):
+        self.status = status if offers else 'no_offers'
+        self.ledger_index = ledger_index
+        self.qualities = []
+        # cumulative sums, n-th item is the total of the first n offers
+        self.cumulative_pays = [Decimal(0)]
+        self.cumulative_gets = [Decimal(0)]
+
+        for offer in offers:
+            if 'taker_gets_funded' in offer:
+                pays = _value(offer['taker_pays_funded'])
+                gets = _value(offer['taker_gets_funded'])
+            else:
+                pays = _value(offer['TakerPays'])
+                gets = _value(offer['TakerGets'])
+            self.qualities.append(Decimal(offer['quality']))
+            self.cumulative_pays.append(self.cumulative_pays[-1] + pays)
+            self.cumulative_gets.append(self.cumulative_gets[-1] + gets)
+
+    @classmethod
+    def from_response(cls, offers_info):
+        """
+        Creates order book from `book_offer` result.
+        """
+        return cls(offers_info['offers'], offers_info['status'],
+                   offers_info.get('ledger_current_index') or
+                   offers_info.get('ledger_index'))
+
+    def __len__(self):
+        return len(self.qualities)
+
+    def quote(self, amount, sell=False, default_rate=0):
+        """
+        Returns amount that `amount` converts to, same as `convert`:
+
+            {'status': 'success' or 'attn_not_enough_funds' if the book is
+                       too shallow and the rest is converted with the worst
+                       rate, or 'no_offers' if the book is empty and
+                       `default_rate` is used if given,
+             'amount_to': Decimal}
+
+        `amount` is in taker gets currency, or in taker pays currency if
+        `sell`.
+        """
+        amount = Decimal(amount)
+
+        if not self.qualities:
+            return {'status': self.status,
+                    'amount_to': Decimal(default_rate) * amount}
+
+        if sell:
+            spent, received = self.cumulative_pays, self.cumulative_gets
+        else:
+            spent, received = self.cumulative_gets, self.cumulative_pays
+
+        # first offer that is not fully taken
+        index = bisect_right(spent, amount) - 1
+        if index < len(self.qualities):
+            status = 'success'
+            rate = self.qualities[index]
+        else:
+            # the rest is converted with the worst rate
+            status = 'success' if amount == spent[index] \
+                else 'attn_not_enough_funds'
+            rate = self.qualities[-1]
+        left = amount - spent[index]
+
+        amount_to = received[index] + (left / rate if sell else left * rate)
+        return {'status': status, 'amount_to': amount_to}
+
+    def quote_many(self, amounts, sell=False, default_rate=0):
+        """
+        Returns list of `quote` results for every item of `amounts`.
+        """
+        return [self.quote(amount, sell=sell, default_rate=default_rate)
+                for amount in amounts]
@@ -3,18 +3,54 @@
 # system imports:
 import json
 import logging
+import Queue
 import socket
 from decimal import Decimal
 import ssl
+import threading
+import time
 
 # thirdparty imports:
 import requests
 
+# local imports:
+from . import signing
+from .connection import (
+    get_session, get_setting, latency_stats, server_limiter
+)
+from .health import SERVER_ERRORS, get_health_tracker, servers_health
+from .orderbook import OrderBook
+from .trust_lines import TrustLineIndex, line_trusts
+from .cache import get_book_cache, get_reserve_cache
+from .fee import get_fee_oracle
+
 
 logger = logging.getLogger(__name__)
 
 ENGINE_SUCCESS = 'tesSUCCESS'
 
+DEFAULT_BATCH_CONCURRENCY = 10
+
+# lines in a page of `account_lines`, the most rippled returns at once
+ACCOUNT_LINES_PAGE_SIZE = 400
+
+# number of ledgers a signed transaction may be validated in
+DEFAULT_LAST_LEDGER_OFFSET = 20
+# seconds a current ledger index seen in responses is used for
+CURRENT_LEDGER_MAX_AGE = 5
+
+DEFAULT_HEDGE_DELAY = 0.5
+DEFAULT_HEDGE_PERCENTILE = 95
+
+# read-only methods that may be sent to several servers at once
+HEDGED_METHODS = frozenset([
+    'account_info', 'account_lines', 'account_offers', 'account_tx',
+    'book_offers', 'fee', 'ledger', 'ledger_closed', 'ledger_current',
+    'ripple_path_find', 'server_info', 'server_state', 'tx',
+])
+
+TIMEOUT_ERRORS = (requests.exceptions.Timeout, ssl.SSLError, socket.timeout)
+
 '''
    Trust lines flags definition
    Docs: https://ripple.com/build/transactions/#trustset
@@ -111,41 +147,157 @@ def call_api(data, servers=None, server_url=None, api_user=None,
                     'Config', '',
                     'Either use django settings or send servers explicitly')
 
+    if len(servers) > 1 and get_setting('RIPPLE_API_HEALTH_ROUTING', True):
+        servers = get_health_tracker().order(servers)
+
+    if len(servers) > 1 and data.get('method') in HEDGED_METHODS and \
+            get_setting('RIPPLE_API_HEDGE', False):
+        return _call_api_hedged(data, servers, timeout)
+
     error = None
     timeouts = 0
 
     for server_config in servers:
-        url = server_config.get('RIPPLE_API_URL', '')
-        user = server_config.get('RIPPLE_API_USER', '')
-        pwd = server_config.get('RIPPLE_API_PASSWORD', '')
-        auth = (user, pwd) if user or pwd else None
         try:
-            response = requests.post(
-                url, json.dumps(data), auth=auth, verify=False, timeout=timeout)
+            return _call_server(server_config, data, timeout)
         except TypeError:  # e.g. json encode error
             raise
-        except (requests.exceptions.Timeout, ssl.SSLError, socket.timeout) as e:
+        except TIMEOUT_ERRORS:
             timeouts += 1
             continue
         except Exception as e:
             error = e
             continue
 
+    if timeouts == len(servers):
+        raise RippleApiError('Timeout', '', 'rippled timed out')
+
+    raise error
+
+
+def _call_server(server_config, data, timeout):
+    """
+    Sends `data` to one server. Returns result or raises an error.
+    """
+    url = server_config.get('RIPPLE_API_URL', '')
+    user = server_config.get('RIPPLE_API_USER', '')
+    pwd = server_config.get('RIPPLE_API_PASSWORD', '')
+    auth = (user, pwd) if user or pwd else None
+
+    body = json.dumps(data)
+    health = get_health_tracker()
+
+    with server_limiter(url):
+        started = time.time()
         try:
-            result = response.json()['result']
-        except ValueError:
-            error = RippleApiError('Error', '', response.text)
+            response = get_session(url).post(
+                url, body, auth=auth, verify=False, timeout=timeout)
+        except Exception:
+            health.record_failure(url)
+            raise
+        latency = time.time() - started
+        latency_stats.add(url, latency)
+
+    try:
+        result = response.json()['result']
+    except ValueError:
+        health.record_failure(url)
+        raise RippleApiError('Error', '', response.text)
+
+    if 'error' in result:
+        if result['error'] in SERVER_ERRORS:
+            health.record_failure(url)
+        else:
+            health.record_success(url, latency)
+        raise RippleApiError(
+            result['error'],
+            result.get('error_code', 'no_code'),
+            result.get('error_message', 'no_message'),
+        )
+
+    health.record_success(url, latency, result.get('ledger_current_index'))
+    book_cache = get_book_cache()
+    if book_cache is not None:
+        book_cache.observe_ledger(result.get('ledger_current_index'))
+    return result
+
+
+def check_servers(servers=None, timeout=5):
+    """
+    Asks every server for its current ledger index to refresh their health
+    figures. Returns `servers_health()`.
+    """
+    if servers is None:
+        servers = get_setting('RIPPLE_API_DATA', [])
+
+    for server_config in servers:
+        try:
+            _call_server(server_config, {'method': 'ledger_current'}, timeout)
+        except Exception as e:
+            logger.warning('Server %s check failed: %s',
+                           server_config.get('RIPPLE_API_URL', ''), e)
+    return servers_health()
+
+
+def _hedge_delay(server_config):
+    """
+    Returns seconds to wait for `server_config` before asking next server.
+    """
+    delay = get_setting('RIPPLE_API_HEDGE_DELAY', DEFAULT_HEDGE_DELAY)
+    percentile = get_setting('RIPPLE_API_HEDGE_PERCENTILE',
+                             DEFAULT_HEDGE_PERCENTILE)
+    if percentile:
+        delay = latency_stats.percentile(
+            server_config.get('RIPPLE_API_URL', ''), percentile, delay)
+    return delay
+
+
+def _call_api_hedged(data, servers, timeout):
+    """
+    Sends `data` to the first server and to every next one that is asked
+    when the previous has not answered within its hedge delay or failed.
+    Returns the first successful result.
+    """
+    answers = Queue.Queue()
+
+    def request(server_config):
+        try:
+            answers.put((None, _call_server(server_config, data, timeout)))
+        except Exception as e:
+            answers.put((e, None))
+
+    def start(server_config):
+        thread = threading.Thread(target=request, args=(server_config,))
+        thread.daemon = True
+        thread.start()
+        return _hedge_delay(server_config)
+
+    waiting = list(servers)
+    delay = start(waiting.pop(0))
+    in_flight = 1
+    error = None
+    timeouts = 0
+
+    while in_flight:
+        try:
+            e, result = answers.get(timeout=delay if waiting else None)
+        except Queue.Empty:
+            delay = start(waiting.pop(0))
+            in_flight += 1
             continue
 
-        if not 'error' in result:
+        in_flight -= 1
+        if e is None:
             return result
+        if isinstance(e, TypeError):
+            raise e
+        if isinstance(e, TIMEOUT_ERRORS):
+            timeouts += 1
         else:
-            error = RippleApiError(
-                result['error'],
-                result.get('error_code', 'no_code'),
-                result.get('error_message', 'no_message'),
-            )
-            continue
+            error = e
+        if waiting and not in_flight:
+            delay = start(waiting.pop(0))
+            in_flight += 1
 
     if timeouts == len(servers):
         raise RippleApiError('Timeout', '', 'rippled timed out')
@@ -153,8 +305,82 @@ def call_api(data, servers=None, server_url=None, api_user=None,
     raise error
 
 
+def _run_concurrently(func, items, concurrency=None):
+    """
+    Calls `func` with every one of `items` in at most `concurrency` threads,
+    ``RIPPLE_API_BATCH_CONCURRENCY`` setting or 10 by default.
+
+    Yields ``(index, result)`` pairs as calls complete. Failed calls give
+    `RippleApiError` instances instead of raising. Calls not started yet
+    are skipped when the caller stops iterating.
+    """
+    if concurrency is None:
+        concurrency = get_setting('RIPPLE_API_BATCH_CONCURRENCY',
+                                  DEFAULT_BATCH_CONCURRENCY)
+
+    queue = Queue.Queue()
+    for item in enumerate(items):
+        queue.put(item)
+    count = queue.qsize()
+    results = Queue.Queue()
+    stopped = threading.Event()
+
+    def worker():
+        while not stopped.is_set():
+            try:
+                index, item = queue.get_nowait()
+            except Queue.Empty:
+                return
+            try:
+                result = func(item)
+            except RippleApiError as e:
+                result = e
+            except Exception as e:
+                result = RippleApiError('Error', '', unicode(e))
+            results.put((index, result))
+
+    workers = [threading.Thread(target=worker)
+               for _ in xrange(min(max(concurrency, 1), count))]
+    for thread in workers:
+        thread.start()
+    try:
+        for _ in xrange(count):
+            yield results.get()
+    finally:
+        stopped.set()
+        for thread in workers:
+            thread.join()
+
+
+def call_api_batch(batch, concurrency=None, servers=None, server_url=None,
+                   api_user=None, api_password=None, timeout=5):
+    """
+    Sends many JSON-RPC requests over pooled connections.
+
+    Params:
+        `batch`:
+            List of request bodies, as accepted by `call_api`.
+
+        `concurrency`:
+            Maximum number of requests in flight. Defaults to
+            ``RIPPLE_API_BATCH_CONCURRENCY`` setting or 10.
+
+    Returns list of results in the order of `batch`. Failed items are
+    represented by `RippleApiError` instances instead of raising.
+    """
+    def call(data):
+        return call_api(data, servers=servers, server_url=server_url,
+                        api_user=api_user, api_password=api_password,
+                        timeout=timeout)
+
+    results = [None] * len(batch)
+    for index, result in _run_concurrently(call, batch, concurrency):
+        results[index] = result
+    return results
+
+
 def account_info(account, servers=None, server_url=None, api_user=None,
-                 api_password=None, timeout=5):
+                 api_password=None, timeout=5, ledger_index='validated'):
 
     request = {
         "method": "account_info",
@@ -162,7 +388,7 @@ def account_info(account, servers=None, server_url=None, api_user=None,
             {
                 "account": account,
                 "strict": True,
-                "ledger_index": "validated"
+                "ledger_index": ledger_index
             }
         ]
     }
@@ -175,7 +401,8 @@ def account_info(account, servers=None, server_url=None, api_user=None,
 def account_tx(
         account, ledger_index_min=-1, ledger_index_max=-1, binary=False,
         forward=False, limit=None, marker=None,
-        server_url=None, api_user=None, api_password=None, timeout=5):
+        server_url=None, api_user=None, api_password=None, timeout=5,
+        servers=None):
     """
     Fetch a list of transactions that applied to this account.
 
@@ -212,7 +439,9 @@ def account_tx(
     if marker:
         data['params'][0]['marker'] = marker
 
-    return call_api(data, server_url, api_user, api_password, timeout=timeout)
+    return call_api(data, servers=servers, server_url=server_url,
+                    api_user=api_user, api_password=api_password,
+                    timeout=timeout)
 
 
 def tx(transaction_id, servers=None, server_url=None, api_user=None,
@@ -233,6 +462,106 @@ def tx(transaction_id, servers=None, server_url=None, api_user=None,
                     timeout=timeout)
 
 
+def tx_many(transaction_ids, concurrency=None, servers=None, server_url=None,
+            api_user=None, api_password=None, timeout=5):
+    """
+    Return information about many transactions at once.
+
+    Params:
+
+        `transaction_ids`:
+            Hashes of transactions.
+
+        `concurrency`:
+            Maximum number of requests in flight.
+
+    Returns dict of hash to `tx` result or `RippleApiError` instance.
+    """
+    transaction_ids = list(set(transaction_ids))
+    batch = [{"method": "tx", "params": [{'transaction': transaction_id}]}
+             for transaction_id in transaction_ids]
+
+    results = call_api_batch(batch, concurrency=concurrency, servers=servers,
+                             server_url=server_url, api_user=api_user,
+                             api_password=api_password, timeout=timeout)
+    return dict(zip(transaction_ids, results))
+
+
+def validated_ledger_index(servers=None, server_url=None, api_user=None,
+                           api_password=None, timeout=5):
+    """
+    Returns index of the latest validated ledger.
+    """
+    result = call_api({'method': 'ledger',
+                       'params': [{'ledger_index': 'validated'}]},
+                      servers=servers, server_url=server_url,
+                      api_user=api_user, api_password=api_password,
+                      timeout=timeout)
+    return int(result['ledger_index'])
+
+
+def current_ledger_index(servers=None, server_url=None, api_user=None,
+                         api_password=None, timeout=5):
+    """
+    Returns index of the current open ledger. Index seen in a recent
+    response is used when available, so usually no request is made.
+    """
+    ledger_index = get_health_tracker().ledger_index(CURRENT_LEDGER_MAX_AGE)
+    if ledger_index:
+        return ledger_index
+
+    result = call_api({'method': 'ledger_current', 'params': [{}]},
+                      servers=servers, server_url=server_url,
+                      api_user=api_user, api_password=api_password,
+                      timeout=timeout)
+    return int(result['ledger_current_index'])
+
+
+def get_last_ledger_sequence(servers=None, server_url=None, api_user=None,
+                             api_password=None, timeout=5):
+    """
+    Returns ``LastLedgerSequence`` for a transaction signed now, i.e.
+    current ledger index plus ``RIPPLE_API_LAST_LEDGER_OFFSET`` setting, or
+    None if the setting is 0.
+    """
+    offset = get_setting('RIPPLE_API_LAST_LEDGER_OFFSET',
+                         DEFAULT_LAST_LEDGER_OFFSET)
+    if not offset:
+        return None
+    return current_ledger_index(
+        servers=servers, server_url=server_url, api_user=api_user,
+        api_password=api_password, timeout=timeout) + offset
+
+
+def server_fee(servers=None, server_url=None, api_user=None,
+               api_password=None, timeout=5):
+    """
+    Returns result of rippled ``fee`` method: transaction cost levels and
+    queue state of the open ledger.
+    """
+    return call_api({'method': 'fee', 'params': [{}]},
+                    servers=servers, server_url=server_url,
+                    api_user=api_user, api_password=api_password,
+                    timeout=timeout)
+
+
+def estimate_fee(servers=None, server_url=None, api_user=None,
+                 api_password=None, timeout=5):
+    """
+    Returns fee in drops for a transaction submitted now. Picked by
+    `ripple_api.fee.FeeOracle` from a recent `server_fee` result, it is the
+    default fee of all transactions built here.
+    """
+    def load():
+        return server_fee(servers=servers, server_url=server_url,
+                          api_user=api_user, api_password=api_password,
+                          timeout=timeout)
+
+    key = (tuple(server.get('RIPPLE_API_URL') for server in servers or ()),
+           server_url)
+    return get_fee_oracle().fee(key, load)
+
+
 def path_find(account, destination, amount, source_currencies=None, servers=None,
               server_url=None, api_user=None, api_password=None, timeout=5):
     '''
@@ -269,7 +598,7 @@ def path_find(account, destination, amount, source_currencies=None, servers=None
 def sign(account, secret, destination, amount, send_max=None, paths=None,
          flags=None, destination_tag=None, transaction_type='Payment',
          servers=None, server_url=None, api_user=None, api_password=None,
-         timeout=5, fee=10000):
+         timeout=5, fee=None, sequence=None, last_ledger_sequence=None):
     """
     After you've created a transaction it must be cryptographically signed using the secret belonging to the owner of
     the sending address. Signing a transaction prior to submission allows you to maintain closer control over
@@ -302,7 +631,23 @@ def sign(account, secret, destination, amount, send_max=None, paths=None,
 
         `destination_tag`:
             Tag to identify the reason for payment.
+
+        `fee`:
+            Fee in drops, `estimate_fee` if not set.
+
+        `sequence`:
+            ``Sequence`` of the transaction, e.g. from
+            `ripple_api.sequence.allocate_sequence`. Filled in by rippled
+            if not set.
+
+        `last_ledger_sequence`:
+            Index of the last ledger the transaction may be validated in,
+            e.g. from `get_last_ledger_sequence`.
     """
+    if fee is None:
+        fee = estimate_fee(servers=servers, server_url=server_url,
+                           api_user=api_user, api_password=api_password,
+                           timeout=timeout)
     data = {
         "method": "sign",
         "params": [
@@ -326,6 +671,83 @@ def sign(account, secret, destination, amount, send_max=None, paths=None,
         data['params'][0]['tx_json']['Flags'] = flags
     if destination_tag:
         data['params'][0]['tx_json']['DestinationTag'] = destination_tag
+    if sequence is not None:
+        data['params'][0]['tx_json']['Sequence'] = sequence
+    if last_ledger_sequence:
+        data['params'][0]['tx_json']['LastLedgerSequence'] = \
+            last_ledger_sequence
+
+    if _local_signing():
+        return sign_locally(data['params'][0]['tx_json'], secret,
+                            servers=servers, server_url=server_url,
+                            api_user=api_user, api_password=api_password,
+                            timeout=timeout)
+
+    return call_api(data, servers=servers, server_url=server_url,
+                    api_user=api_user, api_password=api_password,
+                    timeout=timeout)
+
+
+def _local_signing():
+    return get_setting('RIPPLE_API_LOCAL_SIGNING', False)
+
+
+def sign_locally(tx_json, secret, servers=None, server_url=None,
+                 api_user=None, api_password=None, timeout=5):
+    """
+    Signs `tx_json` in process, `secret` is not sent to rippled. Returns
+    the same data as `sign`.
+
+    Missing ``Sequence`` is read with `account_info` from the current
+    ledger, that is the only rippled call made.
+    """
+    try:
+        keypair = signing.Keypair.from_seed(secret)
+    except signing.SigningError, e:
+        raise RippleApiError('badSecret', '', unicode(e))
+
+    tx_json = dict(tx_json)
+    if 'Sequence' not in tx_json:
+        info = account_info(tx_json['Account'], servers=servers,
+                            server_url=server_url, api_user=api_user,
+                            api_password=api_password, timeout=timeout,
+                            ledger_index='current')
+        tx_json['Sequence'] = info['account_data']['Sequence']
+
+    try:
+        return signing.sign_transaction(tx_json, keypair)
+    except signing.SigningError, e:
+        raise RippleApiError('invalidParams', '', unicode(e))
+
+
+def sign_and_submit(tx_json, secret, fail_hard=False, servers=None,
+                    server_url=None, api_user=None, api_password=None,
+                    timeout=5):
+    """
+    Signs and submits `tx_json`.
+
+    With ``RIPPLE_API_LOCAL_SIGNING`` setting the transaction is signed
+    with `sign_locally` and only the signed blob is submitted, otherwise
+    `secret` is sent to rippled to sign the transaction.
+    """
+    if _local_signing():
+        signed = sign_locally(tx_json, secret, servers=servers,
+                              server_url=server_url, api_user=api_user,
+                              api_password=api_password, timeout=timeout)
+        return submit(signed['tx_blob'], fail_hard=fail_hard,
+                      servers=servers, server_url=server_url,
+                      api_user=api_user, api_password=api_password,
+                      timeout=timeout)
+
+    data = {
+        "method": "submit",
+        "params": [{
+            "secret": secret,
+            "tx_json": tx_json,
+        }]
+    }
+    if fail_hard:
+        data['params'][0]['fail_hard'] = fail_hard
 
     return call_api(data, servers=servers, server_url=server_url,
                     api_user=api_user, api_password=api_password,
@@ -355,35 +777,196 @@ def submit(tx_blob, fail_hard=False, servers=None, server_url=None,
                     timeout=timeout)
 
 
+def iter_account_lines(account, peer=None, ledger_index='validated',
+                       limit=None, servers=None, server_url=None,
+                       api_user=None, api_password=None, timeout=5):
+    """
+    Yields trust lines of `account` page by page.
+
+    Params:
+        `peer` (optional):
+            ripple address, only lines between `account` and `peer` are
+            returned.
+
+        `ledger_index` (optional):
+            "validated" (default), "current" or ledger index. Pages after
+            the first one are read from the ledger the first one was, so
+            lines are consistent even if the ledger changes meanwhile.
+
+        `limit` (optional):
+            Number of lines in a page, ``ACCOUNT_LINES_PAGE_SIZE`` by
+            default.
+
+    Next page is requested only when the lines of the previous one are
+    consumed, so stopping early saves requests.
+    """
+    params = {
+        'account': account,
+        'ledger_index': ledger_index,
+        'limit': limit or ACCOUNT_LINES_PAGE_SIZE,
+    }
+    if peer:
+        params['peer'] = peer
+
+    while True:
+        result = call_api({'method': 'account_lines', 'params': [params]},
+                          servers=servers, server_url=server_url,
+                          api_user=api_user, api_password=api_password,
+                          timeout=timeout)
+        for line in result['lines']:
+            yield line
+
+        marker = result.get('marker')
+        if not marker:
+            return
+        params = dict(
+            params, marker=marker,
+            ledger_index=result.get('ledger_index') or
+            result.get('ledger_current_index') or params['ledger_index'])
+
+
 def balance(account, issuers, currency, servers=None, server_url=None,
-            api_user=None, api_password=None, timeout=5):
+            api_user=None, api_password=None, timeout=5, ledger_index=None):
+    """
+    Returns balance of `account` in `currency`, summed over lines of
+    `issuers`, an address or a list of them, or of all issuers if None.
 
+    `ledger_index` is the validated ledger for XRP and the current one for
+    other currencies by default.
+    """
     if currency == "XRP":
         info = account_info(account, servers=servers, server_url=server_url,
                             api_user=api_user, api_password=api_password,
-                            timeout=timeout)
+                            timeout=timeout,
+                            ledger_index=ledger_index or 'validated')
         return Decimal(info["account_data"]["Balance"]) / Decimal(1e6)
 
-    results = call_api({'method': 'account_lines',
-                        'params': [{'account': account}]
-                        },
-                       servers=servers,
-                       server_url=server_url,
-                       api_user=api_user,
-                       api_password=api_password,
-                       timeout=timeout,
-                       )
+    if isinstance(issuers, basestring):
+        issuers = [issuers]
+    # there is one line per peer and currency, so lines of given issuers
+    # are done once all of them are found
+    remaining = set(issuers) if issuers is not None else None
+    peer = list(remaining)[0] if remaining and len(remaining) == 1 else None
+
     total = Decimal('0.0')
-    for line in results['lines']:
-        if line['currency'] == currency:
-            if issuers is None or line['account'] in issuers:
-                total += Decimal(line['balance'])
+    lines = iter_account_lines(account, peer=peer,
+                               ledger_index=ledger_index or 'current',
+                               servers=servers, server_url=server_url,
+                               api_user=api_user, api_password=api_password,
+                               timeout=timeout)
+    for line in lines:
+        if line['currency'] != currency:
+            continue
+        if remaining is None:
+            total += Decimal(line['balance'])
+        elif line['account'] in remaining:
+            total += Decimal(line['balance'])
+            remaining.discard(line['account'])
+            if not remaining:
+                break
     return total
 
 
+def reserves(servers=None, server_url=None, api_user=None,
+             api_password=None, timeout=5):
+    """
+    Returns base and owner reserves in drops of the last validated ledger:
+    an account has to keep base reserve plus owner reserve per object it
+    owns. Cached for ``RIPPLE_API_RESERVE_TTL`` seconds.
+    """
+    def load():
+        result = call_api({'method': 'server_state', 'params': [{}]},
+                          servers=servers, server_url=server_url,
+                          api_user=api_user, api_password=api_password,
+                          timeout=timeout)
+        ledger = result['state']['validated_ledger']
+        return int(ledger['reserve_base']), int(ledger['reserve_inc'])
+
+    key = (tuple(server.get('RIPPLE_API_URL') for server in servers or ()),
+           server_url)
+    return get_reserve_cache().get(key, load)
+
+
+def balances(account, issuers=None, servers=None, server_url=None,
+             api_user=None, api_password=None, timeout=5,
+             ledger_index='validated'):
+    """
+    Returns all balances of `account` read from one ledger:
+
+        {
+            'ledger_index': 12159865,
+            'xrp': {
+                'balance': Decimal('50.488267'),
+                # base reserve plus owner reserve per owned object
+                'reserve': Decimal('35'),
+                # balance above the reserve
+                'spendable': Decimal('15.488267'),
+            },
+            'currencies': {
+                'USD': {
+                    'total': Decimal('2.55'),
+                    'issuers': {'rhhPz...': Decimal('1.76'), ...},
+                },
+                ...
+            },
+        }
+
+    Params:
+        `issuers` (optional):
+            ripple addresses, only trust lines with them are counted.
+    """
+    connection = dict(servers=servers, server_url=server_url,
+                      api_user=api_user, api_password=api_password,
+                      timeout=timeout)
+
+    info = account_info(account, ledger_index=ledger_index, **connection)
+    account_data = info['account_data']
+    reserve_base, reserve_inc = reserves(**connection)
+
+    xrp = Decimal(account_data['Balance'])
+    reserve = reserve_base + reserve_inc * account_data.get('OwnerCount', 0)
+    drops = Decimal(1000000)
+
+    currencies = {}
+    lines = iter_account_lines(
+        account, ledger_index=info.get('ledger_index') or ledger_index,
+        **connection)
+    for line in lines:
+        if issuers is not None and line['account'] not in issuers:
+            continue
+        value = Decimal(line['balance'])
+        currency = currencies.setdefault(
+            line['currency'], {'total': Decimal('0.0'), 'issuers': {}})
+        currency['total'] += value
+        currency['issuers'][line['account']] = value
+
+    return {
+        'ledger_index': info.get('ledger_index'),
+        'xrp': {
+            'balance': xrp / drops,
+            'reserve': reserve / drops,
+            'spendable': max(xrp - reserve, 0) / drops,
+        },
+        'currencies': currencies,
+    }
+
+
+def trust_line_index(account, peer=None, ledger_index='validated',
+                     servers=None, server_url=None, api_user=None,
+                     api_password=None, timeout=5):
+    """
+    Returns `TrustLineIndex` of all trust lines of `account`, or only of
+    its lines with `peer`, read with `iter_account_lines`.
+    """
+    return TrustLineIndex(iter_account_lines(
+        account, peer=peer, ledger_index=ledger_index, servers=servers,
+        server_url=server_url, api_user=api_user, api_password=api_password,
+        timeout=timeout))
+
+
 def is_trust_set(trusts, peer, currency='', limit=0,
                  servers=None, server_url=None, api_user=None,
-                 api_password=None, timeout=5):
+                 api_password=None, timeout=5, ledger_index='current'):
     """
     checks if 'trusts' trusts 'peer' with specified currency and limit
 
@@ -397,44 +980,113 @@ def is_trust_set(trusts, peer, currency='', limit=0,
             currency in which trust should be verified
         `limit` (optional):
             minimal amount of trust
+        `ledger_index` (optional):
+            ledger to check, the current one by default
 
     Returns boolean
 
     """
-    trust_result = False
+    lines = iter_account_lines(trusts, peer=peer, ledger_index=ledger_index,
+                               servers=servers, server_url=server_url,
+                               api_user=api_user, api_password=api_password,
+                               timeout=timeout)
+    # next pages are not read once the line is found
+    for line in lines:
+        if line['account'] != peer:
+            continue
+        if not currency:
+            return True
+        if currency == line['currency']:
+            return line_trusts(line, limit)
 
-    trust_lines = call_api(
-        {
-            'method': 'account_lines',
-            'params': [{
-                'account': trusts,
-                'peer': peer
-            }]
-        },
-        servers=servers, server_url=server_url,
-        api_user=api_user, api_password=api_password,
-        timeout=timeout,
-    )
+    return False
 
-    status = trust_lines['status'] == 'success'
-    trusts = trust_lines['lines']
-    if status and trusts and not currency:
-        trust_result = True
 
-    elif status and trusts and currency:
-        for trust in trusts:
+def ledger_index_of(ledger_index='validated', servers=None,
+                    server_url=None, api_user=None, api_password=None,
+                    timeout=5):
+    """
+    Returns index of ledger `ledger_index`: "validated", "closed",
+    "current" or an index, which is returned as is.
+    """
+    if isinstance(ledger_index, (int, long)):
+        return ledger_index
+    if ledger_index == 'current':
+        return current_ledger_index(servers=servers, server_url=server_url,
+                                    api_user=api_user,
+                                    api_password=api_password,
+                                    timeout=timeout)
+    result = call_api({'method': 'ledger',
+                       'params': [{'ledger_index': ledger_index}]},
+                      servers=servers, server_url=server_url,
+                      api_user=api_user, api_password=api_password,
+                      timeout=timeout)
+    return int(result['ledger_index'])
 
-            if currency == trust['currency']:
-                trust_result = float(limit) <= float(trust['limit'])
-                break
 
-    return trust_result
+def balance_many(accounts, issuers, currency, concurrency=None,
+                 ledger_index='validated', servers=None, server_url=None,
+                 api_user=None, api_password=None, timeout=5):
+    """
+    Checks `balance` of many `accounts` at once, all of them in the same
+    ledger `ledger_index`.
+
+    Params:
+        `concurrency`:
+            Maximum number of accounts checked at once. Defaults to
+            ``RIPPLE_API_BATCH_CONCURRENCY`` setting or 10.
+
+    Yields ``(account, balance)`` pairs as checks complete. Balance is a
+    `RippleApiError` instance if the check failed.
+    """
+    connection = dict(servers=servers, server_url=server_url,
+                      api_user=api_user, api_password=api_password,
+                      timeout=timeout)
+    accounts = list(accounts)
+    ledger_index = ledger_index_of(ledger_index, **connection)
+
+    def check(account):
+        return balance(account, issuers, currency,
+                       ledger_index=ledger_index, **connection)
+
+    for index, result in _run_concurrently(check, accounts, concurrency):
+        yield accounts[index], result
+
+
+def is_trust_set_many(trusts, peer, currency='', limit=0, concurrency=None,
+                      ledger_index='validated', servers=None,
+                      server_url=None, api_user=None, api_password=None,
+                      timeout=5):
+    """
+    Checks `is_trust_set` of many `trusts` accounts with the same `peer`
+    at once, all of them in the same ledger `ledger_index`.
+
+    Params:
+        `concurrency`:
+            Maximum number of accounts checked at once. Defaults to
+            ``RIPPLE_API_BATCH_CONCURRENCY`` setting or 10.
+
+    Yields ``(account, is_trust_set)`` pairs as checks complete. The
+    second item is a `RippleApiError` instance if the check failed.
+    """
+    connection = dict(servers=servers, server_url=server_url,
+                      api_user=api_user, api_password=api_password,
+                      timeout=timeout)
+    trusts = list(trusts)
+    ledger_index = ledger_index_of(ledger_index, **connection)
+
+    def check(account):
+        return is_trust_set(account, peer, currency=currency, limit=limit,
+                            ledger_index=ledger_index, **connection)
+
+    for index, result in _run_concurrently(check, trusts, concurrency):
+        yield trusts[index], result
 
 
 def book_offer(
     taker_pays_curr, taker_pays_curr_issuer, taker_gets_curr, taker_gets_curr_issuer, taker_address='',
     ledger='current', marker='', autobridge=True, server_url=None,
-    api_user=None, api_password=None, timeout=5):
+    api_user=None, api_password=None, timeout=5, servers=None):
     """
     Gets currency exchange rates
 
@@ -458,6 +1110,9 @@ def book_offer(
             Token indicating start of page, it is returned from a previous invocation.
         'autobridge' (optional):
             If present, specifies synthesize orders through XRP books. Defaults to true
+
+    Results for the current ledger are cached when
+    ``RIPPLE_API_BOOK_CACHE_TTL`` setting is set.
     """
     taker_pays = 'XRP' if taker_pays_curr == 'XRP' else {
         "currency": taker_pays_curr, "issuer": taker_pays_curr_issuer
@@ -477,14 +1132,30 @@ def book_offer(
     if taker_address:
         data["params"][0]["taker"] = taker_address
 
-    return call_api(data, server_url, api_user, api_password, timeout=timeout)
+    def load():
+        return call_api(data, servers=servers, server_url=server_url,
+                        api_user=api_user, api_password=api_password,
+                        timeout=timeout)
+
+    book_cache = get_book_cache()
+    if book_cache is None or marker or ledger != 'current':
+        return load()
+
+    key = (taker_pays_curr, taker_pays_curr_issuer,
+           taker_gets_curr, taker_gets_curr_issuer,
+           taker_address, autobridge)
+    return book_cache.get(key, load, _ledger_index)
+
+
+def _ledger_index(result):
+    return result.get('ledger_current_index') or result.get('ledger_index')
 
 
 def create_offer(taker_pays, taker_gets,
                  account=None,
                  secret=None,
                  timeout=5,
-                 fee=10000, flags=0):
+                 fee=None, flags=0):
     """
     taker - user, that accepts your offer
     takes:
@@ -500,8 +1171,11 @@ def create_offer(taker_pays, taker_gets,
             'issuer':   - str   - issuer
         }
         or Decimal(amount) if currency is XRP
+        fee - fee in drops, `estimate_fee` if not set
     """
 
+    if fee is None:
+        fee = estimate_fee(timeout=timeout)
     if isinstance(taker_pays, dict):
         taker_pays['value'] = "%.12f" % taker_pays['value']
     else:
@@ -511,21 +1185,43 @@ def create_offer(taker_pays, taker_gets,
     else:
         taker_gets = "%.12f" % taker_gets
     offer = {
-        "method": "submit",
-        "params": [{
-            "secret": secret,
-            "tx_json": {
-                "TransactionType": "OfferCreate",
-                "Fee": str(fee),
-                "Flags": flags,
-                "Account": account,
-                "TakerPays": taker_pays,
-                "TakerGets": taker_gets,
-            },
-        }]
+        "TransactionType": "OfferCreate",
+        "Fee": str(fee),
+        "Flags": flags,
+        "Account": account,
+        "TakerPays": taker_pays,
+        "TakerGets": taker_gets,
     }
 
-    return call_api(offer, timeout=timeout)
+    return sign_and_submit(offer, secret, timeout=timeout)
+
+
+def order_book(taker_pays_curr, taker_pays_curr_issuer, taker_gets_curr,
+               taker_gets_curr_issuer, taker_address='', servers=None,
+               server_url=None, api_user=None, api_password=None,
+               timeout=5):
+    """
+    Returns `OrderBook` of the current ledger offers, see `book_offer`.
+
+    Parsed order books are cached like `book_offer` results when
+    ``RIPPLE_API_BOOK_CACHE_TTL`` setting is set, so repeated conversions
+    in one ledger do not parse the offers again.
+    """
+    def load():
+        return OrderBook.from_response(book_offer(
+            taker_pays_curr, taker_pays_curr_issuer,
+            taker_gets_curr, taker_gets_curr_issuer,
+            taker_address=taker_address, servers=servers,
+            server_url=server_url, api_user=api_user,
+            api_password=api_password, timeout=timeout))
+
+    book_cache = get_book_cache()
+    if book_cache is None:
+        return load()
+
+    key = ('order_book', taker_pays_curr, taker_pays_curr_issuer,
+           taker_gets_curr, taker_gets_curr_issuer, taker_address)
+    return book_cache.get(key, load, lambda book: book.ledger_index)
 
 
 def convert(amount_from,
@@ -535,75 +1231,30 @@ def convert(amount_from,
             call_offer=True, default_rate=0,
             sell=False, reverse=False):
 
-    offers_all = []
     if reverse:
         currency_from, currency_to = currency_to, currency_from
         issuer_from, issuer_to = issuer_to, issuer_from
 
-    def check_offers(offers_info):
-        status = offers_info['status']
-        offers_all = offers_info['offers']
-        if not offers_all:
-            status = 'no_offers'
-        return status, offers_all
-
     # find offers from provided
+    book = None
     if offers_info:
-        status, offers_all = check_offers(offers_info)
+        book = OrderBook.from_response(offers_info)
 
-    if not offers_all and call_offer:
+    if not book and call_offer:
         try:
-            offers_info = book_offer(
+            book = order_book(
                 currency_from, issuer_from, currency_to, issuer_to,
                 taker_address=taker_address,
             )
-            # conn_status = offers_info['status']
-            status, offers_all = check_offers(offers_info)
         except Exception:
-            status = 'error'
-
-    # convert
-    amount_to = 0
-    if offers_all:
-        convert_left = Decimal(amount_from)
-        for offer in offers_all:
-            if 'taker_gets_funded' in offer:
-                pays = Decimal(extract_value(offer['taker_pays_funded']))
-                gets = Decimal(extract_value(offer['taker_gets_funded']))
-            else:
-                pays = Decimal(extract_value(offer['TakerPays']))
-                gets = Decimal(extract_value(offer['TakerGets']))
-
-            if not sell:
-                if convert_left < gets:
-                    rate = Decimal(offer['quality'])
-                    amount_to += convert_left * rate
-                    convert_left = 0
-                    break
-                convert_left -= gets
-                amount_to += pays
-            else:
-                if convert_left < pays:
-                    rate = Decimal(offer['quality'])
-                    amount_to += convert_left / rate
-                    convert_left = 0
-                    break
-                convert_left -= pays
-                amount_to += gets
+            book = None
 
-        status = 'success'
-        if convert_left:
-            rate = Decimal(offers_all[-1]['quality'])
-            amount_to += convert_left * rate if not sell else convert_left / rate
-            status = 'attn_not_enough_funds'
+    if book is None:
+        # get default rate if offers are unknown
+        return {'status': 'error',
+                'amount_to': Decimal(default_rate) * Decimal(amount_from)}
 
-    # get default rate if nothing found
-    elif not offers_all and default_rate:
-        status = 'default' if not status else status
-        amount_to = Decimal(default_rate) * Decimal(amount_from)
-
-    return {'status': status,
-            'amount_to': Decimal(amount_to)}
+    return book.quote(amount_from, sell=sell, default_rate=default_rate)
 
 
 def extract_value(taker_pays_or_gets):
@@ -667,7 +1318,7 @@ def buy_xrp(amount, account, secret, servers=None):
 def trust_set(account, secret, destination, amount, currency,
               flags=NO_FLAGS, destination_tag=None,
               servers=None, server_url=None, api_user=None, api_password=None,
-              timeout=5, fee=10000):
+              timeout=5, fee=None):
     """
         Creates, updates or deletes trust line from account to destination
         with amount of currency
@@ -688,7 +1339,8 @@ def trust_set(account, secret, destination, amount, currency,
 
             currency -- currency of trust line
 
-            fee -- (optional) XRP drops of ripple fee. Default = 10000 drops
+            fee -- (optional) XRP drops of ripple fee. Default is
+                   estimated with `estimate_fee`
 
             flags -- (optional) integer or dictionary - {
                 "Auth":
@@ -731,31 +1383,30 @@ def trust_set(account, secret, destination, amount, currency,
             (CLEAR_FREEZE if not flags.get("Freeze", True) else 0)
         )
 
+    if fee is None:
+        fee = estimate_fee(servers=servers, server_url=server_url,
+                           api_user=api_user, api_password=api_password,
+                           timeout=timeout)
+
     trustset = {
-        "method": "submit",
-        "params": [{
-            "secret": secret,
-            "tx_json": {
-                "TransactionType": "TrustSet",
-                "Fee": str(fee),
-                "Flags": flags,
-                "Account": account,
-                "LimitAmount": {
-                    "currency": currency,
-                    "issuer": destination,
-                    "value": "%.2f" % amount
-                }
-            },
-        }]
+        "TransactionType": "TrustSet",
+        "Fee": str(fee),
+        "Flags": flags,
+        "Account": account,
+        "LimitAmount": {
+            "currency": currency,
+            "issuer": destination,
+            "value": "%.2f" % amount
+        }
     }
 
     logger.info("Trying to submit TrustSet")
 
-    result = call_api(trustset,
-                      servers=servers, server_url=server_url,
-                      api_user=api_user, api_password=api_password,
-                      timeout=timeout
-                      )
+    result = sign_and_submit(trustset, secret,
+                             servers=servers, server_url=server_url,
+                             api_user=api_user, api_password=api_password,
+                             timeout=timeout
+                             )
 
     if result['status'] == 'success':
         logger.info("TrustSet was successfully submitted")
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+Allocation of transaction ``Sequence`` numbers.
+
+rippled fills ``Sequence`` in from the last validated state of the account,
+so two transactions signed before the first one is in a ledger get the
+same number. Sequences handed out here are kept in the database, so
+concurrent workers, also in different processes, get consecutive numbers
+and an account may have many transactions in flight.
+"""
+
+# thirdparty imports:
+from django.db import transaction as db_transaction
+
+# local imports:
+from .models import AccountSequence
+from .ripple_api import account_info
+
+
+# submit results after which the sequence is used by the transaction
+SEQUENCE_CONSUMED = ('tes', 'tec')
+SEQUENCE_QUEUED = 'terQUEUED'
+
+
+def allocate_sequence(account, count=1, servers=None, server_url=None,
+                      api_user=None, api_password=None, timeout=5):
+    """
+    Returns next unused ``Sequence`` of `account`. With `count` the
+    following ``count - 1`` sequences are reserved too, e.g. for a batch
+    of transactions.
+
+    The counter is read with `account_info` from the current ledger the
+    first time and after `resync_sequence`, later calls only increment it.
+    """
+    AccountSequence.objects.get_or_create(account=account)
+
+    with db_transaction.atomic():
+        counter = AccountSequence.objects.select_for_update().get(
+            account=account)
+        if counter.sequence is None:
+            info = account_info(account, servers=servers,
+                                server_url=server_url, api_user=api_user,
+                                api_password=api_password, timeout=timeout,
+                                ledger_index='current')
+            counter.sequence = info['account_data']['Sequence']
+        sequence = counter.sequence
+        counter.sequence += count
+        counter.save()
+
+    return sequence
+
+
+def resync_sequence(account):
+    """
+    Makes next `allocate_sequence` read the sequence from rippled again.
+    Called when an allocated sequence was not used or was rejected.
+    """
+    AccountSequence.objects.filter(account=account).update(sequence=None)
+
+
+def sequence_consumed(engine_result):
+    """
+    Checks if transaction submitted with `engine_result` uses its sequence.
+    Otherwise, e.g. on ``tefPAST_SEQ`` or ``terPRE_SEQ``, the counter has
+    to be resynced.
+    """
+    return engine_result.startswith(SEQUENCE_CONSUMED) or \
+        engine_result == SEQUENCE_QUEUED
@@ -0,0 +1,593 @@
+# -*- coding: utf-8 -*-
+"""
+Offline signing of rippled transactions.
+
+Transactions are serialized to the rippled binary format and signed with
+keys derived from the account family seed, so the secret never leaves the
+process and signing needs no rippled round trip. Both secp256k1 (``s...``)
+and ed25519 (``sEd...``) seeds are supported, curve operations are done by
+``ecdsa`` package.
+
+Usage:
+
+    signed = sign_transaction(tx_json, secret)
+    submit(signed['tx_blob'])
+"""
+
+# system imports:
+from decimal import Decimal
+import hashlib
+import struct
+
+# thirdparty imports:
+from ecdsa import (
+    BadSignatureError, Ed25519, SECP256k1, SigningKey, VerifyingKey
+)
+from ecdsa.der import UnexpectedDER
+from ecdsa.keys import MalformedPointError
+from ecdsa.util import sigdecode_der, sigencode_der_canonize
+
+# local imports:
+from .utils import decode_account_id, decode_base58check, encode_account_id
+
+
+SECP256K1 = 'secp256k1'
+ED25519 = 'ed25519'
+
+ACCOUNT_ID_PREFIX = '\x00'
+FAMILY_SEED_PREFIX = '\x21'
+ED25519_SEED_PREFIX = '\x01\xe1\x4b'
+ED25519_KEY_PREFIX = '\xed'
+
+HASH_PREFIX_TRANSACTION_ID = 'TXN\x00'
+HASH_PREFIX_TRANSACTION_SIGN = 'STX\x00'
+
+TRANSACTION_TYPES = {
+    'Payment': 0,
+    'AccountSet': 3,
+    'SetRegularKey': 5,
+    'OfferCreate': 7,
+    'OfferCancel': 8,
+    'TrustSet': 20,
+}
+
+# serialized type codes
+UINT16 = 1
+UINT32 = 2
+UINT64 = 3
+HASH128 = 4
+HASH256 = 5
+AMOUNT = 6
+BLOB = 7
+ACCOUNT = 8
+OBJECT = 14
+ARRAY = 15
+UINT8 = 16
+HASH160 = 17
+PATHSET = 18
+
+# field name -> (type code, field code)
+FIELDS = {
+    'TransactionType': (UINT16, 2),
+
+    'Flags': (UINT32, 2),
+    'SourceTag': (UINT32, 3),
+    'Sequence': (UINT32, 4),
+    'Expiration': (UINT32, 10),
+    'TransferRate': (UINT32, 11),
+    'DestinationTag': (UINT32, 14),
+    'QualityIn': (UINT32, 20),
+    'QualityOut': (UINT32, 21),
+    'OfferSequence': (UINT32, 25),
+    'LastLedgerSequence': (UINT32, 27),
+    'SetFlag': (UINT32, 33),
+    'ClearFlag': (UINT32, 34),
+    'TicketSequence': (UINT32, 41),
+
+    'AccountTxnID': (HASH256, 9),
+    'InvoiceID': (HASH256, 17),
+
+    'Amount': (AMOUNT, 1),
+    'LimitAmount': (AMOUNT, 3),
+    'TakerPays': (AMOUNT, 4),
+    'TakerGets': (AMOUNT, 5),
+    'Fee': (AMOUNT, 8),
+    'SendMax': (AMOUNT, 9),
+    'DeliverMin': (AMOUNT, 10),
+
+    'SigningPubKey': (BLOB, 3),
+    'TxnSignature': (BLOB, 4),
+    'Domain': (BLOB, 7),
+    'MemoType': (BLOB, 12),
+    'MemoData': (BLOB, 13),
+    'MemoFormat': (BLOB, 14),
+
+    'Account': (ACCOUNT, 1),
+    'Destination': (ACCOUNT, 3),
+    'RegularKey': (ACCOUNT, 8),
+
+    'Memo': (OBJECT, 10),
+    'Memos': (ARRAY, 9),
+
+    'TickSize': (UINT8, 16),
+
+    'Paths': (PATHSET, 1),
+}
+
+# fields left out of the data that is signed
+NON_SIGNING_FIELDS = frozenset(['TxnSignature'])
+
+OBJECT_END = '\xe1'
+ARRAY_END = '\xf1'
+PATH_SEPARATOR = '\xff'
+PATHSET_END = '\x00'
+
+PATH_STEP_ACCOUNT = 0x01
+PATH_STEP_CURRENCY = 0x10
+PATH_STEP_ISSUER = 0x20
+
+MIN_MANTISSA = 10 ** 15
+MAX_MANTISSA = 10 ** 16 - 1
+MIN_EXPONENT = -96
+MAX_EXPONENT = 80
+MAX_DROPS = 10 ** 17
+
+
+class SigningError(ValueError):
+    pass
+
+
+def sha512half(data):
+    return hashlib.sha512(data).digest()[:32]
+
+
+def _int_from_bytes(data):
+    return int(data.encode('hex'), 16) if data else 0
+
+
+# ----------------------------------------------------------------------------
+# RIPEMD-160, used when hashlib is built without it
+
+_RMD_R = (
+    range(16) +
+    [7, 4, 13, 1, 10, 6, 15, 3, 12, 0, 9, 5, 2, 14, 11, 8] +
+    [3, 10, 14, 4, 9, 15, 8, 1, 2, 7, 0, 6, 13, 11, 5, 12] +
+    [1, 9, 11, 10, 0, 8, 12, 4, 13, 3, 7, 15, 14, 5, 6, 2] +
+    [4, 0, 5, 9, 7, 12, 2, 10, 14, 1, 3, 8, 11, 6, 15, 13]
+)
+_RMD_R2 = (
+    [5, 14, 7, 0, 9, 2, 11, 4, 13, 6, 15, 8, 1, 10, 3, 12] +
+    [6, 11, 3, 7, 0, 13, 5, 10, 14, 15, 8, 12, 4, 9, 1, 2] +
+    [15, 5, 1, 3, 7, 14, 6, 9, 11, 8, 12, 2, 10, 0, 4, 13] +
+    [8, 6, 4, 1, 3, 11, 15, 0, 5, 12, 2, 13, 9, 7, 10, 14] +
+    [12, 15, 10, 4, 1, 5, 8, 7, 6, 2, 13, 14, 0, 3, 9, 11]
+)
+_RMD_S = (
+    [11, 14, 15, 12, 5, 8, 7, 9, 11, 13, 14, 15, 6, 7, 9, 8] +
+    [7, 6, 8, 13, 11, 9, 7, 15, 7, 12, 15, 9, 11, 7, 13, 12] +
+    [11, 13, 6, 7, 14, 9, 13, 15, 14, 8, 13, 6, 5, 12, 7, 5] +
+    [11, 12, 14, 15, 14, 15, 9, 8, 9, 14, 5, 6, 8, 6, 5, 12] +
+    [9, 15, 5, 11, 6, 8, 13, 12, 5, 12, 13, 14, 11, 8, 5, 6]
+)
+_RMD_S2 = (
+    [8, 9, 9, 11, 13, 15, 15, 5, 7, 7, 8, 11, 14, 14, 12, 6] +
+    [9, 13, 15, 7, 12, 8, 9, 11, 7, 7, 12, 7, 6, 15, 13, 11] +
+    [9, 7, 15, 11, 8, 6, 6, 14, 12, 13, 5, 14, 13, 13, 7, 5] +
+    [15, 5, 8, 11, 14, 14, 6, 14, 6, 9, 12, 9, 12, 5, 15, 8] +
+    [8, 5, 12, 9, 12, 5, 14, 6, 8, 13, 6, 5, 15, 13, 11, 11]
+)
+_RMD_K = (0x00000000, 0x5a827999, 0x6ed9eba1, 0x8f1bbcdc, 0xa953fd4e)
+_RMD_K2 = (0x50a28be6, 0x5c4dd124, 0x6d703ef3, 0x7a6d76e9, 0x00000000)
+_MASK32 = 0xffffffff
+
+
+def _rmd_f(j, x, y, z):
+    if j == 0:
+        return x ^ y ^ z
+    if j == 1:
+        return (x & y) | (~x & z)
+    if j == 2:
+        return (x | ~y) ^ z
+    if j == 3:
+        return (x & z) | (y & ~z)
+    return x ^ (y | ~z)
+
+
+def _rol(x, n):
+    x &= _MASK32
+    return ((x << n) | (x >> (32 - n))) & _MASK32
+
+
+def _ripemd160(data):
+    h = [0x67452301, 0xefcdab89, 0x98badcfe, 0x10325476, 0xc3d2e1f0]
+    length = len(data)
+    data += '\x80' + '\x00' * ((55 - length) % 64) + \
+        struct.pack('<Q', length * 8)
+
+    for offset in xrange(0, len(data), 64):
+        x = struct.unpack('<16I', data[offset:offset + 64])
+        a, b, c, d, e = h
+        a2, b2, c2, d2, e2 = h
+        for i in xrange(80):
+            j = i // 16
+            t = _rol(a + _rmd_f(j, b, c, d) + x[_RMD_R[i]] + _RMD_K[j],
+                     _RMD_S[i]) + e
+            a, e, d, c, b = e, d, _rol(c, 10), b, t & _MASK32
+            t = _rol(a2 + _rmd_f(4 - j, b2, c2, d2) + x[_RMD_R2[i]] +
+                     _RMD_K2[j], _RMD_S2[i]) + e2
+            a2, e2, d2, c2, b2 = e2, d2, _rol(c2, 10), b2, t & _MASK32
+        h = [(h[1] + c + d2) & _MASK32, (h[2] + d + e2) & _MASK32,
+             (h[3] + e + a2) & _MASK32, (h[4] + a + b2) & _MASK32,
+             (h[0] + b + c2) & _MASK32]
+
+    return struct.pack('<5I', *h)
+
+
+def ripemd160(data):
+    try:
+        return hashlib.new('ripemd160', data).digest()
+    except ValueError:
+        return _ripemd160(data)
+
+
+def account_id(public_key):
+    """
+    Returns ripple address of hex encoded `public_key`.
+    """
+    key = public_key.decode('hex')
+    return encode_account_id(ripemd160(hashlib.sha256(key).digest()))
+
+
+# ----------------------------------------------------------------------------
+# secp256k1
+
+_N = SECP256k1.order
+
+
+def _secp256k1_public(private):
+    key = SigningKey.from_secret_exponent(private, curve=SECP256k1)
+    return key.get_verifying_key().to_string('compressed')
+
+
+def _secp256k1_scalar(data):
+    # first 32 bytes hash of data with appended counter that is a valid key
+    for counter in xrange(2 ** 32):
+        scalar = _int_from_bytes(
+            sha512half(data + struct.pack('>I', counter)))
+        if 0 < scalar < _N:
+            return scalar
+    raise SigningError('Unable to derive secp256k1 key')
+
+
+def _secp256k1_keys(entropy):
+    root_private = _secp256k1_scalar(entropy)
+    root_public = _secp256k1_public(root_private)
+    # the first key of account family 0
+    private = (_secp256k1_scalar(root_public + struct.pack('>I', 0)) +
+               root_private) % _N
+    return private, _secp256k1_public(private)
+
+
+def _secp256k1_sign(private, message):
+    key = SigningKey.from_secret_exponent(private, curve=SECP256k1)
+    # RFC 6979 nonce, fully canonical signatures use the lower s
+    return key.sign_digest_deterministic(
+        sha512half(message), hashfunc=hashlib.sha256,
+        sigencode=sigencode_der_canonize)
+
+
+def _secp256k1_verify(public, message, signature):
+    try:
+        key = VerifyingKey.from_string(public, curve=SECP256k1)
+        return key.verify_digest(signature, sha512half(message),
+                                 sigdecode=sigdecode_der)
+    except (BadSignatureError, MalformedPointError, UnexpectedDER):
+        return False
+
+
+# ----------------------------------------------------------------------------
+# ed25519
+
+# ecdsa returns ed25519 keys and signatures as bytearray
+
+def _ed25519_public(secret):
+    key = SigningKey.from_string(secret, curve=Ed25519)
+    return str(key.get_verifying_key().to_string())
+
+
+def _ed25519_sign(secret, message):
+    return str(SigningKey.from_string(secret, curve=Ed25519).sign(message))
+
+
+def _ed25519_verify(public, message, signature):
+    try:
+        key = VerifyingKey.from_string(public, curve=Ed25519)
+        return key.verify(signature, message)
+    except (BadSignatureError, MalformedPointError):
+        return False
+
+
+# ----------------------------------------------------------------------------
+# keys
+
+class Keypair(object):
+    """
+    Signing key of an account.
+
+    Params:
+        `private_key`:
+            Integer for secp256k1 keys, 32 bytes secret for ed25519 keys.
+
+        `public_key`:
+            Hex encoded public key as used in ``SigningPubKey``.
+
+        `key_type`:
+            ``SECP256K1`` or ``ED25519``.
+    """
+
+    def __init__(self, private_key, public_key, key_type):
+        self.private_key = private_key
+        self.public_key = public_key
+        self.key_type = key_type
+
+    @classmethod
+    def from_seed(cls, seed):
+        """
+        Derives keypair of the family seed (account secret), the same way
+        rippled does.
+        """
+        try:
+            data = decode_base58check(seed)
+        except (ValueError, TypeError):
+            raise SigningError('Invalid secret')
+
+        if len(data) == 17 and data[0] == FAMILY_SEED_PREFIX:
+            private, public = _secp256k1_keys(data[1:])
+            return cls(private, public.encode('hex').upper(), SECP256K1)
+
+        if len(data) == 19 and data[:3] == ED25519_SEED_PREFIX:
+            private = sha512half(data[3:])
+            public = ED25519_KEY_PREFIX + _ed25519_public(private)
+            return cls(private, public.encode('hex').upper(), ED25519)
+
+        raise SigningError('Invalid secret')
+
+    @property
+    def account_id(self):
+        return account_id(self.public_key)
+
+    def sign(self, message):
+        """
+        Returns binary signature of `message`.
+        """
+        if self.key_type == ED25519:
+            return _ed25519_sign(self.private_key, message)
+        return _secp256k1_sign(self.private_key, message)
+
+    def verify(self, message, signature):
+        return verify(message, signature, self.public_key)
+
+
+def verify(message, signature, public_key):
+    """
+    Checks binary `signature` of `message` made by hex encoded
+    `public_key`.
+    """
+    public = public_key.decode('hex')
+    if public[:1] == ED25519_KEY_PREFIX:
+        return _ed25519_verify(public[1:], message, signature)
+    return _secp256k1_verify(public, message, signature)
+
+
+# ----------------------------------------------------------------------------
+# serialization
+
+def _field_id(type_code, field_code):
+    if type_code < 16:
+        if field_code < 16:
+            return chr(type_code << 4 | field_code)
+        return chr(type_code << 4) + chr(field_code)
+    if field_code < 16:
+        return chr(field_code) + chr(type_code)
+    return '\x00' + chr(type_code) + chr(field_code)
+
+
+def _length_prefix(length):
+    if length <= 192:
+        return chr(length)
+    if length <= 12480:
+        length -= 193
+        return chr(193 + (length >> 8)) + chr(length & 0xff)
+    if length <= 918744:
+        length -= 12481
+        return chr(241 + (length >> 16)) + chr((length >> 8) & 0xff) + \
+            chr(length & 0xff)
+    raise SigningError('Blob is too long')
+
+
+def _account(address):
+    try:
+        return decode_account_id(address)
+    except ValueError:
+        raise SigningError('Invalid account %r' % address)
+
+
+def _currency(currency):
+    if len(currency) == 40:
+        return currency.decode('hex')
+    if currency == 'XRP':
+        return '\x00' * 20
+    if len(currency) == 3:
+        return '\x00' * 12 + str(currency) + '\x00' * 5
+    raise SigningError('Invalid currency %r' % currency)
+
+
+def _amount(amount):
+    if not isinstance(amount, dict):
+        drops = Decimal(amount)
+        if drops != drops.to_integral_value() or abs(drops) > MAX_DROPS:
+            raise SigningError('Invalid XRP amount %r' % amount)
+        drops = int(drops)
+        if drops >= 0:
+            return struct.pack('>Q', 0x4000000000000000 | drops)
+        return struct.pack('>Q', -drops)
+
+    if amount['currency'] == 'XRP':
+        raise SigningError('XRP amount must be a string of drops')
+    currency = _currency(amount['currency']) + _account(amount['issuer'])
+
+    value = Decimal(amount['value'])
+    if not value:
+        return struct.pack('>Q', 0x8000000000000000) + currency
+
+    sign, digits, exponent = value.as_tuple()
+    mantissa = int(''.join(map(str, digits)))
+    while mantissa < MIN_MANTISSA:
+        mantissa *= 10
+        exponent -= 1
+    # extra precision is truncated as rippled does
+    while mantissa > MAX_MANTISSA:
+        mantissa //= 10
+        exponent += 1
+    if exponent < MIN_EXPONENT:
+        return struct.pack('>Q', 0x8000000000000000) + currency
+    if exponent > MAX_EXPONENT:
+        raise SigningError('Amount %s is too large' % amount['value'])
+
+    bits = 0x8000000000000000 | (exponent + 97) << 54 | mantissa
+    if not sign:
+        bits |= 0x4000000000000000
+    return struct.pack('>Q', bits) + currency
+
+
+def _pathset(paths):
+    data = []
+    for position, path in enumerate(paths):
+        if position:
+            data.append(PATH_SEPARATOR)
+        for step in path:
+            step_type = 0
+            step_data = ''
+            if 'account' in step:
+                step_type |= PATH_STEP_ACCOUNT
+                step_data += _account(step['account'])
+            if 'currency' in step:
+                step_type |= PATH_STEP_CURRENCY
+                step_data += _currency(step['currency'])
+            if 'issuer' in step:
+                step_type |= PATH_STEP_ISSUER
+                step_data += _account(step['issuer'])
+            data.append(chr(step_type) + step_data)
+    data.append(PATHSET_END)
+    return ''.join(data)
+
+
+def _value(name, type_code, value):
+    if type_code == UINT8:
+        return struct.pack('>B', value)
+    if type_code == UINT16:
+        if name == 'TransactionType':
+            if value not in TRANSACTION_TYPES:
+                raise SigningError('Unsupported transaction type %r' % value)
+            value = TRANSACTION_TYPES[value]
+        return struct.pack('>H', value)
+    if type_code == UINT32:
+        return struct.pack('>I', int(value))
+    if type_code in (UINT64, HASH128, HASH160, HASH256):
+        return value.decode('hex')
+    if type_code == AMOUNT:
+        return _amount(value)
+    if type_code == BLOB:
+        value = value.decode('hex')
+        return _length_prefix(len(value)) + value
+    if type_code == ACCOUNT:
+        return _length_prefix(20) + _account(value)
+    if type_code == OBJECT:
+        return _fields(value) + OBJECT_END
+    if type_code == ARRAY:
+        data = []
+        for item in value:
+            (item_name, item_value), = item.items()
+            data.append(_field(item_name, item_value))
+        data.append(ARRAY_END)
+        return ''.join(data)
+    if type_code == PATHSET:
+        return _pathset(value)
+
+
+def _field(name, value):
+    type_code, field_code = FIELDS[name]
+    return _field_id(type_code, field_code) + _value(name, type_code, value)
+
+
+def _fields(obj, signing=False):
+    fields = []
+    for name, value in obj.items():
+        if name[:1].islower():
+            # not a ledger field, e.g. ``hash``
+            continue
+        if name not in FIELDS:
+            raise SigningError('Unsupported field %s' % name)
+        if signing and name in NON_SIGNING_FIELDS:
+            continue
+        fields.append((FIELDS[name], name, value))
+    fields.sort()
+    return ''.join(_field(name, value) for _, name, value in fields)
+
+
+def serialize(tx_json, signing=False):
+    """
+    Returns binary serialization of `tx_json`. With `signing` only fields
+    covered by the signature are serialized.
+    """
+    try:
+        return _fields(tx_json, signing)
+    except (KeyError, TypeError, ValueError, struct.error), e:
+        if isinstance(e, SigningError):
+            raise
+        raise SigningError('Unable to serialize transaction: %s' % e)
+
+
+def transaction_hash(tx_blob):
+    """
+    Returns hash of binary signed transaction `tx_blob`.
+    """
+    return sha512half(HASH_PREFIX_TRANSACTION_ID + tx_blob).encode('hex') \
+        .upper()
+
+
+def sign_transaction(tx_json, secret):
+    """
+    Signs `tx_json` with the key derived from `secret`, which may also be
+    a `Keypair`. `tx_json` must be complete, including ``Sequence`` and
+    ``Fee``.
+
+    Returns the same data as rippled ``sign`` method:
+
+        {'status': 'success',
+         'tx_blob': hex encoded signed transaction,
+         'tx_json': `tx_json` with ``SigningPubKey``, ``TxnSignature`` and
+                    ``hash``}
+    """
+    if isinstance(secret, Keypair):
+        keypair = secret
+    else:
+        keypair = Keypair.from_seed(secret)
+
+    tx_json = dict(tx_json)
+    tx_json.pop('TxnSignature', None)
+    tx_json.pop('hash', None)
+    tx_json['SigningPubKey'] = keypair.public_key
+
+    signature = keypair.sign(
+        HASH_PREFIX_TRANSACTION_SIGN + serialize(tx_json, signing=True))
+    tx_json['TxnSignature'] = signature.encode('hex').upper()
+
+    tx_blob = serialize(tx_json)
+    tx_json['hash'] = transaction_hash(tx_blob)
+
+    return {
+        'status': 'success',
+        'tx_blob': tx_blob.encode('hex').upper(),
+        'tx_json': tx_json,
+    }
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+from south.utils import datetime_utils as datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models
+
+
+class Migration(SchemaMigration):
+
+    def forwards(self, orm):
+        # Adding model 'TransactionStatusEvent'
+        db.create_table('ripple_api_transactionstatusevent', (
+            ('id', self.gf('django.db.models.fields.AutoField')(primary_key=True)),
+            ('transaction', self.gf('django.db.models.fields.related.ForeignKey')(related_name='status_events', to=orm['ripple_api.Transaction'])),
+            ('old_status', self.gf('django.db.models.fields.SmallIntegerField')(null=True, blank=True)),
+            ('status', self.gf('django.db.models.fields.SmallIntegerField')()),
+            ('created', self.gf('django.db.models.fields.DateTimeField')(auto_now_add=True, blank=True)),
+        ))
+        db.send_create_signal('ripple_api', ['TransactionStatusEvent'])
+
+
+    def backwards(self, orm):
+        # Deleting model 'TransactionStatusEvent'
+        db.delete_table('ripple_api_transactionstatusevent')
+
+
+    models = {
+        'ripple_api.accountsequence': {
+            'Meta': {'object_name': 'AccountSequence'},
+            'account': ('django.db.models.fields.CharField', [], {'unique': 'True', 'max_length': '100'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'sequence': ('django.db.models.fields.PositiveIntegerField', [], {'null': 'True', 'blank': 'True'}),
+            'updated': ('django.db.models.fields.DateTimeField', [], {'auto_now': 'True', 'blank': 'True'})
+        },
+        'ripple_api.accounttxcursor': {
+            'Meta': {'object_name': 'AccountTxCursor'},
+            'account': ('django.db.models.fields.CharField', [], {'unique': 'True', 'max_length': '100'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'ledger_index': ('django.db.models.fields.IntegerField', [], {'null': 'True', 'blank': 'True'}),
+            'ledger_index_min': ('django.db.models.fields.IntegerField', [], {'null': 'True', 'blank': 'True'}),
+            'marker': ('django.db.models.fields.TextField', [], {'blank': 'True'}),
+            'updated': ('django.db.models.fields.DateTimeField', [], {'auto_now': 'True', 'blank': 'True'})
+        },
+        'ripple_api.transaction': {
+            'Meta': {'object_name': 'Transaction', 'index_together': "(('destination', 'status', 'ledger_index'),)"},
+            'account': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'created': ('django.db.models.fields.DateTimeField', [], {'auto_now_add': 'True', 'blank': 'True'}),
+            'currency': ('django.db.models.fields.CharField', [], {'max_length': '3'}),
+            'destination': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'destination_tag': ('django.db.models.fields.IntegerField', [], {'null': 'True', 'blank': 'True'}),
+            'hash': ('django.db.models.fields.CharField', [], {'db_index': 'True', 'max_length': '100', 'blank': 'True'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'issuer': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'last_ledger_sequence': ('django.db.models.fields.IntegerField', [], {'null': 'True', 'blank': 'True'}),
+            'ledger_index': ('django.db.models.fields.IntegerField', [], {'null': 'True', 'blank': 'True'}),
+            'parent': ('django.db.models.fields.related.ForeignKey', [], {'blank': 'True', 'related_name': "'returning_transaction'", 'null': 'True', 'to': "orm['ripple_api.Transaction']"}),
+            'source_tag': ('django.db.models.fields.IntegerField', [], {'null': 'True', 'blank': 'True'}),
+            'status': ('django.db.models.fields.SmallIntegerField', [], {'default': '0'}),
+            'tx_blob': ('django.db.models.fields.TextField', [], {'blank': 'True'}),
+            'value': ('django.db.models.fields.CharField', [], {'max_length': '100'})
+        },
+        'ripple_api.transactionstatusevent': {
+            'Meta': {'object_name': 'TransactionStatusEvent'},
+            'created': ('django.db.models.fields.DateTimeField', [], {'auto_now_add': 'True', 'blank': 'True'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'old_status': ('django.db.models.fields.SmallIntegerField', [], {'null': 'True', 'blank': 'True'}),
+            'status': ('django.db.models.fields.SmallIntegerField', [], {}),
+            'transaction': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'status_events'", 'to': "orm['ripple_api.Transaction']"})
+        }
+    }
+
+    complete_apps = ['ripple_api']
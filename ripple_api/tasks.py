@@ -1,11 +1,101 @@
 # -*- coding: utf-8 -*-
 from requests import ConnectionError
 from celery import task
+from django.db import transaction as db_transaction
+from django.db.models import Case, Value, When
 import logging
-import time
 
-from .models import Transaction
-from ripple_api import RippleApiError, path_find, sign, submit, tx
+from .confirmation import get_confirmation_tracker
+from .connection import get_setting
+from .management.transaction_processors import check_submitted_transaction
+from .models import Transaction, send_status_signals, signal_outbox_enabled
+from .sequence import allocate_sequence, resync_sequence, sequence_consumed
+from ripple_api import (
+    RippleApiError, get_last_ledger_sequence, path_find, sign, submit
+)
+
+
+# rows updated by one query of `_bulk_save`
+BULK_UPDATE_BATCH_SIZE = 100
+
+SIGNED_FIELDS = ['hash', 'tx_blob', 'last_ledger_sequence', 'status']
+
+# server is too busy, the transaction may still be validated
+INSUFFICIENT_FEE = 'telINSUF_FEE_P'
+# results of transactions held or queued by rippled, e.g. ``terQUEUED`` or
+# ``terPRE_SEQ``, they may still be validated before LastLedgerSequence
+HELD = 'ter'
+
+
+def _allocate_sequences():
+    return get_setting('RIPPLE_API_ALLOCATE_SEQUENCE', False)
+
+
+def _waiting(engine_result):
+    """
+    Checks if transaction submitted with `engine_result` is not final yet
+    and waits for confirmation.
+    """
+    return engine_result == INSUFFICIENT_FEE or \
+        engine_result.startswith(HELD)
+
+
+def _check_confirmation(transaction_pk):
+    def callback(future):
+        if future.cancelled():
+            return
+        transaction = Transaction.objects.filter(
+            pk=transaction_pk, status=Transaction.SUBMITTED).first()
+        if transaction is None:
+            # already checked by process_transactions
+            return
+        try:
+            response = future.result()
+        except RippleApiError, e:
+            response = e
+        check_submitted_transaction(transaction, response)
+    return callback
+
+
+def _amount_and_paths(transaction):
+    """
+    Returns amount and paths of payment `transaction`.
+    """
+    if transaction.currency == 'XRP':
+        return transaction.value, None
+
+    amount = {"currency": transaction.currency, 
+              "value": str(transaction.value), 
+              "issuer": transaction.destination}
+    paths = path_find(transaction.account,
+                      transaction.destination,
+                      amount,
+                      [{'currency': transaction.currency,
+                        'issuer': transaction.account,
+                        },
+                       ])
+    if len(paths['alternatives'])==0:
+        raise RippleApiError('no path', '', 
+                             'No path between %s and %s for %s' % (
+                transaction.account, transaction.destination, amount))
+    return amount, paths['alternatives'][0]['paths_computed']
+
+
+def _sign(transaction, secret, amount, paths, sequence, last_ledger_sequence):
+    # signed locally with RIPPLE_API_LOCAL_SIGNING setting
+    response = sign(transaction.account, 
+                    secret, 
+                    transaction.destination, 
+                    amount,
+                    paths = paths,
+                    sequence = sequence,
+                    last_ledger_sequence = last_ledger_sequence
+                    )
+
+    transaction.hash = response['tx_json']['hash']
+    transaction.tx_blob = response['tx_blob']
+    transaction.last_ledger_sequence = last_ledger_sequence
+    transaction.status = Transaction.PENDING
 
 
 @task
@@ -17,84 +107,307 @@ def sign_task(transaction_pk, secret):
         logger.error("sign_task: transaction %s not found in DB!" % transaction_pk)
         return
     transaction = transaction[0]
+    sequence = None
     try:
-        if transaction.currency == 'XRP':
-            amount = transaction.value
-        else:
-            amount = {"currency": transaction.currency, 
-                      "value": str(transaction.value), 
-                      "issuer": transaction.destination}
-            paths = path_find(transaction.account,
-                              transaction.destination,
-                              amount,
-                              [{'currency': transaction.currency,
-                                'issuer': transaction.account,
-                                },
-                               ])
-            if len(paths['alternatives'])==0:
-                raise RippleApiError('no path', '', 
-                                     'No path between %s and %s for %s' % (
-                        transaction.account, transaction.destination, amount))
-            pass
-
-        response = sign(transaction.account, 
-                        secret, 
-                        transaction.destination, 
-                        amount,
-                        paths = paths['alternatives'][0]['paths_computed']
-                        )
+        amount, paths = _amount_and_paths(transaction)
+        last_ledger_sequence = get_last_ledger_sequence()
+        if _allocate_sequences():
+            sequence = allocate_sequence(transaction.account)
+        _sign(transaction, secret, amount, paths, sequence,
+              last_ledger_sequence)
     except (RippleApiError, ConnectionError), e:
+        if sequence is not None:
+            resync_sequence(transaction.account)
         transaction.status = Transaction.FAILURE
         transaction.save()
         logger.error(e)
         return
 
-    transaction.hash = response['tx_json']['hash']
-    transaction.tx_blob = response['tx_blob']
-    transaction.status = Transaction.PENDING
     transaction.save()
 
     logger.info('Transaction signed: %s' % transaction)
     return transaction.pk
 
 
+def _load_transactions(transaction_pks, task_name):
+    """
+    Returns transactions with `transaction_pks` in the given order, loaded
+    with one query.
+    """
+    logger = logging.getLogger('ripple')
+    transactions = Transaction.objects.in_bulk(transaction_pks)
+    for transaction_pk in transaction_pks:
+        if transaction_pk not in transactions:
+            logger.error("%s: transaction %s not found in DB!" % (
+                task_name, transaction_pk))
+    return [transactions[transaction_pk] for transaction_pk in transaction_pks
+            if transaction_pk in transactions]
+
+
+def _bulk_update(transactions, fields):
+    """
+    Updates `fields` of `transactions` with one ``UPDATE`` per
+    `BULK_UPDATE_BATCH_SIZE` rows. Like `TransactionManager.set_status`
+    rows are updated only if their status is still the saved status of the
+    transaction. Returns pks of updated rows.
+    """
+    updated = set()
+    for start in xrange(0, len(transactions), BULK_UPDATE_BATCH_SIZE):
+        by_status = {}
+        for transaction in transactions[start:start + BULK_UPDATE_BATCH_SIZE]:
+            by_status.setdefault(
+                transaction.status_tracker.previous('status'), []
+            ).append(transaction)
+
+        for old_status, batch in by_status.items():
+            rows = Transaction.objects.filter(
+                pk__in=[transaction.pk for transaction in batch],
+                status=old_status)
+            with db_transaction.atomic():
+                pks = set(rows.select_for_update().values_list(
+                    'pk', flat=True))
+                batch = [transaction for transaction in batch
+                         if transaction.pk in pks]
+                if not batch:
+                    continue
+                updates = {}
+                for field in fields:
+                    updates[field] = Case(
+                        *[When(pk=transaction.pk,
+                               then=Value(getattr(transaction, field)))
+                          for transaction in batch],
+                        output_field=Transaction._meta.get_field(field))
+                rows.filter(pk__in=pks).update(**updates)
+            updated |= pks
+    return updated
+
+
+def _bulk_save(transactions, fields):
+    """
+    Saves `fields` of `transactions` with `_bulk_update` and sends the
+    signals `save` would send. Returns saved transactions, the others were
+    changed by another process meanwhile.
+    """
+    logger = logging.getLogger('ripple')
+
+    def save():
+        updated = _bulk_update(transactions, fields)
+        saved = [transaction for transaction in transactions
+                 if transaction.pk in updated]
+        send_status_signals([
+            (transaction, transaction.status_tracker.previous('status'))
+            for transaction in saved
+        ])
+        return saved
+
+    if signal_outbox_enabled():
+        with db_transaction.atomic():
+            saved = save()
+    else:
+        saved = save()
+
+    saved_pks = set(transaction.pk for transaction in saved)
+    for transaction in transactions:
+        if transaction.pk in saved_pks:
+            transaction._saved_status = transaction.status
+        else:
+            logger.info("Transaction %s was changed meanwhile, not saved" %
+                        transaction.pk)
+    return saved
+
+
 @task
-def submit_task(transaction_pk):
-    if not transaction_pk:
-        return
-    transaction = Transaction.objects.filter(pk=transaction_pk)
+def sign_batch_task(transaction_pks, secret):
+    """
+    Signs transactions with `transaction_pks` like `sign_task` does one.
+
+    With ``RIPPLE_API_ALLOCATE_SEQUENCE`` setting sequences of all
+    transactions of an account are reserved at once. Errors fail only the
+    transaction they happened to.
+    """
     logger = logging.getLogger('ripple')
-    if not transaction.exists():
-        logger.error("sign_task: transaction %s not found in DB!" % transaction_pk)
-        return
-    transaction = transaction[0]
+    transactions = []
+    for transaction in _load_transactions(transaction_pks,
+                                          'sign_batch_task'):
+        if transaction.tx_blob:
+            # e.g. by a duplicate of this task
+            logger.info("sign_batch_task: transaction %s is already signed" %
+                        transaction.pk)
+            continue
+        transactions.append(transaction)
+
+    def fail(transaction, error):
+        transaction.status = Transaction.FAILURE
+        logger.error(error)
+
+    prepared = []
+    for transaction in transactions:
+        try:
+            prepared.append((transaction, _amount_and_paths(transaction)))
+        except (RippleApiError, ConnectionError), e:
+            fail(transaction, e)
+
+    sequences = {}
+    last_ledger_sequence = None
     try:
-        response = submit(transaction.tx_blob)
-        if response['engine_result'] == "telINSUF_FEE_P":
-            # ripple server too busy to forward or process your transaction
-            while True:
-                time.sleep(2)
-                tx_response = tx(transaction.hash)
-                status = tx_response.get('meta', {}).get('TransactionResult')
-                # check if tx status is available
-                if status:
-                    response['engine_result'] = status
-                    break
+        if prepared:
+            last_ledger_sequence = get_last_ledger_sequence()
+        if _allocate_sequences():
+            counts = {}
+            for transaction, _ in prepared:
+                counts[transaction.account] = \
+                    counts.get(transaction.account, 0) + 1
+            for account, count in counts.items():
+                sequences[account] = allocate_sequence(account, count=count)
+    except (RippleApiError, ConnectionError), e:
+        for account in sequences:
+            resync_sequence(account)
+        for transaction, _ in prepared:
+            fail(transaction, e)
+        prepared = []
 
+    sequenced = set()
+    for transaction, (amount, paths) in prepared:
+        sequence = sequences.get(transaction.account)
+        if sequence is not None:
+            sequences[transaction.account] += 1
+            sequenced.add(transaction.pk)
+        try:
+            _sign(transaction, secret, amount, paths, sequence,
+                  last_ledger_sequence)
+        except (RippleApiError, ConnectionError), e:
+            if sequence is not None:
+                resync_sequence(transaction.account)
+            fail(transaction, e)
+            continue
+        logger.info('Transaction signed: %s' % transaction)
+
+    saved = _bulk_save(transactions, SIGNED_FIELDS)
+    saved_pks = set(transaction.pk for transaction in saved)
+    # sequences of transactions which are not saved are never submitted
+    for account in set(transaction.account for transaction in transactions
+                       if transaction.pk in sequenced and
+                       transaction.pk not in saved_pks):
+        resync_sequence(account)
+    return [transaction.pk for transaction in saved
+            if transaction.status == Transaction.PENDING]
+
+
+def _submit(transaction):
+    """
+    Submits signed `transaction` and sets its status. Returns engine result
+    or None if the status is unknown because of connection error.
+    """
+    logger = logging.getLogger('ripple')
+    try:
+        response = submit(transaction.tx_blob)
     except RippleApiError, e:
         logger.error(e)
+        if _allocate_sequences():
+            resync_sequence(transaction.account)
         transaction.status = Transaction.FAILURE
-        transaction.save()
-        return
+        return e.error
     except ConnectionError, e:
         logger.error('Connection error: %s' % e)
         return
 
+    if response['engine_result'] == INSUFFICIENT_FEE:
+        # ripple server too busy to forward or process your transaction,
+        # it may still be validated. Final status is set by confirmation
+        # tracker or by process_transactions, the worker does not wait.
+        transaction.status = Transaction.SUBMITTED
+        logger.info("Transaction: %s is waiting for confirmation." %
+                    transaction)
+        return response['engine_result']
+
+    if _allocate_sequences() and \
+            not sequence_consumed(response['engine_result']):
+        # later transactions of the account would wait for this sequence
+        resync_sequence(transaction.account)
+
     if response['engine_result'] in ["tesSUCCESS",  "tefPAST_SEQ"]:
         transaction.status = Transaction.SUBMITTED
-        transaction.save()
         logger.info("Transaction: %s successful submitted." % transaction)
+    elif response['engine_result'].startswith(HELD):
+        # failed by process_transactions only once it can't be validated
+        transaction.status = Transaction.SUBMITTED
+        logger.info("Transaction: %s is held with result %s." % (
+            transaction, response['engine_result']))
     else:
         transaction.status = Transaction.FAILURE
-        transaction.save()
         logger.info("Transaction: %s submitted with result %s" % (transaction, response['engine_result']))
+    return response['engine_result']
+
+
+def _track_confirmation(transaction):
+    get_confirmation_tracker().track(
+        transaction.hash, transaction.last_ledger_sequence,
+        callback=_check_confirmation(transaction.pk))
+
+
+@task
+def submit_task(transaction_pk):
+    if not transaction_pk:
+        return
+    transaction = Transaction.objects.filter(pk=transaction_pk)
+    logger = logging.getLogger('ripple')
+    if not transaction.exists():
+        logger.error("sign_task: transaction %s not found in DB!" % transaction_pk)
+        return
+    transaction = transaction[0]
+    engine_result = _submit(transaction)
+    if engine_result is None:
+        return
+    if not Transaction.objects.set_status(transaction, transaction.status):
+        logger.info("submit_task: transaction %s was changed meanwhile" %
+                    transaction_pk)
+        return
+    if _waiting(engine_result):
+        _track_confirmation(transaction)
+
+
+@task
+def submit_batch_task(transaction_pks):
+    """
+    Submits transactions with `transaction_pks` in the given order, like
+    `submit_task` does one. Only pending transactions and the ones claimed
+    by the submit stage of `process_transactions` are submitted.
+    """
+    logger = logging.getLogger('ripple')
+    transactions = []
+    waiting = []
+    for transaction in _load_transactions(transaction_pks,
+                                          'submit_batch_task'):
+        if transaction.status not in (Transaction.PENDING,
+                                      Transaction.SUBMITTING):
+            # e.g. submitted by a duplicate of this task
+            logger.info("submit_batch_task: transaction %s is not pending" %
+                        transaction.pk)
+            continue
+        engine_result = _submit(transaction)
+        if engine_result is None:
+            if transaction.status == Transaction.SUBMITTING:
+                # submitted again by the next run of the submit stage
+                transaction.status = Transaction.PENDING
+                transactions.append(transaction)
+            continue
+        transactions.append(transaction)
+        if _waiting(engine_result):
+            waiting.append(transaction)
+
+    saved = _bulk_save(transactions, ['status'])
+    for transaction in waiting:
+        if transaction in saved:
+            _track_confirmation(transaction)
+
+
+@task
+def process_stage_task(stage, batch_size=None, time_budget=None):
+    """
+    Runs `stage` of `process_transactions`, e.g. from celery beat, so that
+    every stage has its own schedule.
+    """
+    # the pipeline uses the tasks above
+    from .management.transaction_pipeline import run_stage
+
+    return run_stage(stage, batch_size=batch_size, time_budget=time_budget)
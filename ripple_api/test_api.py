@@ -1,18 +1,27 @@
 # -*- coding: utf-8 -*-
 from django.test import TestCase
+from django.test.utils import override_settings
 from django.conf import settings
+from django.db import connection
 from django.db.models.signals import post_save
+from django.utils import timezone
 
-from mock import patch
+from mock import Mock, patch
 from requests import ConnectionError, Response
+import datetime
 import json
 import ssl
 
-from .models import Transaction
+from .health import get_health_tracker
+from .models import AccountTxCursor, Transaction
 from .management.commands.process_transactions import Command
-from .management.transaction_processors import monitor_transactions
+from .management.transaction_processors import (
+    claim_transactions, monitor_transactions
+)
 from .signals import transaction_status_changed
-from ripple_api import call_api, RippleApiError
+from .tasks import sign_task
+from ripple_api import call_api, call_api_batch, tx_many, RippleApiError
+from .connection import SessionPool, get_session_pool, set_session_pool
 
 
 class TestRipple(TestCase):
@@ -44,9 +53,12 @@ class TestRipple(TestCase):
         self.assertEqual(transaction.destination_tag, 232)
 
 
+    @patch('ripple_api.ripple_api.current_ledger_index')
     @patch('ripple_api.tasks.sign')
     @patch('ripple_api.tasks.path_find')
-    def test_retry(self, path_find_mock, sign_mock):
+    def test_retry(self, path_find_mock, sign_mock,
+                   current_ledger_index_mock):
+        current_ledger_index_mock.return_value = 1000
         transaction = Transaction.objects.create(
             account='account',
             destination='destination',
@@ -79,6 +91,7 @@ class TestRipple(TestCase):
         self.assertEqual(retry_transaction.hash, 'new_hash')
         self.assertEqual(retry_transaction.tx_blob, 'tx_new_blob')
         self.assertEqual(retry_transaction.status, Transaction.PENDING)
+        self.assertEqual(retry_transaction.last_ledger_sequence, 1020)
         self.assertEqual(transaction.value, retry_transaction.value)
         self.assertEqual(transaction.account, retry_transaction.account)
         self.assertEqual(transaction.currency, retry_transaction.currency)
@@ -92,9 +105,12 @@ class TestRipple(TestCase):
             retry_transaction.destination_tag
         )
 
+    @patch('ripple_api.ripple_api.current_ledger_index')
     @patch('ripple_api.tasks.sign')
     @patch('ripple_api.tasks.path_find')
-    def test_return_funds(self, path_find_mock, sign_mock):
+    def test_return_funds(self, path_find_mock, sign_mock,
+                          current_ledger_index_mock):
+        current_ledger_index_mock.return_value = 1000
         transaction = Transaction.objects.create(
             account='account',
             hash='hash4',
@@ -127,6 +143,7 @@ class TestRipple(TestCase):
         )
         self.assertEqual(returning_transaction.status, Transaction.PENDING)
         self.assertEqual(returning_transaction.tx_blob, 'tx_blob')
+        self.assertEqual(returning_transaction.last_ledger_sequence, 1020)
 
         self.assertEqual(returning_transaction.parent, transaction)
 
@@ -147,6 +164,113 @@ class TestRipple(TestCase):
         self.assertEqual(transaction.status, Transaction.SUCCESS)
         self.assertEqual(transaction.parent.status, Transaction.RETURNED)
 
+    @patch('ripple_api.ripple_api.call_api')
+    def test_check_submitted_transactions_not_found(self, call_api_mock):
+        Transaction.objects.create(account='account', hash='hash1', status=Transaction.SUBMITTED)
+        Transaction.objects.create(account='account', hash='hash2', status=Transaction.SUBMITTED)
+
+        def side_effect(data, **kwargs):
+            if data['params'][0]['transaction'] == 'hash1':
+                raise RippleApiError('txnNotFound', 29, 'Transaction not found.')
+            return {'meta': {'TransactionResult': 'tesSUCCESS'}}
+
+        call_api_mock.side_effect = side_effect
+        Command().check_submitted_transactions()
+
+        self.assertEqual(Transaction.objects.get(hash='hash1').status, Transaction.FAILURE)
+        self.assertEqual(Transaction.objects.get(hash='hash2').status, Transaction.SUCCESS)
+
+    @patch('ripple_api.ripple_api.call_api')
+    def test_check_submitted_transactions_last_ledger(self, call_api_mock):
+        AccountTxCursor.objects.create(account=settings.RIPPLE_ACCOUNT, ledger_index=100)
+        Transaction.objects.create(account='account', hash='expired', last_ledger_sequence=99,
+                                   status=Transaction.SUBMITTED)
+        Transaction.objects.create(account='account', hash='pending', last_ledger_sequence=100,
+                                   status=Transaction.SUBMITTED)
+
+        call_api_mock.side_effect = RippleApiError('txnNotFound', 29, 'Transaction not found.')
+        Command().check_submitted_transactions()
+
+        # only the expired transaction is checked, validated ledger is taken from the cursor
+        self.assertEqual(call_api_mock.call_count, 1)
+        self.assertEqual(call_api_mock.call_args[0][0]['params'][0]['transaction'], 'expired')
+        self.assertEqual(Transaction.objects.get(hash='expired').status, Transaction.FAILURE)
+        self.assertEqual(Transaction.objects.get(hash='pending').status, Transaction.SUBMITTED)
+
+    @patch('ripple_api.ripple_api.call_api')
+    def test_check_submitted_transactions_failed(self, call_api_mock):
+        Transaction.objects.create(account='account', hash='failed', status=Transaction.SUBMITTED)
+        Transaction.objects.create(account='account', hash='unvalidated', status=Transaction.SUBMITTED)
+
+        def side_effect(data, **kwargs):
+            if data['params'][0]['transaction'] == 'failed':
+                return {'validated': True, 'meta': {'TransactionResult': 'tecPATH_DRY'}}
+            return {'validated': False}
+
+        call_api_mock.side_effect = side_effect
+        Command().check_submitted_transactions()
+
+        self.assertEqual(Transaction.objects.get(hash='failed').status, Transaction.FAILURE)
+        # may still be validated, it has no LastLedgerSequence
+        self.assertEqual(Transaction.objects.get(hash='unvalidated').status, Transaction.SUBMITTED)
+
+    @patch('ripple_api.ripple_api.call_api')
+    def test_check_submitted_transactions_stale_cursor(self, call_api_mock):
+        AccountTxCursor.objects.create(account=settings.RIPPLE_ACCOUNT, ledger_index=90)
+        # monitor stage did not run for a while
+        AccountTxCursor.objects.update(updated=timezone.now() - datetime.timedelta(minutes=10))
+        Transaction.objects.create(account='account', hash='expired', last_ledger_sequence=99,
+                                   status=Transaction.SUBMITTED)
+
+        def side_effect(data, **kwargs):
+            if data['method'] == 'ledger':
+                return {'ledger_index': 100}
+            # seen by the server, but not validated
+            return {'validated': False}
+
+        call_api_mock.side_effect = side_effect
+        Command().check_submitted_transactions()
+
+        self.assertEqual(call_api_mock.call_args_list[0][0][0]['method'], 'ledger')
+        self.assertEqual(Transaction.objects.get(hash='expired').status, Transaction.FAILURE)
+
+    @patch('ripple_api.tasks.sign')
+    @patch('ripple_api.ripple_api.call_api')
+    def test_sign_task_last_ledger_sequence(self, call_api_mock, sign_mock):
+        get_health_tracker().reset()
+        call_api_mock.return_value = {'ledger_current_index': 1000}
+        sign_mock.return_value = {'tx_json': {'hash': 'hash'}, 'tx_blob': 'tx_blob'}
+        transaction = Transaction.objects.create(
+            account='account', destination='destination', currency='XRP', value='1')
+
+        sign_task(transaction.pk, 'secret')
+
+        self.assertEqual(sign_mock.call_args[1]['last_ledger_sequence'], 1020)
+        self.assertEqual(Transaction.objects.get(pk=transaction.pk).last_ledger_sequence, 1020)
+
+    @patch('ripple_api.ripple_api.call_api')
+    def test_tx_many(self, call_api_mock):
+        def side_effect(data, **kwargs):
+            transaction_id = data['params'][0]['transaction']
+            if transaction_id == 'hash2':
+                raise ConnectionError('connection refused')
+            return {'hash': transaction_id}
+
+        call_api_mock.side_effect = side_effect
+        results = tx_many(['hash1', 'hash2', 'hash3', 'hash1'], concurrency=2)
+
+        self.assertEqual(call_api_mock.call_count, 3)
+        self.assertEqual(results['hash1'], {'hash': 'hash1'})
+        self.assertEqual(results['hash3'], {'hash': 'hash3'})
+        self.assertIsInstance(results['hash2'], RippleApiError)
+
+    @patch('ripple_api.ripple_api.call_api')
+    def test_call_api_batch_keeps_order(self, call_api_mock):
+        call_api_mock.side_effect = lambda data, **kwargs: data['id']
+
+        results = call_api_batch([{'id': i} for i in range(20)], concurrency=4)
+        self.assertEqual(results, range(20))
+
     @patch('ripple_api.ripple_api.call_api')
     def test_submit_pending(self, call_api_mock):
         Transaction.objects.create(
@@ -161,7 +285,7 @@ class TestRipple(TestCase):
         transaction = Transaction.objects.get(hash='hash')
         self.assertEqual(transaction.status, Transaction.SUBMITTED)
 
-    @patch('requests.post')
+    @patch('requests.Session.post')
     def test_call_api(self, post_mock):
         original_settings = settings.RIPPLE_API_DATA
         settings.RIPPLE_API_DATA = [
@@ -222,9 +346,124 @@ class TestRipple(TestCase):
 
         settings.RIPPLE_API_DATA = original_settings
 
-    @patch('requests.post')
+    @patch('requests.Session.post')
     def test_timeout(self, post_mock):
         post_mock.side_effect = ssl.SSLError
 
         with self.assertRaises(RippleApiError):
             call_api({})
+
+
+class TestClaimTransactions(TestCase):
+
+    def test_claim_batches(self):
+        transactions = [
+            Transaction.objects.create(account='account', status=status)
+            for status in (Transaction.FAILURE, Transaction.PENDING,
+                           Transaction.FAILURE, Transaction.FAILURE)
+        ]
+
+        with claim_transactions(Transaction.FAILURE, limit=2) as claimed:
+            self.assertEqual(claimed, [transactions[0], transactions[2]])
+        with claim_transactions(Transaction.FAILURE, claimed[-1].pk,
+                                limit=2) as claimed:
+            self.assertEqual(claimed, [transactions[3]])
+        with claim_transactions(Transaction.FAILURE,
+                                max_pk=transactions[0].pk) as claimed:
+            self.assertEqual(claimed, [transactions[0]])
+
+    @patch('django.db.models.query.QuerySet.select_for_update')
+    def test_skip_locked(self, select_for_update_mock):
+        select_for_update_mock.return_value = Transaction.objects.none()
+        features = connection.features
+
+        with claim_transactions(Transaction.FAILURE):
+            pass
+        select_for_update_mock.assert_called_with()
+
+        features.has_select_for_update_skip_locked = True
+        try:
+            with claim_transactions(Transaction.FAILURE):
+                pass
+        finally:
+            del features.has_select_for_update_skip_locked
+        select_for_update_mock.assert_called_with(skip_locked=True)
+
+    @patch('ripple_api.tasks.path_find')
+    def test_retry_failing_again(self, path_find_mock):
+        transaction = Transaction.objects.create(
+            account='account', destination='destination', currency='USD',
+            value='1', status=Transaction.FAILURE)
+        path_find_mock.return_value = {'alternatives': []}
+
+        Command().retry_failed_transactions()
+
+        # failed retry is left for the next run
+        self.assertEqual(path_find_mock.call_count, 1)
+        self.assertEqual(
+            Transaction.objects.get(pk=transaction.pk).status,
+            Transaction.FAIL_FIXED)
+        self.assertEqual(
+            Transaction.objects.filter(status=Transaction.FAILURE).count(), 1)
+
+
+class TestSessionPool(TestCase):
+
+    def test_session_reused_per_url(self):
+        pool = SessionPool()
+
+        session = pool.get('http://one.ripple.com:51234')
+        self.assertIs(pool.get('http://one.ripple.com:51234'), session)
+        self.assertIsNot(pool.get('http://two.ripple.com:51234'), session)
+
+    @patch('ripple_api.connection.time.time')
+    def test_session_lifetime(self, time_mock):
+        time_mock.return_value = 100
+        pool = SessionPool(lifetime=10)
+        session = pool.get('http://one.ripple.com:51234')
+
+        time_mock.return_value = 109
+        self.assertIs(pool.get('http://one.ripple.com:51234'), session)
+
+        time_mock.return_value = 110
+        self.assertIsNot(pool.get('http://one.ripple.com:51234'), session)
+
+    @patch('ripple_api.connection.time.time')
+    def test_expired_session_not_closed(self, time_mock):
+        time_mock.return_value = 100
+        pool = SessionPool(lifetime=10, session_factory=Mock)
+        session = pool.get('http://one.ripple.com:51234')
+
+        time_mock.return_value = 110
+        pool.get('http://one.ripple.com:51234')
+
+        # requests in flight in other threads may still use it
+        self.assertFalse(session.close.called)
+
+    def test_keep_alive_disabled(self):
+        pool = SessionPool(keep_alive=False)
+
+        session = pool.get('http://one.ripple.com:51234')
+        self.assertEqual(session.headers['Connection'], 'close')
+
+    # call_api reads servers from django settings when they are configured
+    @override_settings(RIPPLE_API_DATA=[
+        {'RIPPLE_API_URL': 'http://one.ripple.com:51234'}
+    ])
+    def test_call_api_uses_session_factory(self):
+        response = Response()
+        response._content = json.dumps({'result': {'status': 'success'}})
+        session = Mock()
+        session.post.return_value = response
+        previous = get_session_pool()
+        set_session_pool(SessionPool(session_factory=lambda: session))
+
+        try:
+            result = call_api({}, servers=[
+                {'RIPPLE_API_URL': 'http://one.ripple.com:51234'}
+            ])
+        finally:
+            set_session_pool(previous)
+
+        self.assertEqual(result, {'status': 'success'})
+        self.assertEqual(session.post.call_count, 1)
@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 import json
+import threading
 
 from django.conf import settings
 from django.test import TestCase
@@ -10,6 +11,7 @@ from mock import patch
 from decimal import Decimal
 
 import ripple_api
+from .cache import LedgerCache
 
 sequence = 12
 destination_account = u'rJobmmpNqozqY7MzwGkRs1VLEBJ7H5Pjrp'
@@ -123,3 +125,248 @@ class BalanceTestCase(TestCase):
                                          issuers=None, currency="CCK",
                                          servers=self.servers)
         self.assertEqual(cck_balance, Decimal("7.51418646934461"))
+
+
+def paged_side_effect(page_size):
+    """
+    Returns `account_lines` of `responses` in pages of `page_size` lines.
+    """
+    lines = responses['account_lines']['lines']
+
+    def side_effect(data, **kwargs):
+        params = data['params'][0]
+        start = int(params.get('marker', 0))
+        result = {
+            u'status': u'success',
+            u'lines': lines[start:start + page_size],
+            u'ledger_index': 12159865,
+        }
+        if start + page_size < len(lines):
+            result[u'marker'] = str(start + page_size)
+        return result
+
+    return side_effect
+
+
+class AccountLinesTestCase(TestCase):
+
+    def setUp(self):
+        self.servers = settings.RIPPLE_API_DATA
+
+    @patch('ripple_api.ripple_api.call_api')
+    def test_pages(self, call_api_mock):
+        call_api_mock.side_effect = paged_side_effect(3)
+
+        lines = list(ripple_api.iter_account_lines(
+            settings.RIPPLE_ACCOUNT, limit=3, servers=self.servers))
+
+        self.assertEqual(lines, responses['account_lines']['lines'])
+        params = [call[0][0]['params'][0]
+                  for call in call_api_mock.call_args_list]
+        self.assertEqual(params, [
+            {'account': settings.RIPPLE_ACCOUNT, 'ledger_index': 'validated',
+             'limit': 3},
+            # pinned to the ledger of the first page
+            {'account': settings.RIPPLE_ACCOUNT, 'ledger_index': 12159865,
+             'limit': 3, 'marker': '3'},
+        ])
+
+    @patch('ripple_api.ripple_api.call_api')
+    def test_balance_pages(self, call_api_mock):
+        call_api_mock.side_effect = paged_side_effect(1)
+
+        usd_balance = ripple_api.balance(settings.RIPPLE_ACCOUNT,
+                                         issuers=None, currency="USD",
+                                         servers=self.servers)
+
+        self.assertEqual(usd_balance, Decimal("2.550265201742073"))
+        self.assertEqual(call_api_mock.call_count, 4)
+
+    @patch('ripple_api.ripple_api.call_api')
+    def test_balance_stops_early(self, call_api_mock):
+        call_api_mock.side_effect = paged_side_effect(1)
+
+        cck_balance = ripple_api.balance(
+            settings.RIPPLE_ACCOUNT, currency="CCK",
+            issuers=['rhhPzptf4EdiRRopSVC3AEbHwDa9df8y2i',
+                     'rp2PaYDxVwDvaZVLEQv7bHhoFQEyX1mEx7'],
+            servers=self.servers)
+
+        self.assertEqual(cck_balance, Decimal("7.51418646934461"))
+        # the last page is not needed
+        self.assertEqual(call_api_mock.call_count, 3)
+
+    @patch('ripple_api.ripple_api.call_api')
+    def test_balance_of_one_issuer(self, call_api_mock):
+        call_api_mock.side_effect = side_effect
+
+        ripple_api.balance(settings.RIPPLE_ACCOUNT, currency="USD",
+                           issuers=['rp2PaYDxVwDvaZVLEQv7bHhoFQEyX1mEx7'],
+                           servers=self.servers)
+
+        self.assertEqual(
+            call_api_mock.call_args[0][0]['params'][0]['peer'],
+            'rp2PaYDxVwDvaZVLEQv7bHhoFQEyX1mEx7')
+
+    @patch('ripple_api.ripple_api.call_api')
+    def test_balance_of_issuer_string(self, call_api_mock):
+        call_api_mock.side_effect = side_effect
+
+        usd_balance = ripple_api.balance(
+            settings.RIPPLE_ACCOUNT, currency="USD",
+            issuers='rp2PaYDxVwDvaZVLEQv7bHhoFQEyX1mEx7',
+            servers=self.servers)
+
+        self.assertEqual(usd_balance, Decimal('0.7907'))
+        params = call_api_mock.call_args[0][0]['params'][0]
+        self.assertEqual(params['peer'], 'rp2PaYDxVwDvaZVLEQv7bHhoFQEyX1mEx7')
+        # lines are read from the current ledger, as before
+        self.assertEqual(params['ledger_index'], 'current')
+
+
+class BalancesTestCase(TestCase):
+
+    def setUp(self):
+        self.servers = settings.RIPPLE_API_DATA
+        patcher = patch('ripple_api.cache._reserve_cache',
+                        LedgerCache(ttl=600))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def side_effect(self, data, **kwargs):
+        if data['method'] == 'server_state':
+            return {u'state': {u'validated_ledger': {
+                u'reserve_base': 20000000,
+                u'reserve_inc': 5000000,
+                u'seq': 12159865,
+            }}}
+        return side_effect(data, **kwargs)
+
+    @patch('ripple_api.ripple_api.call_api')
+    def test_balances(self, call_api_mock):
+        call_api_mock.side_effect = self.side_effect
+
+        balances = ripple_api.balances(settings.RIPPLE_ACCOUNT,
+                                       servers=self.servers)
+
+        self.assertEqual(balances['ledger_index'], 12159865)
+        self.assertEqual(balances['xrp'], {
+            'balance': Decimal('50.488267'),
+            'reserve': Decimal('35'),
+            'spendable': Decimal('15.488267'),
+        })
+        self.assertEqual(balances['currencies'], {
+            'USD': {
+                'total': Decimal('2.550265201742073'),
+                'issuers': {
+                    'rhhPzptf4EdiRRopSVC3AEbHwDa9df8y2i':
+                        Decimal('1.759565201742073'),
+                    'rp2PaYDxVwDvaZVLEQv7bHhoFQEyX1mEx7': Decimal('0.7907'),
+                },
+            },
+            'CCK': {
+                'total': Decimal('7.51418646934461'),
+                'issuers': {
+                    'rhhPzptf4EdiRRopSVC3AEbHwDa9df8y2i': Decimal('0'),
+                    'rp2PaYDxVwDvaZVLEQv7bHhoFQEyX1mEx7':
+                        Decimal('7.51418646934461'),
+                },
+            },
+        })
+        lines_params = [call[0][0]['params'][0]
+                        for call in call_api_mock.call_args_list
+                        if call[0][0]['method'] == 'account_lines']
+        # lines are read from the ledger of account_info
+        self.assertEqual([params['ledger_index'] for params in lines_params],
+                         [12159865])
+
+    @patch('ripple_api.ripple_api.call_api')
+    def test_issuers_and_cached_reserves(self, call_api_mock):
+        call_api_mock.side_effect = self.side_effect
+
+        for i in range(2):
+            balances = ripple_api.balances(
+                settings.RIPPLE_ACCOUNT, servers=self.servers,
+                issuers=['rp2PaYDxVwDvaZVLEQv7bHhoFQEyX1mEx7'])
+
+        self.assertEqual(
+            sorted(balances['currencies']), ['CCK', 'USD'])
+        self.assertEqual(balances['currencies']['USD']['total'],
+                         Decimal('0.7907'))
+        methods = [call[0][0]['method']
+                   for call in call_api_mock.call_args_list]
+        self.assertEqual(methods.count('server_state'), 1)
+
+    @patch('ripple_api.ripple_api.call_api')
+    def test_spendable_below_reserve(self, call_api_mock):
+        def below_reserve(data, **kwargs):
+            if data['method'] == 'account_info':
+                return {u'ledger_index': 1, u'account_data': {
+                    u'Balance': u'30000000', u'OwnerCount': 3}}
+            return self.side_effect(data, **kwargs)
+        call_api_mock.side_effect = below_reserve
+
+        balances = ripple_api.balances(settings.RIPPLE_ACCOUNT,
+                                       servers=self.servers)
+
+        self.assertEqual(balances['xrp']['spendable'], Decimal('0'))
+
+
+class BalanceManyTestCase(TestCase):
+
+    def setUp(self):
+        self.servers = settings.RIPPLE_API_DATA
+        self.lines = {}
+
+    def side_effect(self, data, **kwargs):
+        if data['method'] == 'ledger':
+            return {u'ledger_index': 12159865}
+        account = data['params'][0]['account']
+        if account not in self.lines:
+            raise ripple_api.RippleApiError('actNotFound', 19,
+                                            'Account not found.')
+        return {u'lines': self.lines[account]}
+
+    @patch('ripple_api.ripple_api.call_api')
+    def test_balance_many(self, call_api_mock):
+        call_api_mock.side_effect = self.side_effect
+        self.lines = {
+            'first': responses['account_lines']['lines'],
+            'second': [],
+        }
+
+        results = dict(ripple_api.balance_many(
+            ['first', 'second', 'unknown'], None, 'USD', concurrency=2,
+            servers=self.servers))
+
+        self.assertEqual(results['first'], Decimal('2.550265201742073'))
+        self.assertEqual(results['second'], Decimal('0'))
+        self.assertIsInstance(results['unknown'], ripple_api.RippleApiError)
+        self.assertEqual(results['unknown'].error, 'actNotFound')
+        # all lines are read from the same ledger
+        ledger_indexes = [call[0][0]['params'][0]['ledger_index']
+                          for call in call_api_mock.call_args_list]
+        self.assertEqual(ledger_indexes,
+                         ['validated'] + [12159865] * 3)
+
+    @patch('ripple_api.ripple_api.call_api')
+    def test_results_stream(self, call_api_mock):
+        slow_called = threading.Event()
+        fast_received = threading.Event()
+
+        def side_effect(data, **kwargs):
+            if data['params'][0]['account'] == 'slow':
+                slow_called.set()
+                fast_received.wait(5)
+            return {u'lines': []}
+        call_api_mock.side_effect = side_effect
+
+        results = ripple_api.balance_many(['slow', 'fast'], None, 'USD',
+                                          concurrency=2, ledger_index=1,
+                                          servers=self.servers)
+
+        # the fast account is yielded while the slow one is still running
+        self.assertEqual(next(results), ('fast', Decimal('0')))
+        self.assertTrue(slow_called.is_set())
+        fast_received.set()
+        self.assertEqual(list(results), [('slow', Decimal('0'))])
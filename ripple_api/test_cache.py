@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+
+from django.test import TestCase
+
+from mock import patch
+
+from .cache import LedgerCache
+from .ripple_api import book_offer, RippleApiError
+
+
+class LedgerCacheTestCase(TestCase):
+
+    def test_hit_and_miss(self):
+        cache = LedgerCache(ttl=10)
+
+        self.assertEqual(cache.get('key', lambda: 1), 1)
+        self.assertEqual(cache.get('key', lambda: 2), 1)
+        self.assertEqual(cache.stats(),
+                         {'hits': 1, 'misses': 1, 'collapsed': 0, 'size': 1})
+
+    @patch('ripple_api.cache.time.time')
+    def test_ttl(self, time_mock):
+        cache = LedgerCache(ttl=4)
+        time_mock.return_value = 100
+        cache.get('key', lambda: 1)
+
+        time_mock.return_value = 103
+        self.assertEqual(cache.get('key', lambda: 2), 1)
+        time_mock.return_value = 104
+        self.assertEqual(cache.get('key', lambda: 2), 2)
+
+    def test_new_ledger_invalidates(self):
+        cache = LedgerCache(ttl=10)
+        ledger_index = lambda value: value['ledger_current_index']
+
+        cache.get('key', lambda: {'ledger_current_index': 5}, ledger_index)
+        cache.observe_ledger(5)
+        self.assertEqual(
+            cache.get('key', lambda: {'ledger_current_index': 6},
+                      ledger_index),
+            {'ledger_current_index': 5})
+
+        cache.observe_ledger(6)
+        self.assertEqual(
+            cache.get('key', lambda: {'ledger_current_index': 6},
+                      ledger_index),
+            {'ledger_current_index': 6})
+
+    def test_lru_eviction(self):
+        cache = LedgerCache(ttl=10, maxsize=2)
+        cache.get('one', lambda: 1)
+        cache.get('two', lambda: 2)
+        cache.get('one', lambda: None)
+        cache.get('three', lambda: 3)
+
+        self.assertEqual(cache.get('one', lambda: None), 1)
+        self.assertEqual(cache.get('two', lambda: 'reloaded'), 'reloaded')
+
+    def test_concurrent_misses_collapsed(self):
+        cache = LedgerCache(ttl=10)
+        calls = []
+        results = []
+
+        def load():
+            calls.append(1)
+            time.sleep(0.1)
+            return 'value'
+
+        threads = [
+            threading.Thread(
+                target=lambda: results.append(cache.get('key', load)))
+            for i in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['value'] * 5)
+        self.assertEqual(cache.stats()['collapsed'], 4)
+
+    def test_error_not_cached(self):
+        cache = LedgerCache(ttl=10)
+
+        def fail():
+            raise RippleApiError('tooBusy', 9, 'The server is too busy.')
+
+        self.assertRaises(RippleApiError, cache.get, 'key', fail)
+        self.assertEqual(cache.get('key', lambda: 1), 1)
+
+
+class BookOfferCacheTestCase(TestCase):
+
+    @patch('ripple_api.ripple_api.call_api')
+    def test_book_offer_cached(self, call_api_mock):
+        call_api_mock.return_value = {
+            'status': 'success', 'offers': [], 'ledger_current_index': 10}
+
+        with patch('ripple_api.cache._book_cache', LedgerCache(ttl=10)):
+            book_offer('XRP', '', 'USD', 'issuer')
+            book_offer('XRP', '', 'USD', 'issuer')
+            self.assertEqual(call_api_mock.call_count, 1)
+
+            book_offer('XRP', '', 'EUR', 'issuer')
+            book_offer('XRP', '', 'USD', 'issuer', ledger='validated')
+            self.assertEqual(call_api_mock.call_count, 3)
+
+    @patch('ripple_api.ripple_api.call_api')
+    def test_book_offer_not_cached_by_default(self, call_api_mock):
+        call_api_mock.return_value = {'status': 'success', 'offers': []}
+
+        book_offer('XRP', '', 'USD', 'issuer')
+        book_offer('XRP', '', 'USD', 'issuer')
+        self.assertEqual(call_api_mock.call_count, 2)
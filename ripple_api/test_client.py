@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+from decimal import Decimal
+
+from django.conf import settings
+from django.test import TestCase
+
+from mock import patch
+
+from .client import AsyncRippleClient
+from .connection import SessionPool
+from .ripple_api import RippleApiError
+from .test_balance import side_effect
+
+
+class AsyncRippleClientTestCase(TestCase):
+
+    @patch('ripple_api.ripple_api.call_api')
+    def test_balance(self, call_api_mock):
+        call_api_mock.side_effect = side_effect
+
+        with AsyncRippleClient(max_workers=4) as client:
+            futures = [client.balance(settings.RIPPLE_ACCOUNT, None, currency)
+                       for currency in ('XRP', 'USD')]
+
+        self.assertEqual(futures[0].result(), Decimal('50.488267'))
+        self.assertEqual(futures[1].result(), Decimal('2.550265201742073'))
+
+    @patch('ripple_api.ripple_api.call_api')
+    def test_connection_options(self, call_api_mock):
+        call_api_mock.return_value = {'status': 'success'}
+        servers = [{'RIPPLE_API_URL': 'http://one.ripple.com:51234'}]
+
+        with AsyncRippleClient(servers=servers, timeout=2) as client:
+            client.tx('hash').result()
+
+        call_api_mock.assert_called_once_with(
+            {'method': 'tx', 'params': [{'transaction': 'hash'}]},
+            servers=servers, server_url=None, api_user=None,
+            api_password=None, timeout=2)
+
+    @patch('ripple_api.ripple_api.call_api')
+    def test_error(self, call_api_mock):
+        call_api_mock.side_effect = RippleApiError(
+            'txnNotFound', 29, 'Transaction not found.')
+
+        with AsyncRippleClient() as client:
+            future = client.tx('hash')
+
+        self.assertRaises(RippleApiError, future.result)
+
+
+class ServerLimiterTestCase(TestCase):
+
+    def test_limiter_per_server(self):
+        pool = SessionPool(server_concurrency=2)
+
+        limiter = pool.limiter('http://one.ripple.com:51234')
+        self.assertIs(pool.limiter('http://one.ripple.com:51234'), limiter)
+        self.assertTrue(limiter.acquire(False))
+        self.assertTrue(limiter.acquire(False))
+        self.assertFalse(limiter.acquire(False))
+        self.assertTrue(
+            pool.limiter('http://two.ripple.com:51234').acquire(False))
+
+    def test_no_limit(self):
+        pool = SessionPool()
+
+        with pool.limiter('http://one.ripple.com:51234'):
+            pass
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+from django.test import TestCase
+
+from mock import patch
+
+from .confirmation import ConfirmationTracker
+from .models import Transaction
+from .ripple_api import RippleApiError
+from .tasks import submit_task
+from .trade import get_transaction_result, get_transaction_result_future
+
+
+def rippled(transactions, ledger_index=100):
+    """
+    Returns `call_api` replacement answering `tx` from `transactions` dict
+    and `ledger` with `ledger_index`.
+    """
+    def call_api(data, **kwargs):
+        if data['method'] == 'ledger':
+            return {'ledger_index': ledger_index, 'validated': True}
+        tx_hash = data['params'][0]['transaction']
+        if tx_hash not in transactions:
+            raise RippleApiError('txnNotFound', 29, 'Transaction not found.')
+        return transactions[tx_hash]
+    return call_api
+
+
+class ConfirmationTrackerTestCase(TestCase):
+
+    def setUp(self):
+        self.tracker = ConfirmationTracker(poll_interval=None)
+
+    @patch('ripple_api.ripple_api.call_api')
+    def test_poll(self, call_api_mock):
+        call_api_mock.side_effect = rippled({
+            'validated': {'hash': 'validated', 'validated': True},
+            'open': {'hash': 'open', 'validated': False},
+        })
+        validated = self.tracker.track('validated')
+        not_found = self.tracker.track('not_found')
+        open_ledger = self.tracker.track('open')
+
+        self.assertEqual(self.tracker.poll(), 1)
+
+        self.assertEqual(validated.result(0), {'hash': 'validated',
+                                               'validated': True})
+        self.assertFalse(not_found.done())
+        self.assertFalse(open_ledger.done())
+        self.assertEqual(sorted(self.tracker.pending()),
+                         ['not_found', 'open'])
+
+    @patch('ripple_api.ripple_api.call_api')
+    def test_expired(self, call_api_mock):
+        call_api_mock.side_effect = rippled({}, ledger_index=100)
+        expired = self.tracker.track('expired', last_ledger_sequence=99)
+        current = self.tracker.track('current', last_ledger_sequence=100)
+
+        self.assertEqual(self.tracker.poll(), 1)
+
+        with self.assertRaises(RippleApiError) as context:
+            expired.result(0)
+        self.assertEqual(context.exception.error, 'txnExpired')
+        self.assertFalse(current.done())
+
+    def test_track_twice(self):
+        results = []
+        first = self.tracker.track('hash')
+        second = self.tracker.track('hash', callback=results.append)
+
+        self.assertIs(first, second)
+        self.tracker.untrack('hash')
+        self.assertTrue(first.cancelled())
+        self.assertEqual(results, [first])
+        self.assertEqual(self.tracker.pending(), [])
+
+    @patch('ripple_api.confirmation.time')
+    @patch('ripple_api.ripple_api.call_api')
+    def test_timeout(self, call_api_mock, time_mock):
+        call_api_mock.side_effect = rippled({})
+        time_mock.time.return_value = 1000
+        timed = self.tracker.track('timed', timeout=10)
+        untimed = self.tracker.track('untimed', timeout=10)
+        self.tracker.track('untimed')
+
+        time_mock.time.return_value = 1010
+        self.tracker.poll()
+
+        self.assertTrue(timed.cancelled())
+        # also tracked without timeout
+        self.assertFalse(untimed.done())
+        self.assertEqual(self.tracker.pending(), ['untimed'])
+        self.assertEqual(call_api_mock.call_count, 1)
+
+
+class GetTransactionResultTestCase(TestCase):
+
+    def setUp(self):
+        self.tracker = ConfirmationTracker(poll_interval=None)
+        patcher = patch('ripple_api.trade.get_confirmation_tracker',
+                        return_value=self.tracker)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @patch('ripple_api.ripple_api.call_api')
+    def test_future(self, call_api_mock):
+        call_api_mock.side_effect = rippled({
+            'validated': {'hash': 'validated', 'validated': True},
+        })
+
+        validated = get_transaction_result_future('validated', 5, None)
+        not_validated = get_transaction_result_future('not_validated', 5,
+                                                      None)
+
+        # the caller is not blocked until the tracker polls
+        self.assertFalse(validated.done())
+        self.tracker.poll()
+        self.assertEqual(validated.result(0), {'hash': 'validated',
+                                               'validated': True})
+
+        self.tracker.untrack('not_validated')
+        self.assertEqual(not_validated.result(0), {})
+
+    @patch('ripple_api.ripple_api.call_api')
+    def test_blocking(self, call_api_mock):
+        call_api_mock.side_effect = rippled({
+            'validated': {'hash': 'validated', 'validated': True},
+        })
+        self.tracker.poll_interval = 0.01
+
+        self.assertEqual(get_transaction_result('validated', 5, None),
+                         {'hash': 'validated', 'validated': True})
+        self.assertEqual(
+            get_transaction_result('not_validated', 5, None, wait=0.01), {})
+
+
+class SubmitTaskConfirmationTestCase(TestCase):
+
+    @patch('ripple_api.ripple_api.call_api')
+    @patch('ripple_api.tasks.get_confirmation_tracker')
+    @patch('ripple_api.tasks.submit')
+    def test_insufficient_fee(self, submit_mock, get_tracker_mock,
+                              call_api_mock):
+        tracker = ConfirmationTracker(poll_interval=None)
+        get_tracker_mock.return_value = tracker
+        submit_mock.return_value = {'engine_result': 'telINSUF_FEE_P'}
+        transaction = Transaction.objects.create(
+            account='account', destination='destination', currency='XRP',
+            value='1', hash='hash', status=Transaction.PENDING)
+
+        submit_task(transaction.pk)
+
+        # worker is not held until the transaction is validated
+        transaction = Transaction.objects.get(pk=transaction.pk)
+        self.assertEqual(transaction.status, Transaction.SUBMITTED)
+        self.assertEqual(tracker.pending(), ['hash'])
+
+        call_api_mock.side_effect = rippled({'hash': {
+            'validated': True, 'meta': {'TransactionResult': 'tesSUCCESS'}}})
+        tracker.poll()
+
+        transaction = Transaction.objects.get(pk=transaction.pk)
+        self.assertEqual(transaction.status, Transaction.SUCCESS)
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from mock import patch
+
+from .fee import FeeOracle
+from .management.transaction_pipeline import run_stage
+from .models import AccountSequence, Transaction
+from .ripple_api import RippleApiError, sign
+from .tasks import sign_task, submit_task
+
+
+def fee_response(open_ledger_fee='10', ledger_current_index=1000):
+    return {
+        'status': 'success',
+        'ledger_current_index': ledger_current_index,
+        'drops': {
+            'base_fee': '10',
+            'minimum_fee': '10',
+            'median_fee': '5000',
+            'open_ledger_fee': open_ledger_fee,
+        },
+    }
+
+
+class FeeOracleTestCase(TestCase):
+
+    def test_policies(self):
+        response = fee_response('25')
+
+        self.assertEqual(FeeOracle(policy='minimum').choose(response), 10)
+        self.assertEqual(FeeOracle(policy='open_ledger').choose(response), 25)
+        self.assertEqual(FeeOracle(policy='median').choose(response), 5000)
+        self.assertRaises(ValueError, FeeOracle, policy='unknown')
+
+    def test_multiplier_and_cap(self):
+        oracle = FeeOracle(multiplier='1.5', max_fee=100)
+
+        self.assertEqual(oracle.choose(fee_response('25')), 38)
+        self.assertEqual(oracle.choose(fee_response('80')), 100)
+
+    def test_cached(self):
+        oracle = FeeOracle(ttl=10)
+        responses = [fee_response('10'), fee_response('20')]
+
+        self.assertEqual(oracle.fee('key', lambda: responses.pop(0)), 10)
+        self.assertEqual(oracle.fee('key', lambda: responses.pop(0)), 10)
+        self.assertEqual(len(responses), 1)
+
+    def test_error(self):
+        oracle = FeeOracle(max_fee=500)
+
+        def fail():
+            raise RippleApiError('noNetwork', 17, 'Not synced.')
+
+        self.assertEqual(oracle.fee('key', fail), 500)
+        # malformed result is not cached
+        self.assertEqual(oracle.fee('key', lambda: {}), 500)
+        self.assertEqual(oracle.fee('key', lambda: fee_response('12')), 12)
+
+
+class EstimateFeeTestCase(TestCase):
+
+    @patch('ripple_api.ripple_api.get_fee_oracle')
+    @patch('ripple_api.ripple_api.call_api')
+    def test_sign_default_fee(self, call_api_mock, get_fee_oracle_mock):
+        get_fee_oracle_mock.return_value = FeeOracle()
+        call_api_mock.side_effect = [
+            fee_response('15'),
+            {'status': 'success', 'tx_blob': 'blob', 'tx_json': {}},
+        ]
+
+        sign('account', 'secret', 'destination', '1000000')
+
+        self.assertEqual(call_api_mock.call_args_list[0][0][0]['method'],
+                         'fee')
+        request = call_api_mock.call_args[0][0]
+        self.assertEqual(request['params'][0]['tx_json']['Fee'], 15)
+
+
+class MinimumFeeTestCase(TestCase):
+
+    @override_settings(RIPPLE_API_ALLOCATE_SEQUENCE=True)
+    @patch('ripple_api.tasks.get_confirmation_tracker')
+    @patch('ripple_api.ripple_api.get_fee_oracle')
+    @patch('ripple_api.ripple_api.call_api')
+    def test_queued_transaction_not_retried(self, call_api_mock,
+                                            get_fee_oracle_mock,
+                                            get_tracker_mock):
+        get_fee_oracle_mock.return_value = FeeOracle(policy='minimum')
+        AccountSequence.objects.create(account='account', sequence=3)
+        responses = {
+            'fee': fee_response('5000'),
+            'ledger_current': {'ledger_current_index': 1000},
+            'sign': {'status': 'success', 'tx_blob': 'blob',
+                     'tx_json': {'hash': 'hash'}},
+            # the minimum fee only gets the transaction into the queue
+            'submit': {'engine_result': 'terQUEUED'},
+        }
+        call_api_mock.side_effect = \
+            lambda data, **kwargs: responses[data['method']]
+        transaction = Transaction.objects.create(
+            account='account', destination='destination', currency='XRP',
+            value='1', status=Transaction.PENDING)
+
+        sign_task(transaction.pk, 'secret')
+        submit_task(transaction.pk)
+        run_stage('retry')
+
+        sign_request = [call[0][0] for call in call_api_mock.call_args_list
+                        if call[0][0]['method'] == 'sign'][0]
+        self.assertEqual(sign_request['params'][0]['tx_json']['Fee'], 10)
+        self.assertEqual(Transaction.objects.get().status,
+                         Transaction.SUBMITTED)
+        self.assertEqual(get_tracker_mock.return_value.track.call_count, 1)
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+import json
+
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from mock import patch
+from requests import ConnectionError, Response
+
+from .health import HealthTracker, CLOSED, OPEN, HALF_OPEN, get_health_tracker
+from .ripple_api import call_api, servers_health
+
+one = {'RIPPLE_API_URL': 'http://one.ripple.com:51234'}
+two = {'RIPPLE_API_URL': 'http://two.ripple.com:51234'}
+three = {'RIPPLE_API_URL': 'http://three.ripple.com:51234'}
+
+
+class HealthTrackerTestCase(TestCase):
+
+    def setUp(self):
+        self.tracker = HealthTracker(failure_threshold=2, reset_timeout=10,
+                                     max_ledger_lag=3)
+
+    def test_unknown_servers_keep_order(self):
+        self.assertEqual(self.tracker.order([one, two, three]),
+                         [one, two, three])
+
+    def test_faster_server_first(self):
+        self.tracker.record_success(one['RIPPLE_API_URL'], 0.5)
+        self.tracker.record_success(two['RIPPLE_API_URL'], 0.1)
+        self.tracker.record_success(three['RIPPLE_API_URL'], 0.3)
+
+        self.assertEqual(self.tracker.order([one, two, three]),
+                         [two, three, one])
+
+    def test_failing_server_last(self):
+        self.tracker.record_failure(one['RIPPLE_API_URL'])
+        self.tracker.record_success(two['RIPPLE_API_URL'], 0.5)
+
+        self.assertEqual(self.tracker.order([one, two]), [two, one])
+
+    def test_lagging_server_last(self):
+        self.tracker.record_success(one['RIPPLE_API_URL'], 0.1, 100)
+        self.tracker.record_success(two['RIPPLE_API_URL'], 0.2, 110)
+
+        self.assertEqual(self.tracker.order([one, two]), [two, one])
+        self.assertEqual(
+            self.tracker.snapshot()[one['RIPPLE_API_URL']]['ledger_lag'], 10)
+
+    @patch('ripple_api.health.time.time')
+    def test_circuit_breaker(self, time_mock):
+        time_mock.return_value = 100
+        url = one['RIPPLE_API_URL']
+
+        self.tracker.record_failure(url)
+        self.assertEqual(self.tracker.order([one, two]), [two, one])
+        self.tracker.record_failure(url)
+        self.assertEqual(self.tracker.snapshot()[url]['state'], OPEN)
+        self.assertEqual(self.tracker.order([one, two]), [two])
+        # no other server is available
+        self.assertEqual(self.tracker.order([one]), [one])
+
+        # half-open lets only one probe through
+        time_mock.return_value = 110
+        self.assertEqual(self.tracker.order([one, two]), [two, one])
+        self.assertEqual(self.tracker.snapshot()[url]['state'], HALF_OPEN)
+        self.assertEqual(self.tracker.order([one, two]), [two])
+
+        self.tracker.record_failure(url)
+        self.assertEqual(self.tracker.snapshot()[url]['state'], OPEN)
+
+        time_mock.return_value = 120
+        self.tracker.order([one, two])
+        self.tracker.record_success(url, 0.1)
+        self.assertEqual(self.tracker.snapshot()[url]['state'], CLOSED)
+
+
+@override_settings(RIPPLE_API_DATA=[one, two])
+class HealthRoutingTestCase(TestCase):
+
+    def setUp(self):
+        get_health_tracker().reset()
+
+    def tearDown(self):
+        get_health_tracker().reset()
+
+    @patch('requests.Session.post')
+    def test_failing_server_skipped(self, post_mock):
+        def side_effect(url, *args, **kwargs):
+            if url == one['RIPPLE_API_URL']:
+                raise ConnectionError
+            response = Response()
+            response._content = json.dumps(
+                {'result': {'status': 'success',
+                            'ledger_current_index': 10}})
+            return response
+
+        post_mock.side_effect = side_effect
+
+        call_api({'method': 'ledger_current'})
+        self.assertEqual(post_mock.call_count, 2)
+
+        post_mock.reset_mock()
+        call_api({'method': 'ledger_current'})
+        self.assertEqual(post_mock.call_count, 1)
+        self.assertEqual(post_mock.call_args[0][0], two['RIPPLE_API_URL'])
+
+        health = servers_health()
+        self.assertEqual(health[one['RIPPLE_API_URL']]['failures'], 1)
+        self.assertEqual(health[two['RIPPLE_API_URL']]['state'], CLOSED)
+        self.assertEqual(health[two['RIPPLE_API_URL']]['ledger_index'], 10)
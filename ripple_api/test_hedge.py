@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+import time
+
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from mock import patch
+
+from .connection import LatencyStats
+from .ripple_api import call_api, tx, submit, RippleApiError
+
+servers = [
+    {'RIPPLE_API_URL': 'http://one.ripple.com:51234'},
+    {'RIPPLE_API_URL': 'http://two.ripple.com:51234'},
+    {'RIPPLE_API_URL': 'http://three.ripple.com:51234'},
+]
+
+
+def slow_primary(server_config, data, timeout):
+    if server_config is servers[0]:
+        time.sleep(0.5)
+        return {'server': 'one'}
+    return {'server': server_config['RIPPLE_API_URL']}
+
+
+@override_settings(RIPPLE_API_DATA=servers, RIPPLE_API_HEDGE=True,
+                   RIPPLE_API_HEDGE_DELAY=0.01,
+                   RIPPLE_API_HEDGE_PERCENTILE=None)
+class HedgedCallTestCase(TestCase):
+
+    @patch('ripple_api.ripple_api._call_server')
+    def test_slow_primary_is_hedged(self, call_server_mock):
+        call_server_mock.side_effect = slow_primary
+
+        result = tx('hash')
+
+        self.assertEqual(result, {'server': 'http://two.ripple.com:51234'})
+        self.assertEqual(call_server_mock.call_count, 2)
+
+    @patch('ripple_api.ripple_api._call_server')
+    def test_submit_is_not_hedged(self, call_server_mock):
+        call_server_mock.side_effect = slow_primary
+
+        result = submit('tx_blob')
+
+        self.assertEqual(result, {'server': 'one'})
+        self.assertEqual(call_server_mock.call_count, 1)
+
+    @patch('ripple_api.ripple_api._call_server')
+    def test_failover_on_error(self, call_server_mock):
+        def side_effect(server_config, data, timeout):
+            if server_config is servers[2]:
+                return {'server': 'three'}
+            raise RippleApiError('noNetwork', 17, 'Not synced.')
+
+        call_server_mock.side_effect = side_effect
+
+        with self.settings(RIPPLE_API_HEDGE_DELAY=5):
+            result = tx('hash')
+        self.assertEqual(result, {'server': 'three'})
+
+    @patch('ripple_api.ripple_api._call_server')
+    def test_all_failed(self, call_server_mock):
+        call_server_mock.side_effect = RippleApiError(
+            'txnNotFound', 29, 'Transaction not found.')
+
+        with self.assertRaisesMessage(RippleApiError, 'txnNotFound'):
+            call_api({'method': 'tx', 'params': [{'transaction': 'hash'}]})
+        self.assertEqual(call_server_mock.call_count, 3)
+
+
+class LatencyStatsTestCase(TestCase):
+
+    def test_percentile(self):
+        stats = LatencyStats(size=100, min_samples=10)
+        self.assertEqual(stats.percentile('url', 95, 0.5), 0.5)
+
+        for i in range(1, 101):
+            stats.add('url', i / 100.0)
+
+        self.assertEqual(stats.percentile('url', 50), 0.51)
+        self.assertEqual(stats.percentile('url', 95), 0.95)
@@ -69,7 +69,7 @@ class IsTrustSetTestCase(TestCase):
         self.usd_granted_limit = 1
         self.usd_overgranted_limit = 10
 
-    @patch('requests.post')
+    @patch('requests.Session.post')
     def test_detect_trusted_peer(self, post_mock):
         """ Test if is_trust_set detects trusted peer
         """
@@ -84,7 +84,7 @@ class IsTrustSetTestCase(TestCase):
 
         self.assertEqual(is_trusted, True)
 
-    @patch('requests.post')
+    @patch('requests.Session.post')
     def test_detect_untrusted_peer(self, post_mock):
         """ Test if is_trust_set detects untrusted peer
         """
@@ -99,7 +99,7 @@ class IsTrustSetTestCase(TestCase):
 
         self.assertEqual(is_trusted, False)
 
-    @patch('requests.post')
+    @patch('requests.Session.post')
     def test_detect_trusted_in_general_not_trusted_in_eur(self, post_mock):
         """ Test if is_trust_set detects trusted in general peer
             but not trusted in certain currency (EUR)
@@ -120,7 +120,7 @@ class IsTrustSetTestCase(TestCase):
 
         self.assertEqual(is_trusted_eur, False)
 
-    @patch('requests.post')
+    @patch('requests.Session.post')
     def test_detect_limit_enough(self, post_mock):
         """ Test if is_trust_set detects if limit is enough
         """
@@ -129,14 +129,14 @@ class IsTrustSetTestCase(TestCase):
         post_mock.return_value = response
 
         is_trusted = ripple_api.is_trust_set(self.account,
-                                             self.untrusted_peer,
+                                             self.trusted_peer,
                                              currency="USD",
                                              limit=self.usd_granted_limit,
                                              servers=self.servers)
 
         self.assertEqual(is_trusted, True)
 
-    @patch('requests.post')
+    @patch('requests.Session.post')
     def test_detect_limit_not_enough(self, post_mock):
         """ Test if is_trust_set detects if limit is not enough
         """
@@ -145,9 +145,72 @@ class IsTrustSetTestCase(TestCase):
         post_mock.return_value = response
 
         is_trusted = ripple_api.is_trust_set(self.account,
-                                             self.untrusted_peer,
+                                             self.trusted_peer,
                                              currency="USD",
                                              limit=self.usd_overgranted_limit,
                                              servers=self.servers)
 
         self.assertEqual(is_trusted, False)
+
+    @patch('ripple_api.ripple_api.call_api')
+    def test_pages_until_found(self, call_api_mock):
+        """ Test if is_trust_set reads next pages only until the currency
+            is found
+        """
+        pages = [
+            {u'lines': [], u'marker': u'1', u'ledger_current_index': 1},
+            {u'lines': data['lines'][:1], u'marker': u'2',
+             u'ledger_current_index': 1},
+            {u'lines': data['lines'][1:]},
+        ]
+        call_api_mock.side_effect = pages
+
+        is_trusted = ripple_api.is_trust_set(self.account,
+                                             self.trusted_peer,
+                                             currency="USD",
+                                             servers=self.servers)
+
+        self.assertEqual(is_trusted, True)
+        self.assertEqual(call_api_mock.call_count, 2)
+        params = call_api_mock.call_args[0][0]['params'][0]
+        self.assertEqual(params['marker'], u'1')
+        self.assertEqual(params['peer'], self.trusted_peer)
+
+    @patch('ripple_api.ripple_api.call_api')
+    def test_exact_limit(self, call_api_mock):
+        """ Test if is_trust_set compares limits as decimals
+        """
+        call_api_mock.return_value = {u'lines': [dict(
+            data['lines'][0], limit=u'0.30000000000000001')]}
+
+        self.assertTrue(ripple_api.is_trust_set(
+            self.account, self.trusted_peer, currency="USD",
+            limit='0.30000000000000001', servers=self.servers))
+        self.assertFalse(ripple_api.is_trust_set(
+            self.account, self.trusted_peer, currency="USD",
+            limit='0.30000000000000002', servers=self.servers))
+
+    @patch('ripple_api.ripple_api.call_api')
+    def test_is_trust_set_many(self, call_api_mock):
+        """ Test if is_trust_set_many checks every account in the same
+            ledger
+        """
+        def side_effect(request, **kwargs):
+            if request['method'] == 'ledger':
+                return {u'ledger_index': 12159865}
+            if request['params'][0]['account'] == self.account:
+                return data
+            return untrusted_data
+        call_api_mock.side_effect = side_effect
+
+        results = dict(ripple_api.is_trust_set_many(
+            [self.account, self.untrusted_peer], self.trusted_peer,
+            currency="USD", servers=self.servers))
+
+        self.assertEqual(results, {
+            self.account: True,
+            self.untrusted_peer: False,
+        })
+        ledger_indexes = set(call[0][0]['params'][0]['ledger_index']
+                             for call in call_api_mock.call_args_list[1:])
+        self.assertEqual(ledger_indexes, set([12159865]))
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+from django.test import TestCase
+
+from .models import Transaction
+from .signals import transaction_failure_send, transaction_status_changed
+
+
+class SetStatusTestCase(TestCase):
+
+    def setUp(self):
+        self.signals = []
+        transaction_status_changed.connect(self.on_status_changed)
+        transaction_failure_send.connect(self.on_failure)
+        self.transaction = Transaction.objects.create(
+            account='account', destination='destination', currency='XRP',
+            value='1', status=Transaction.SUBMITTED)
+
+    def tearDown(self):
+        transaction_status_changed.disconnect(self.on_status_changed)
+        transaction_failure_send.disconnect(self.on_failure)
+
+    def on_status_changed(self, sender, instance, old_status, **kwargs):
+        self.signals.append((old_status, instance.status))
+
+    def on_failure(self, sender, instance, **kwargs):
+        self.signals.append(('failure', instance.status))
+
+    def test_compare_and_set(self):
+        first = Transaction.objects.get(pk=self.transaction.pk)
+        second = Transaction.objects.get(pk=self.transaction.pk)
+
+        with self.assertNumQueries(1):
+            self.assertTrue(
+                Transaction.objects.set_status(first, Transaction.SUCCESS))
+        # second copy still has the old status
+        self.assertFalse(
+            Transaction.objects.set_status(second, Transaction.FAILURE))
+
+        self.assertEqual(first.status, Transaction.SUCCESS)
+        self.assertEqual(first.status_tracker.previous('status'),
+                         Transaction.SUCCESS)
+        self.assertEqual(second.status, Transaction.SUBMITTED)
+        self.assertEqual(
+            Transaction.objects.get(pk=self.transaction.pk).status,
+            Transaction.SUCCESS)
+        self.assertEqual(self.signals,
+                         [(Transaction.SUBMITTED, Transaction.SUCCESS)])
+
+    def test_old_status(self):
+        self.assertTrue(Transaction.objects.set_status(
+            self.transaction, Transaction.FAILURE,
+            old_status=Transaction.SUBMITTED))
+        self.assertFalse(Transaction.objects.set_status(
+            self.transaction, Transaction.SUCCESS,
+            old_status=Transaction.SUBMITTED))
+
+        self.assertEqual(self.signals, [
+            (Transaction.SUBMITTED, Transaction.FAILURE),
+            ('failure', Transaction.FAILURE),
+        ])
+
+
+class StatusTrackerTestCase(TestCase):
+
+    def test_tracker(self):
+        transaction = Transaction(account='account', status=Transaction.PENDING)
+        self.assertIsNone(transaction.status_tracker.previous('status'))
+        self.assertTrue(transaction.status_tracker.has_changed('status'))
+
+        transaction.save()
+        transaction = Transaction.objects.get(pk=transaction.pk)
+        self.assertEqual(transaction.status_tracker.previous('status'),
+                         Transaction.PENDING)
+        self.assertFalse(transaction.status_tracker.has_changed('status'))
+
+        transaction.status = Transaction.SUBMITTED
+        self.assertEqual(transaction.status_tracker.changed(),
+                         {'status': Transaction.PENDING})
+
+        transaction.save(update_fields=['tx_blob'])
+        self.assertEqual(transaction.status_tracker.previous('status'),
+                         Transaction.PENDING)
+
+    def test_deferred_status(self):
+        Transaction.objects.create(account='account')
+
+        with self.assertNumQueries(1):
+            transaction = Transaction.objects.only('account').get()
+        self.assertIsNone(transaction.status_tracker.previous('status'))
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+import json
+
+from django.conf import settings
+from django.db import connection
+from django.test import TestCase
+
+from mock import patch
+
+from django.db.models.signals import post_save
+
+from .models import AccountTxCursor, Transaction
+from .ripple_api import RippleApiError
+from .management.transaction_processors import (
+    monitor_transactions, _store_transactions
+)
+
+
+def payment(tx_hash, ledger_index):
+    return {
+        'tx': {
+            'Account': 'account', 'Destination': settings.RIPPLE_ACCOUNT,
+            'TransactionType': 'Payment',
+            'Amount': {'currency': 'CCK', 'issuer': 'p2pay', 'value': '1'},
+            'hash': tx_hash, 'ledger_index': ledger_index,
+        },
+        'meta': {'TransactionResult': 'tesSUCCESS'},
+    }
+
+
+pages = {
+    None: {
+        'ledger_index_min': 100, 'ledger_index_max': 200,
+        'transactions': [payment('hash1', 110), payment('hash2', 120)],
+        'marker': {'ledger': 120, 'seq': 5},
+    },
+    json.dumps({'ledger': 120, 'seq': 5}): {
+        'ledger_index_min': 100, 'ledger_index_max': 210,
+        'transactions': [payment('hash3', 130)],
+    },
+}
+
+
+def account_tx_side_effect(data, **kwargs):
+    marker = data['params'][0].get('marker')
+    return pages[json.dumps(marker) if marker else None]
+
+
+class AccountTxCursorTestCase(TestCase):
+
+    @patch('ripple_api.management.transaction_processors.'
+           'PROCESS_TRANSACTIONS_TIMEOUT', 0)
+    @patch('ripple_api.ripple_api.call_api')
+    def test_resume_from_marker(self, call_api_mock):
+        call_api_mock.side_effect = account_tx_side_effect
+
+        monitor_transactions(settings.RIPPLE_ACCOUNT)
+
+        self.assertEqual(call_api_mock.call_count, 1)
+        cursor = AccountTxCursor.objects.get(account=settings.RIPPLE_ACCOUNT)
+        self.assertEqual(cursor.ledger_index, 119)
+        self.assertEqual(cursor.ledger_index_min, -1)
+        self.assertEqual(json.loads(cursor.marker), {'ledger': 120, 'seq': 5})
+
+        call_api_mock.reset_mock()
+        monitor_transactions(settings.RIPPLE_ACCOUNT)
+
+        self.assertEqual(call_api_mock.call_count, 1)
+        params = call_api_mock.call_args[0][0]['params'][0]
+        self.assertEqual(params['marker'], {'ledger': 120, 'seq': 5})
+        self.assertEqual(params['ledger_index_min'], -1)
+        self.assertTrue(params['forward'])
+
+        cursor = AccountTxCursor.objects.get(account=settings.RIPPLE_ACCOUNT)
+        self.assertEqual(cursor.ledger_index, 210)
+        self.assertEqual(cursor.marker, '')
+        self.assertEqual(Transaction.objects.count(), 3)
+
+    @patch('ripple_api.ripple_api.call_api')
+    def test_start_after_processed_ledger(self, call_api_mock):
+        AccountTxCursor.objects.create(account=settings.RIPPLE_ACCOUNT,
+                                       ledger_index=210)
+        call_api_mock.return_value = {
+            'ledger_index_min': 211, 'ledger_index_max': 215,
+            'transactions': [],
+        }
+
+        monitor_transactions(settings.RIPPLE_ACCOUNT)
+
+        params = call_api_mock.call_args[0][0]['params'][0]
+        self.assertEqual(params['ledger_index_min'], 211)
+        self.assertNotIn('marker', params)
+        cursor = AccountTxCursor.objects.get(account=settings.RIPPLE_ACCOUNT)
+        self.assertEqual(cursor.ledger_index, 215)
+
+    @patch('ripple_api.ripple_api.call_api')
+    def test_restart_on_rejected_marker(self, call_api_mock):
+        AccountTxCursor.objects.create(
+            account=settings.RIPPLE_ACCOUNT, ledger_index=119,
+            ledger_index_min=-1, marker=json.dumps({'ledger': 120, 'seq': 5}))
+        call_api_mock.side_effect = [
+            RippleApiError('invalidParams', 31, "Invalid field 'marker'."),
+            {'ledger_index_min': 120, 'ledger_index_max': 215,
+             'transactions': [payment('hash3', 130)]},
+        ]
+
+        monitor_transactions(settings.RIPPLE_ACCOUNT)
+
+        self.assertEqual(call_api_mock.call_count, 2)
+        params = call_api_mock.call_args[0][0]['params'][0]
+        self.assertEqual(params['ledger_index_min'], 120)
+        self.assertNotIn('marker', params)
+        cursor = AccountTxCursor.objects.get(account=settings.RIPPLE_ACCOUNT)
+        self.assertEqual(cursor.ledger_index, 215)
+        self.assertEqual(cursor.marker, '')
+        self.assertIsNone(cursor.ledger_index_min)
+        self.assertEqual(Transaction.objects.count(), 1)
+
+    @patch('ripple_api.ripple_api.call_api')
+    def test_new_cursor_starts_from_stored_transactions(self, call_api_mock):
+        Transaction.objects.create(destination=settings.RIPPLE_ACCOUNT,
+                                   hash='hash', ledger_index=300,
+                                   status=Transaction.PROCESSED)
+        call_api_mock.return_value = {'transactions': []}
+
+        monitor_transactions(settings.RIPPLE_ACCOUNT)
+
+        params = call_api_mock.call_args[0][0]['params'][0]
+        self.assertEqual(params['ledger_index_min'], 300)
+
+
+class StoreTransactionsTestCase(TestCase):
+
+    def test_bulk_store(self):
+        Transaction.objects.create(destination=settings.RIPPLE_ACCOUNT,
+                                   hash='hash1', ledger_index=110)
+        outgoing = payment('hash4', 130)
+        outgoing['tx']['Destination'] = 'other'
+        saved = []
+
+        def receiver(sender, instance, created, **kwargs):
+            saved.append((instance.hash, created, instance.pk is not None))
+
+        # a bulk insert, or an insert in a savepoint per new transaction
+        if getattr(connection.features, 'can_return_ids_from_bulk_insert',
+                   False):
+            queries = 4
+        else:
+            queries = 7
+        post_save.connect(receiver, sender=Transaction)
+        try:
+            with self.assertNumQueries(queries):
+                _store_transactions(settings.RIPPLE_ACCOUNT, [
+                    payment('hash1', 110), payment('hash2', 120),
+                    payment('hash3', 130), payment('hash3', 130), outgoing,
+                ])
+        finally:
+            post_save.disconnect(receiver, sender=Transaction)
+
+        self.assertEqual(
+            sorted(Transaction.objects.values_list('hash', flat=True)),
+            ['hash1', 'hash2', 'hash3'])
+        self.assertEqual(sorted(saved),
+                         [('hash2', True, True), ('hash3', True, True)])
+
+    def test_nothing_new(self):
+        Transaction.objects.create(destination=settings.RIPPLE_ACCOUNT,
+                                   hash='hash1', ledger_index=110)
+
+        with self.assertNumQueries(1):
+            _store_transactions(settings.RIPPLE_ACCOUNT,
+                                [payment('hash1', 110)])
+
+    @patch.object(connection.features, 'can_return_ids_from_bulk_insert',
+                  False, create=True)
+    def test_stored_meanwhile(self):
+        saved = []
+
+        def receiver(sender, instance, created, **kwargs):
+            saved.append(instance.hash)
+            if instance.hash == 'hash2':
+                # another ingester stores the next payment meanwhile
+                Transaction.objects.bulk_create([Transaction(
+                    destination=settings.RIPPLE_ACCOUNT, hash='hash3',
+                    received_hash='hash3', ledger_index=130)])
+
+        post_save.connect(receiver, sender=Transaction)
+        try:
+            _store_transactions(settings.RIPPLE_ACCOUNT, [
+                payment('hash2', 120), payment('hash3', 130),
+                payment('hash4', 140),
+            ])
+        finally:
+            post_save.disconnect(receiver, sender=Transaction)
+
+        # only payments stored here are signalled
+        self.assertEqual(saved, ['hash2', 'hash4'])
+        self.assertEqual(
+            sorted(Transaction.objects.values_list('hash', flat=True)),
+            ['hash2', 'hash3', 'hash4'])
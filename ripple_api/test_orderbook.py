@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+from decimal import Decimal
+
+from django.test import TestCase
+
+from mock import patch
+
+from .cache import LedgerCache
+from .orderbook import OrderBook
+from .ripple_api import RippleApiError, convert, extract_value
+
+offers = [
+    {'TakerPays': '1000000', 'quality': '500000',
+     'TakerGets': {'currency': 'USD', 'issuer': 'issuer', 'value': '2'}},
+    {'TakerPays': '1500000', 'quality': '600000',
+     'TakerGets': {'currency': 'USD', 'issuer': 'issuer', 'value': '2.5'},
+     'taker_pays_funded': '1200000',
+     'taker_gets_funded': {'currency': 'USD', 'issuer': 'issuer',
+                           'value': '2'}},
+    {'TakerPays': '3500000', 'quality': '700000',
+     'TakerGets': {'currency': 'USD', 'issuer': 'issuer', 'value': '5'}},
+]
+offers_info = {'status': 'success', 'offers': offers}
+
+
+def walk_offers(amount_from, offers, sell):
+    """
+    Order book walk that `convert` used before `OrderBook`.
+    """
+    amount_to = 0
+    convert_left = Decimal(amount_from)
+    for offer in offers:
+        if 'taker_gets_funded' in offer:
+            pays = Decimal(extract_value(offer['taker_pays_funded']))
+            gets = Decimal(extract_value(offer['taker_gets_funded']))
+        else:
+            pays = Decimal(extract_value(offer['TakerPays']))
+            gets = Decimal(extract_value(offer['TakerGets']))
+
+        if not sell:
+            if convert_left < gets:
+                amount_to += convert_left * Decimal(offer['quality'])
+                convert_left = 0
+                break
+            convert_left -= gets
+            amount_to += pays
+        else:
+            if convert_left < pays:
+                amount_to += convert_left / Decimal(offer['quality'])
+                convert_left = 0
+                break
+            convert_left -= pays
+            amount_to += gets
+
+    status = 'success'
+    if convert_left:
+        rate = Decimal(offers[-1]['quality'])
+        amount_to += convert_left * rate if not sell else convert_left / rate
+        status = 'attn_not_enough_funds'
+    return {'status': status, 'amount_to': Decimal(amount_to)}
+
+
+class OrderBookTestCase(TestCase):
+
+    def setUp(self):
+        self.book = OrderBook.from_response(offers_info)
+
+    def test_same_as_offers_walk(self):
+        for amount in ['0', '1', '2', '3.3', '4', '8.9', '9', '10', '15.5']:
+            self.assertEqual(self.book.quote(amount),
+                             walk_offers(amount, offers, sell=False))
+        for amount in ['0', '500000', '1000000', '2200000', '5700000',
+                       '6000000', '12345678']:
+            self.assertEqual(self.book.quote(amount, sell=True),
+                             walk_offers(amount, offers, sell=True))
+
+    def test_quote(self):
+        self.assertEqual(self.book.quote('3'),
+                         {'status': 'success',
+                          'amount_to': Decimal('1600000')})
+        self.assertEqual(self.book.quote('10'),
+                         {'status': 'attn_not_enough_funds',
+                          'amount_to': Decimal('6400000')})
+        self.assertEqual(self.book.quote('1600000', sell=True),
+                         {'status': 'success', 'amount_to': Decimal('3')})
+
+    def test_quote_many(self):
+        amounts = ['1', '3', '10']
+        self.assertEqual(self.book.quote_many(amounts),
+                         [self.book.quote(amount) for amount in amounts])
+
+    def test_empty_book(self):
+        book = OrderBook.from_response({'status': 'success', 'offers': []})
+
+        self.assertEqual(book.quote('5'),
+                         {'status': 'no_offers', 'amount_to': Decimal(0)})
+        self.assertEqual(book.quote('5', default_rate='2'),
+                         {'status': 'no_offers', 'amount_to': Decimal(10)})
+
+    @patch('ripple_api.ripple_api.book_offer')
+    def test_convert(self, book_offer_mock):
+        book_offer_mock.return_value = offers_info
+
+        result = convert('8.9', 'XRP', '', 'USD', 'issuer')
+        self.assertEqual(result, walk_offers('8.9', offers, sell=False))
+        result = convert('2200000', 'XRP', '', 'USD', 'issuer', sell=True)
+        self.assertEqual(result, walk_offers('2200000', offers, sell=True))
+
+    @patch('ripple_api.ripple_api.book_offer')
+    def test_convert_empty_book(self, book_offer_mock):
+        empty = {'status': 'success', 'offers': []}
+        book_offer_mock.return_value = empty
+
+        for default_rate in (0, '2'):
+            self.assertEqual(
+                convert('5', 'XRP', '', 'USD', 'issuer',
+                        default_rate=default_rate),
+                OrderBook.from_response(empty).quote(
+                    '5', default_rate=default_rate))
+
+    @patch('ripple_api.ripple_api.book_offer')
+    def test_convert_error(self, book_offer_mock):
+        book_offer_mock.side_effect = RippleApiError('Timeout', '', '')
+
+        self.assertEqual(
+            convert('5', 'XRP', '', 'USD', 'issuer', default_rate='2'),
+            {'status': 'error', 'amount_to': Decimal(10)})
+
+    @patch('ripple_api.ripple_api.book_offer')
+    def test_convert_book_cached(self, book_offer_mock):
+        book_offer_mock.return_value = dict(offers_info,
+                                            ledger_current_index=10)
+
+        with patch('ripple_api.cache._book_cache', LedgerCache(ttl=10)), \
+                patch.object(OrderBook, 'from_response',
+                             wraps=OrderBook.from_response) as parse_mock:
+            convert('3', 'XRP', '', 'USD', 'issuer')
+            result = convert('8.9', 'XRP', '', 'USD', 'issuer')
+
+        self.assertEqual(result, walk_offers('8.9', offers, sell=False))
+        # offers of the same book and ledger are parsed once
+        self.assertEqual(book_offer_mock.call_count, 1)
+        self.assertEqual(parse_mock.call_count, 1)
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from mock import patch
+
+from .management.transaction_processors import dispatch_status_events
+from .models import Transaction, TransactionStatusEvent
+from .signals import transaction_failure_send, transaction_status_changed
+from .tasks import submit_batch_task
+
+
+@override_settings(RIPPLE_API_SIGNAL_OUTBOX=True)
+class SignalOutboxTestCase(TestCase):
+
+    def setUp(self):
+        self.signals = []
+        transaction_status_changed.connect(self.on_status_changed)
+        transaction_failure_send.connect(self.on_failure)
+
+    def tearDown(self):
+        transaction_status_changed.disconnect(self.on_status_changed)
+        transaction_failure_send.disconnect(self.on_failure)
+
+    def on_status_changed(self, sender, instance, old_status, **kwargs):
+        self.signals.append(('changed', instance.pk, old_status,
+                             instance.status))
+
+    def on_failure(self, sender, instance, **kwargs):
+        self.signals.append(('failure', instance.pk))
+
+    def create_transaction(self, **kwargs):
+        return Transaction.objects.create(
+            account='account', destination='destination', currency='XRP',
+            value='1', **kwargs)
+
+    def test_save(self):
+        transaction = self.create_transaction(status=Transaction.PENDING)
+        # new transactions have no status events
+        self.assertFalse(TransactionStatusEvent.objects.exists())
+
+        transaction.status = Transaction.SUBMITTED
+        transaction.save()
+        transaction.status = Transaction.FAILURE
+        transaction.save()
+
+        self.assertEqual(self.signals, [])
+        self.assertEqual(dispatch_status_events(), 2)
+        self.assertEqual(self.signals, [
+            ('changed', transaction.pk, Transaction.PENDING,
+             Transaction.SUBMITTED),
+            ('changed', transaction.pk, Transaction.SUBMITTED,
+             Transaction.FAILURE),
+            ('failure', transaction.pk),
+        ])
+        self.assertFalse(TransactionStatusEvent.objects.exists())
+
+    def test_receiver_error(self):
+        transaction = self.create_transaction(status=Transaction.PENDING)
+        for status in (Transaction.SUBMITTED, Transaction.SUCCESS):
+            transaction.status = status
+            transaction.save()
+
+        def fail(sender, instance, old_status, **kwargs):
+            if instance.status == Transaction.SUCCESS:
+                raise ValueError('receiver failed')
+
+        transaction_status_changed.connect(fail)
+        try:
+            self.assertEqual(dispatch_status_events(), 1)
+        finally:
+            transaction_status_changed.disconnect(fail)
+
+        # failed event is kept for the next run
+        self.assertEqual(
+            list(TransactionStatusEvent.objects.values_list(
+                'status', flat=True)),
+            [Transaction.SUCCESS])
+        self.assertEqual(dispatch_status_events(), 1)
+
+    def test_send_keeps_saved_status(self):
+        transaction = self.create_transaction(status=Transaction.PENDING)
+        for status in (Transaction.SUBMITTED, Transaction.SUCCESS):
+            transaction.status = status
+            transaction.save()
+        statuses = []
+
+        def receiver(sender, instance, old_status, **kwargs):
+            statuses.append((instance.status,
+                             instance.status_tracker.has_changed('status')))
+
+        transaction_status_changed.connect(receiver)
+        try:
+            event = TransactionStatusEvent.objects.select_related(
+                'transaction').order_by('pk')[0]
+            event.send()
+        finally:
+            transaction_status_changed.disconnect(receiver)
+
+        # a save() by the receiver does not take the event's status for a
+        # change, and the loaded transaction is not changed
+        self.assertEqual(statuses, [(Transaction.SUBMITTED, False)])
+        self.assertEqual(event.transaction.status, Transaction.SUCCESS)
+
+    @patch('ripple_api.tasks.submit')
+    def test_bulk_save(self, submit_mock):
+        submit_mock.return_value = {'engine_result': 'tecNO_DST'}
+        transaction = self.create_transaction(status=Transaction.PENDING)
+
+        submit_batch_task([transaction.pk])
+
+        self.assertEqual(self.signals, [])
+        dispatch_status_events()
+        self.assertEqual(self.signals, [
+            ('changed', transaction.pk, Transaction.PENDING,
+             Transaction.FAILURE),
+            ('failure', transaction.pk),
+        ])
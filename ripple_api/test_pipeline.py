@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+import datetime
+
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from mock import Mock, patch
+from requests import ConnectionError
+
+from .management import transaction_pipeline
+from .management.transaction_pipeline import (
+    Pipeline, get_stage_options, run_stage
+)
+from .models import Transaction
+from .tasks import process_stage_task
+
+
+class StagesTestCase(TestCase):
+
+    def setUp(self):
+        self.stages = dict(
+            (stage, Mock(return_value=0))
+            for stage in transaction_pipeline.STAGES)
+        patcher = patch.dict(transaction_pipeline.STAGES, self.stages)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_command_runs_given_stages(self):
+        call_command('process_transactions', 'submit', 'check',
+                     batch_size=5)
+
+        self.stages['submit'].assert_called_once_with(
+            batch_size=5, time_budget=60)
+        self.assertEqual(self.stages['check'].call_count, 1)
+        self.assertFalse(self.stages['retry'].called)
+        self.assertFalse(self.stages['monitor'].called)
+
+    def test_command_runs_all_stages(self):
+        call_command('process_transactions')
+
+        for stage in self.stages.values():
+            self.assertEqual(stage.call_count, 1)
+
+    def test_unknown_stage(self):
+        self.assertRaises(CommandError, call_command, 'process_transactions',
+                          'unknown')
+
+    @override_settings(RIPPLE_API_PIPELINE={'monitor': {'time_budget': 30}})
+    def test_task(self):
+        self.stages['monitor'].return_value = 3
+
+        self.assertEqual(process_stage_task('monitor'), 3)
+        self.stages['monitor'].assert_called_once_with(
+            batch_size=200, time_budget=30)
+        self.assertEqual(get_stage_options('monitor')['interval'], 10)
+
+
+class StageRequestsTestCase(TestCase):
+    """
+    rippled is asked once claimed transactions are committed, so that no
+    rows are locked meanwhile.
+    """
+
+    def setUp(self):
+        # the test itself runs in a database transaction
+        self.depth = len(connection.savepoint_ids)
+        self.requests = []
+
+    def record(self, status):
+        self.requests.append((
+            len(connection.savepoint_ids) - self.depth,
+            list(Transaction.objects.order_by('pk').values_list(
+                'status', flat=True)),
+        ))
+        return status
+
+    def create_transaction(self, **kwargs):
+        return Transaction.objects.create(
+            account='account', destination='destination', currency='XRP',
+            value='1', **kwargs)
+
+    @patch('ripple_api.tasks.get_last_ledger_sequence', Mock(return_value=20))
+    @patch('ripple_api.tasks.sign')
+    def test_return(self, sign_mock):
+        transaction = self.create_transaction(
+            status=Transaction.MUST_BE_RETURN)
+        sign_mock.side_effect = lambda *args, **kwargs: self.record(
+            {'tx_blob': 'blob', 'tx_json': {'hash': 'hash'}})
+
+        run_stage('return')
+
+        self.assertEqual(self.requests, [
+            (0, [Transaction.RETURNING, Transaction.CREATED]),
+        ])
+        returning = Transaction.objects.get(parent=transaction)
+        self.assertEqual(returning.status, Transaction.PENDING)
+        self.assertEqual(returning.hash, 'hash')
+
+    @patch('ripple_api.tasks.get_last_ledger_sequence', Mock(return_value=20))
+    @patch('ripple_api.tasks.sign')
+    def test_retry(self, sign_mock):
+        self.create_transaction(status=Transaction.FAILURE)
+        sign_mock.side_effect = lambda *args, **kwargs: self.record(
+            {'tx_blob': 'blob', 'tx_json': {'hash': 'hash'}})
+
+        run_stage('retry')
+
+        self.assertEqual(self.requests, [
+            (0, [Transaction.FAIL_FIXED, Transaction.CREATED]),
+        ])
+        self.assertEqual(Transaction.objects.get(hash='hash').status,
+                         Transaction.PENDING)
+
+    @patch('ripple_api.tasks.get_last_ledger_sequence', Mock(return_value=20))
+    @patch('ripple_api.tasks.sign')
+    def test_sign_created_left_unsigned(self, sign_mock):
+        old = self.create_transaction(status=Transaction.CREATED)
+        new = self.create_transaction(status=Transaction.CREATED)
+        Transaction.objects.filter(pk=old.pk).update(
+            created=timezone.now() - datetime.timedelta(hours=1))
+        sign_mock.return_value = {'tx_blob': 'blob',
+                                  'tx_json': {'hash': 'hash'}}
+
+        self.assertEqual(run_stage('retry'), 1)
+
+        self.assertEqual(Transaction.objects.get(pk=old.pk).status,
+                         Transaction.PENDING)
+        # may still be signed by the stage which created it
+        self.assertEqual(Transaction.objects.get(pk=new.pk).status,
+                         Transaction.CREATED)
+
+    @patch('ripple_api.tasks.submit')
+    def test_submit(self, submit_mock):
+        self.create_transaction(status=Transaction.PENDING, tx_blob='blob',
+                                hash='hash')
+        submit_mock.side_effect = lambda tx_blob: self.record(
+            {'engine_result': 'tesSUCCESS'})
+
+        run_stage('submit')
+
+        self.assertEqual(self.requests, [(0, [Transaction.SUBMITTING])])
+        self.assertEqual(Transaction.objects.get().status,
+                         Transaction.SUBMITTED)
+
+    @patch('ripple_api.tasks.submit')
+    def test_submit_connection_error(self, submit_mock):
+        self.create_transaction(status=Transaction.PENDING, tx_blob='blob',
+                                hash='hash')
+        submit_mock.side_effect = ConnectionError('connection reset')
+
+        run_stage('submit', time_budget=0.1)
+
+        # submitted again by the next run
+        self.assertEqual(Transaction.objects.get().status,
+                         Transaction.PENDING)
+
+    @patch('ripple_api.management.transaction_pipeline.'
+           'last_validated_ledger_index', Mock(return_value=30))
+    @patch('ripple_api.ripple_api.call_api')
+    def test_check_left_submitting(self, call_api_mock):
+        expired = self.create_transaction(
+            status=Transaction.SUBMITTING, hash='expired',
+            last_ledger_sequence=20)
+        self.create_transaction(
+            status=Transaction.SUBMITTING, hash='current',
+            last_ledger_sequence=40)
+        call_api_mock.return_value = {
+            'validated': True, 'meta': {'TransactionResult': 'tesSUCCESS'}}
+
+        self.assertEqual(run_stage('check'), 1)
+
+        self.assertEqual(call_api_mock.call_count, 1)
+        self.assertEqual(Transaction.objects.get(pk=expired.pk).status,
+                         Transaction.SUCCESS)
+        self.assertEqual(Transaction.objects.get(hash='current').status,
+                         Transaction.SUBMITTING)
+
+
+class PipelineTestCase(TestCase):
+
+    @patch('ripple_api.management.transaction_pipeline.time.time')
+    @patch('ripple_api.management.transaction_pipeline.run_stage')
+    def test_adaptive_sleep(self, run_stage_mock, time_mock):
+        time_mock.return_value = 1000
+        counts = {'submit': [3, 0, 0, 0, 0], 'check': [0, 0]}
+        run_stage_mock.side_effect = \
+            lambda stage, *args: counts[stage].pop(0)
+        pipeline = Pipeline(['submit', 'check'], max_sleep=15)
+
+        # submit found work, check is idle
+        self.assertEqual(pipeline.step(), 5)
+        self.assertEqual(pipeline.delays, {'submit': 5, 'check': 10})
+
+        # idle stages wait twice as long, up to max_sleep
+        time_mock.return_value = 1005
+        self.assertEqual(pipeline.step(), 5)
+        self.assertEqual(pipeline.delays, {'submit': 10, 'check': 10})
+
+        time_mock.return_value = 1010
+        self.assertEqual(pipeline.step(), 5)
+        self.assertEqual(pipeline.delays, {'submit': 10, 'check': 15})
+
+        time_mock.return_value = 1015
+        pipeline.step()
+        self.assertEqual(pipeline.delays, {'submit': 15, 'check': 15})
+        self.assertEqual(run_stage_mock.call_count, 5)
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from mock import patch
+
+from .models import AccountSequence, Transaction
+from .sequence import allocate_sequence, resync_sequence, sequence_consumed
+from .tasks import sign_task, submit_task
+
+
+def account_info_response(sequence):
+    return {'status': 'success', 'account_data': {'Sequence': sequence},
+            'ledger_current_index': 1000}
+
+
+class AllocateSequenceTestCase(TestCase):
+
+    @patch('ripple_api.ripple_api.call_api')
+    def test_allocate(self, call_api_mock):
+        call_api_mock.return_value = account_info_response(10)
+
+        self.assertEqual(
+            [allocate_sequence('account') for _ in range(3)], [10, 11, 12])
+        call_api_mock.assert_called_once()
+        self.assertEqual(AccountSequence.objects.get().sequence, 13)
+
+    @patch('ripple_api.ripple_api.call_api')
+    def test_resync(self, call_api_mock):
+        call_api_mock.return_value = account_info_response(10)
+        allocate_sequence('account')
+        allocate_sequence('other')
+
+        call_api_mock.return_value = account_info_response(20)
+        resync_sequence('account')
+
+        self.assertEqual(allocate_sequence('account'), 20)
+        self.assertEqual(allocate_sequence('other'), 11)
+
+    def test_sequence_consumed(self):
+        for result in ('tesSUCCESS', 'tecPATH_DRY', 'terQUEUED'):
+            self.assertTrue(sequence_consumed(result))
+        for result in ('tefPAST_SEQ', 'terPRE_SEQ', 'temBAD_AMOUNT'):
+            self.assertFalse(sequence_consumed(result))
+
+
+@override_settings(RIPPLE_API_ALLOCATE_SEQUENCE=True)
+class TaskSequenceTestCase(TestCase):
+
+    def create_transaction(self):
+        return Transaction.objects.create(
+            account='account', destination='destination', currency='XRP',
+            value='1')
+
+    @patch('ripple_api.tasks.sign')
+    @patch('ripple_api.ripple_api.call_api')
+    def test_sign_task(self, call_api_mock, sign_mock):
+        call_api_mock.return_value = account_info_response(5)
+        sign_mock.return_value = {'tx_json': {'hash': 'hash'},
+                                  'tx_blob': 'blob'}
+
+        sign_task(self.create_transaction().pk, 'secret')
+        sign_task(self.create_transaction().pk, 'secret')
+
+        self.assertEqual(
+            [call[1]['sequence'] for call in sign_mock.call_args_list],
+            [5, 6])
+
+    @patch('ripple_api.tasks.get_confirmation_tracker')
+    @patch('ripple_api.tasks.submit')
+    def test_submit_task_resyncs(self, submit_mock, get_tracker_mock):
+        AccountSequence.objects.create(account='account', sequence=8)
+        transaction = self.create_transaction()
+
+        submit_mock.return_value = {'engine_result': 'tesSUCCESS'}
+        submit_task(transaction.pk)
+        self.assertEqual(AccountSequence.objects.get().sequence, 8)
+
+        submit_mock.return_value = {'engine_result': 'terPRE_SEQ'}
+        submit_task(transaction.pk)
+        self.assertIsNone(AccountSequence.objects.get().sequence)
@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from mock import patch
+
+from . import signing
+from .ripple_api import sign, trust_set, RippleApiError
+
+
+GENESIS_SECRET = 'snoPBrXtMeMyMHUVTgbuqAfg1SUTb'
+GENESIS_ACCOUNT = 'rHb9CJAWyB4rj91VRWn96DkukG4bwdtyTh'
+GENESIS_PUBLIC_KEY = \
+    '0330E7FC9D56BB25D6893BA3F317AE5BCF33B3291BD63DB32654A313222F7FD020'
+
+ED25519_SECRET = 'sEdSKaCy2JT7JaM7v95H9SxkhP9wS2r'
+ED25519_ACCOUNT = 'rLUEXYuLiQptky37CqLcm9USQpPiz5rkpD'
+ED25519_PUBLIC_KEY = \
+    'ED01FA53FA5A7E77798F882ECE20B1ABC00BB358A9E55A202D0D0676BD0CE37A63'
+
+DESTINATION = 'rMBzp8CgpE441cp5PVyA9rpVV7oT8hP3ys'
+
+# ripple-keypairs test fixtures
+FIXTURE_SECRET = 'sp5fghtJtpUorTwvof1NpDXAzNwf5'
+FIXTURE_ACCOUNT = 'rU6K7V3Po4snVhBBaU29sesqs2qTQJWDw1'
+FIXTURE_PUBLIC_KEY = \
+    '030D58EB48B4420B1F7B9DF55087E0E29FEF0E8468F9A6825B01CA2C361042D435'
+FIXTURE_MESSAGE = 'test message'
+FIXTURE_SIGNATURE = (
+    '30440220583A91C95E54E6A651C47BEC22744E0B101E2C4060E7B08F6341657DAD9B'
+    'C3EE02207D1489C7395DB0188D3A56A977ECBA54B36FA9371B40319655B1B4429E33'
+    'EF2D'
+)
+ED25519_FIXTURE_SIGNATURE = (
+    'CB199E1BFD4E3DAA105E4832EEDFA36413E1F44205E4EFB9E27E826044C21E3E2E84'
+    '8BBC8195E8959BADF887599B7310AD1B7047EF11B682E0D068F73749750E'
+)
+
+# signed OfferCreate from rippled serialization docs
+OFFER = {
+    'Account': 'rMBzp8CgpE441cp5PVyA9rpVV7oT8hP3ys',
+    'Expiration': 595640108,
+    'Fee': '10',
+    'Flags': 524288,
+    'OfferSequence': 1752791,
+    'Sequence': 1752792,
+    'SigningPubKey':
+        '03EE83BB432547885C219634A1BC407A9DB0474145D69737D09CCDC63E1DEE7FE3',
+    'TakerGets': '15000000000',
+    'TakerPays': {
+        'currency': 'USD',
+        'issuer': 'rvYAfWj5gh67oV6fW32ZzP3Aw4Eubs59B',
+        'value': '7072.8',
+    },
+    'TransactionType': 'OfferCreate',
+    'TxnSignature':
+        '30440220143759437C04F7B61F012563AFE90D8DAFC46E86035E1D965A9CED282C'
+        '97D4CE02204CFD241E86F17E011298FC1A39B63386C74306A5DE047E213B0F29EF'
+        'A4571C2C',
+}
+OFFER_BLOB = (
+    '120007220008000024001ABED82A2380BF2C2019001ABED764D55920AC9391400000'
+    '000000000000000000000055534400000000000A20B3C85F482532A9578DBB3950B8'
+    '5CA06594D165400000037E11D60068400000000000000A732103EE83BB432547885C'
+    '219634A1BC407A9DB0474145D69737D09CCDC63E1DEE7FE3744630440220143759437'
+    'C04F7B61F012563AFE90D8DAFC46E86035E1D965A9CED282C97D4CE02204CFD241E86'
+    'F17E011298FC1A39B63386C74306A5DE047E213B0F29EFA4571C2C8114DD76483FACD'
+    'EE26E60D8A586BB58D09F27045C46'
+)
+OFFER_HASH = \
+    '73734B611DDA23D3F5F62E20A173B78AB8406AC5015094DA53F53D39B9EDB06C'
+
+PAYMENT = {
+    'TransactionType': 'Payment',
+    'Destination': DESTINATION,
+    'Amount': '1000000',
+    'Fee': '10000',
+    'Sequence': 7,
+}
+GENESIS_PAYMENT_BLOB = (
+    '12000024000000076140000000000F424068400000000000271073210330E7FC9D56'
+    'BB25D6893BA3F317AE5BCF33B3291BD63DB32654A313222F7FD02074473045022100'
+    'A8F3E367E361F65B4E17E0C9BF9F5B216956AEC25B3BB3EEB7D07DB10DC6105B0220'
+    '0996CB66BFE66872F18932897DD792016F6945E7421E1348088CE3601571EB418114'
+    'B5F762798A53D543A014CAF8B297CFF8F2F937E88314DD76483FACDEE26E60D8A586'
+    'BB58D09F27045C46'
+)
+GENESIS_PAYMENT_HASH = \
+    'B3167A8A9C7510D9349385E8508FEBB4DD91B5304655B69942C27E17F95AE8F3'
+ED25519_PAYMENT_BLOB = (
+    '12000024000000076140000000000F42406840000000000027107321ED01FA53FA5A'
+    '7E77798F882ECE20B1ABC00BB358A9E55A202D0D0676BD0CE37A6374400AA732E6B7'
+    'BA36C83F771300BACE3EBA8B9DDB09819A4E17EBFD3F2DE7D02A44FEB7B58D7B5133'
+    '4EABEA766CCFB2DC38DB13384AA822E6ED40E79BAFD208BF0D8114D28B177E48D9A8'
+    'D057E70F7E464B498367281B988314DD76483FACDEE26E60D8A586BB58D09F27045C'
+    '46'
+)
+ED25519_PAYMENT_HASH = \
+    '60852A0459BD5D10C8C0FA92347362E2A38D9FCA7B3A3D49DB3443D866360E83'
+
+
+class KeypairTestCase(TestCase):
+
+    def test_secp256k1_seed(self):
+        keypair = signing.Keypair.from_seed(GENESIS_SECRET)
+
+        self.assertEqual(keypair.key_type, signing.SECP256K1)
+        self.assertEqual(keypair.public_key, GENESIS_PUBLIC_KEY)
+        self.assertEqual(keypair.account_id, GENESIS_ACCOUNT)
+
+    def test_ed25519_seed(self):
+        keypair = signing.Keypair.from_seed(ED25519_SECRET)
+
+        self.assertEqual(keypair.key_type, signing.ED25519)
+        self.assertEqual(keypair.public_key, ED25519_PUBLIC_KEY)
+        self.assertEqual(keypair.account_id, ED25519_ACCOUNT)
+
+    def test_ripple_keypairs_vectors(self):
+        keypair = signing.Keypair.from_seed(FIXTURE_SECRET)
+        signature = keypair.sign(FIXTURE_MESSAGE)
+
+        self.assertEqual(keypair.public_key, FIXTURE_PUBLIC_KEY)
+        self.assertEqual(keypair.account_id, FIXTURE_ACCOUNT)
+        self.assertEqual(signature.encode('hex').upper(), FIXTURE_SIGNATURE)
+        self.assertTrue(keypair.verify(FIXTURE_MESSAGE, signature))
+
+        keypair = signing.Keypair.from_seed(ED25519_SECRET)
+        signature = keypair.sign(FIXTURE_MESSAGE)
+
+        self.assertEqual(signature.encode('hex').upper(),
+                         ED25519_FIXTURE_SIGNATURE)
+        self.assertTrue(keypair.verify(FIXTURE_MESSAGE, signature))
+        self.assertFalse(keypair.verify(FIXTURE_MESSAGE + '!', signature))
+
+    def test_invalid_seed(self):
+        for seed in ('', 'snoPBrXtMeMyMHUVTgbuqAfg1SUTc', GENESIS_ACCOUNT):
+            self.assertRaises(signing.SigningError,
+                              signing.Keypair.from_seed, seed)
+
+    def test_ed25519_rfc8032_vector(self):
+        secret = ('9d61b19deffd5a60ba844af492ec2cc44449c5697b326919703bac031c'
+                  'ae7f60').decode('hex')
+        signature = signing._ed25519_sign(secret, '')
+
+        self.assertEqual(
+            signing._ed25519_public(secret).encode('hex'),
+            'd75a980182b10ab7d54bfed3c964073a0ee172f3daa62325af021a68f707511a')
+        self.assertEqual(
+            signature.encode('hex'),
+            'e5564300c360ac729086e2cc806e828a84877f1eb8e5d974d873e06522490155'
+            '5fb8821590a33bacc61e39701cf9b46bd25bf5f0595bbe24655141438e7a100b')
+
+    def test_ripemd160(self):
+        self.assertEqual(signing._ripemd160('abc').encode('hex'),
+                         '8eb208f7e05d987a9b044a8e98c6b087f15a0bfc')
+
+
+class SerializeTestCase(TestCase):
+
+    def test_serialize(self):
+        tx_blob = signing.serialize(OFFER)
+
+        self.assertEqual(tx_blob.encode('hex').upper(), OFFER_BLOB)
+        self.assertEqual(signing.transaction_hash(tx_blob), OFFER_HASH)
+
+    def test_verify(self):
+        message = signing.HASH_PREFIX_TRANSACTION_SIGN + \
+            signing.serialize(OFFER, signing=True)
+        signature = OFFER['TxnSignature'].decode('hex')
+
+        self.assertTrue(
+            signing.verify(message, signature, OFFER['SigningPubKey']))
+        self.assertFalse(
+            signing.verify(message + '\x00', signature,
+                           OFFER['SigningPubKey']))
+
+    def test_unknown_field(self):
+        self.assertRaises(signing.SigningError, signing.serialize,
+                          dict(OFFER, Unknown=1))
+
+
+class SignTransactionTestCase(TestCase):
+
+    def test_secp256k1(self):
+        result = signing.sign_transaction(
+            dict(PAYMENT, Account=GENESIS_ACCOUNT), GENESIS_SECRET)
+
+        self.assertEqual(result['tx_blob'], GENESIS_PAYMENT_BLOB)
+        self.assertEqual(result['tx_json']['hash'], GENESIS_PAYMENT_HASH)
+        self.assertEqual(result['tx_json']['SigningPubKey'],
+                         GENESIS_PUBLIC_KEY)
+
+    def test_ed25519(self):
+        result = signing.sign_transaction(
+            dict(PAYMENT, Account=ED25519_ACCOUNT), ED25519_SECRET)
+
+        self.assertEqual(result['tx_blob'], ED25519_PAYMENT_BLOB)
+        self.assertEqual(result['tx_json']['hash'], ED25519_PAYMENT_HASH)
+
+
+@override_settings(RIPPLE_API_LOCAL_SIGNING=True)
+class LocalSigningTestCase(TestCase):
+
+    @patch('ripple_api.ripple_api.call_api')
+    def test_sign(self, call_api_mock):
+        call_api_mock.return_value = {'account_data': {'Sequence': 7}}
+
+        result = sign(GENESIS_ACCOUNT, GENESIS_SECRET, DESTINATION,
+                      '1000000', fee=10000)
+
+        self.assertEqual(result['tx_blob'], GENESIS_PAYMENT_BLOB)
+        # only the sequence is read from rippled
+        self.assertEqual(call_api_mock.call_count, 1)
+        request = call_api_mock.call_args[0][0]
+        self.assertEqual(request['method'], 'account_info')
+        self.assertEqual(request['params'][0]['ledger_index'], 'current')
+
+    @patch('ripple_api.ripple_api.call_api')
+    def test_trust_set_submits_blob(self, call_api_mock):
+        call_api_mock.side_effect = [
+            {'account_data': {'Sequence': 3}},
+            {'status': 'success', 'engine_result': 'tesSUCCESS'},
+        ]
+
+        trust_set(GENESIS_ACCOUNT, GENESIS_SECRET, DESTINATION, 1, 'USD',
+                  fee=10000)
+
+        request = call_api_mock.call_args[0][0]
+        self.assertEqual(request['method'], 'submit')
+        self.assertNotIn('secret', request['params'][0])
+        tx_blob = request['params'][0]['tx_blob']
+        self.assertTrue(tx_blob.startswith('120014'))
+
+    def test_invalid_secret(self):
+        self.assertRaises(RippleApiError, sign, GENESIS_ACCOUNT, 'wrong',
+                          DESTINATION, '1000000')
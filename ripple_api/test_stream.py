@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+import base64
+import datetime
+import hashlib
+import json
+import socket
+import struct
+import threading
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.test import TestCase
+from django.utils import timezone
+
+from mock import Mock, patch
+
+from .models import AccountTxCursor, Transaction
+from .management.transaction_processors import last_validated_ledger_index
+from .ripple_api import RippleApiError
+from .management.transaction_stream import TransactionStream
+
+WEBSOCKET_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+
+class FakeRippled(threading.Thread):
+    """
+    Accepts one WebSocket connection, records received requests, sends
+    `messages` and closes connection.
+    """
+
+    def __init__(self, messages):
+        super(FakeRippled, self).__init__()
+        self.daemon = True
+        self.messages = messages
+        self.requests = []
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.bind(('127.0.0.1', 0))
+        self.server.listen(1)
+        self.url = 'ws://127.0.0.1:%s/' % self.server.getsockname()[1]
+
+    def run(self):
+        connection, _ = self.server.accept()
+        try:
+            self.handshake(connection)
+            self.requests.append(json.loads(self.receive(connection)))
+            for message in self.messages:
+                self.send(connection, json.dumps(message))
+        finally:
+            connection.close()
+            self.server.close()
+
+    def handshake(self, connection):
+        request = ''
+        while '\r\n\r\n' not in request:
+            request += connection.recv(1024)
+        headers = dict(
+            line.split(': ', 1) for line in request.split('\r\n')[1:] if line
+        )
+        accept = base64.b64encode(hashlib.sha1(
+            headers['Sec-WebSocket-Key'] + WEBSOCKET_GUID).digest())
+        connection.sendall(
+            'HTTP/1.1 101 Switching Protocols\r\n'
+            'Upgrade: websocket\r\n'
+            'Connection: Upgrade\r\n'
+            'Sec-WebSocket-Accept: %s\r\n\r\n' % accept)
+
+    def read(self, connection, size):
+        data = ''
+        while len(data) < size:
+            data += connection.recv(size - len(data))
+        return data
+
+    def receive(self, connection):
+        _, length = struct.unpack('!BB', self.read(connection, 2))
+        length &= 0x7f
+        if length == 126:
+            length, = struct.unpack('!H', self.read(connection, 2))
+        elif length == 127:
+            length, = struct.unpack('!Q', self.read(connection, 8))
+        mask = [ord(char) for char in self.read(connection, 4)]
+        payload = self.read(connection, length)
+        return ''.join(chr(ord(char) ^ mask[i % 4])
+                       for i, char in enumerate(payload))
+
+    def send(self, connection, text):
+        if len(text) < 126:
+            header = struct.pack('!BB', 0x81, len(text))
+        else:
+            header = struct.pack('!BBH', 0x81, 126, len(text))
+        connection.sendall(header + text)
+
+
+def stream_payment(tx_hash, ledger_index, validated=True):
+    return {
+        'type': 'transaction',
+        'validated': validated,
+        'engine_result': 'tesSUCCESS',
+        'ledger_index': ledger_index,
+        'meta': {'TransactionResult': 'tesSUCCESS'},
+        'transaction': {
+            'Account': 'account', 'Destination': settings.RIPPLE_ACCOUNT,
+            'TransactionType': 'Payment',
+            'Amount': {'currency': 'CCK', 'issuer': 'p2pay', 'value': '1'},
+            'hash': tx_hash, 'DestinationTag': 7,
+        },
+    }
+
+
+class TransactionStreamTestCase(TestCase):
+
+    @patch('ripple_api.ripple_api.call_api')
+    def test_stream(self, call_api_mock):
+        call_api_mock.return_value = {
+            'ledger_index_min': 1, 'ledger_index_max': 100,
+            'transactions': [{
+                'tx': dict(stream_payment('hash1', 99)['transaction'],
+                           ledger_index=99),
+                'meta': {'TransactionResult': 'tesSUCCESS'},
+            }],
+        }
+        rippled = FakeRippled([
+            {'id': 'ripple_api', 'type': 'response', 'status': 'success',
+             'result': {}},
+            stream_payment('hash1', 99),
+            stream_payment('hash2', 101),
+            stream_payment('hash3', 102, validated=False),
+            {'type': 'ledgerClosed', 'ledger_index': 103},
+        ])
+        rippled.start()
+
+        TransactionStream(settings.RIPPLE_ACCOUNT, url=rippled.url,
+                          timeout=5, reconnect_delay=0).run(reconnects=0)
+        rippled.join(5)
+
+        self.assertEqual(rippled.requests, [{
+            'id': 'ripple_api', 'command': 'subscribe',
+            'accounts': [settings.RIPPLE_ACCOUNT], 'streams': ['ledger'],
+        }])
+        # gap is filled from account_tx
+        self.assertEqual(call_api_mock.call_count, 1)
+        self.assertEqual(
+            sorted(Transaction.objects.values_list('hash', flat=True)),
+            ['hash1', 'hash2'])
+        transaction = Transaction.objects.get(hash='hash2')
+        self.assertEqual(transaction.ledger_index, 101)
+        self.assertEqual(transaction.destination_tag, 7)
+        self.assertEqual(transaction.status, Transaction.RECEIVED)
+
+        cursor = AccountTxCursor.objects.get(account=settings.RIPPLE_ACCOUNT)
+        self.assertEqual(cursor.ledger_index, 102)
+
+    @patch('ripple_api.ripple_api.call_api')
+    def test_ledger_closed_moves_cursor(self, call_api_mock):
+        AccountTxCursor.objects.create(account=settings.RIPPLE_ACCOUNT,
+                                       ledger_index=100)
+        AccountTxCursor.objects.update(
+            updated=timezone.now() - datetime.timedelta(hours=1))
+
+        TransactionStream(settings.RIPPLE_ACCOUNT, url='ws://rippled') \
+            .handle_message({'type': 'ledgerClosed', 'ledger_index': 103})
+
+        # the moved cursor is recent, so rippled is not asked
+        self.assertEqual(last_validated_ledger_index(), 102)
+        self.assertEqual(call_api_mock.call_count, 0)
+
+    @patch('ripple_api.management.transaction_stream.close_old_connections')
+    @patch('ripple_api.management.transaction_stream.monitor_transactions')
+    def test_reconnect_on_errors(self, monitor_mock, close_connections_mock):
+        monitor_mock.side_effect = [
+            RippleApiError('tooBusy', 9, 'The server is too busy'),
+            DatabaseError('server closed the connection unexpectedly'),
+            socket.error('connection reset'),
+        ]
+        connect_mock = Mock()
+
+        TransactionStream(settings.RIPPLE_ACCOUNT, url='ws://rippled',
+                          reconnect_delay=0,
+                          connect=connect_mock).run(reconnects=2)
+
+        self.assertEqual(connect_mock.call_count, 3)
+        self.assertEqual(connect_mock.return_value.close.call_count, 3)
+        self.assertEqual(close_connections_mock.call_count, 1)
@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from mock import patch
+from requests import ConnectionError
+
+from .confirmation import ConfirmationTracker
+from .management.transaction_pipeline import run_stage
+from .models import AccountSequence, Transaction
+from .ripple_api import RippleApiError
+from .signals import transaction_failure_send, transaction_status_changed
+from .tasks import sign_batch_task, submit_batch_task, submit_task
+
+
+def create_transaction(account='account', currency='XRP', **kwargs):
+    return Transaction.objects.create(
+        account=account, destination='destination', currency=currency,
+        value='1', **kwargs)
+
+
+class SignBatchTaskTestCase(TestCase):
+
+    def setUp(self):
+        self.failed = []
+        transaction_failure_send.connect(self.on_failure)
+
+    def tearDown(self):
+        transaction_failure_send.disconnect(self.on_failure)
+
+    def on_failure(self, sender, instance, **kwargs):
+        self.failed.append(instance.pk)
+
+    @override_settings(RIPPLE_API_ALLOCATE_SEQUENCE=True,
+                       RIPPLE_API_LAST_LEDGER_OFFSET=0)
+    @patch('ripple_api.tasks.sign')
+    @patch('ripple_api.tasks.path_find')
+    def test_sign_batch(self, path_find_mock, sign_mock):
+        AccountSequence.objects.create(account='account', sequence=10)
+        AccountSequence.objects.create(account='other', sequence=3)
+        first = create_transaction()
+        no_path = create_transaction(currency='USD')
+        other = create_transaction(account='other')
+        second = create_transaction()
+
+        path_find_mock.return_value = {'alternatives': []}
+        sign_mock.side_effect = lambda *args, **kwargs: {
+            'tx_json': {'hash': 'hash%s' % kwargs['sequence']},
+            'tx_blob': 'blob'}
+
+        signed = sign_batch_task(
+            [first.pk, no_path.pk, other.pk, second.pk, 0], 'secret')
+
+        self.assertEqual(signed, [first.pk, other.pk, second.pk])
+        self.assertEqual(
+            [call[1]['sequence'] for call in sign_mock.call_args_list],
+            [10, 3, 11])
+        self.assertEqual(
+            AccountSequence.objects.get(account='account').sequence, 12)
+
+        transactions = Transaction.objects.in_bulk(
+            [first.pk, no_path.pk, second.pk])
+        self.assertEqual(transactions[first.pk].hash, 'hash10')
+        self.assertEqual(transactions[first.pk].status, Transaction.PENDING)
+        self.assertEqual(transactions[second.pk].hash, 'hash11')
+        self.assertEqual(transactions[no_path.pk].status, Transaction.FAILURE)
+        self.assertEqual(self.failed, [no_path.pk])
+
+    @override_settings(RIPPLE_API_ALLOCATE_SEQUENCE=True,
+                       RIPPLE_API_LAST_LEDGER_OFFSET=0)
+    @patch('ripple_api.tasks.resync_sequence')
+    @patch('ripple_api.tasks.sign')
+    def test_changed_meanwhile(self, sign_mock, resync_sequence_mock):
+        AccountSequence.objects.create(account='account', sequence=10)
+        changed = create_transaction()
+        signed = create_transaction(tx_blob='blob', hash='hash')
+        kept = create_transaction()
+
+        def sign(*args, **kwargs):
+            # returned by another process meanwhile
+            Transaction.objects.filter(pk=changed.pk).update(
+                status=Transaction.RETURNED)
+            return {'tx_json': {'hash': 'hash%s' % kwargs['sequence']},
+                    'tx_blob': 'blob'}
+
+        sign_mock.side_effect = sign
+
+        self.assertEqual(
+            sign_batch_task([changed.pk, signed.pk, kept.pk], 'secret'),
+            [kept.pk])
+
+        # already signed transaction is not signed again
+        self.assertEqual(sign_mock.call_count, 2)
+        statuses = dict(Transaction.objects.values_list('pk', 'status'))
+        self.assertEqual(statuses[changed.pk], Transaction.RETURNED)
+        self.assertEqual(statuses[kept.pk], Transaction.PENDING)
+        self.assertEqual(Transaction.objects.get(pk=changed.pk).hash, '')
+        # sequence of the transaction which is not saved is given back
+        resync_sequence_mock.assert_called_with('account')
+
+
+class SubmitBatchTaskTestCase(TestCase):
+
+    @patch('ripple_api.tasks.get_confirmation_tracker')
+    @patch('ripple_api.tasks.submit')
+    def test_submit_batch(self, submit_mock, get_tracker_mock):
+        results = {
+            'success': {'engine_result': 'tesSUCCESS'},
+            'rejected': {'engine_result': 'tecUNFUNDED_PAYMENT'},
+            'busy': {'engine_result': 'telINSUF_FEE_P'},
+        }
+
+        def submit(tx_blob):
+            if tx_blob == 'offline':
+                raise ConnectionError('connection refused')
+            return results[tx_blob]
+
+        submit_mock.side_effect = submit
+        transactions = [
+            create_transaction(tx_blob=tx_blob, hash=tx_blob,
+                               status=Transaction.PENDING)
+            for tx_blob in ('success', 'offline', 'rejected', 'busy')
+        ]
+        changes = []
+        receiver = lambda sender, instance, old_status, **kwargs: \
+            changes.append((instance.hash, old_status, instance.status))
+        transaction_status_changed.connect(receiver)
+        try:
+            submit_batch_task([transaction.pk for transaction in transactions])
+        finally:
+            transaction_status_changed.disconnect(receiver)
+
+        statuses = dict(Transaction.objects.values_list('hash', 'status'))
+        self.assertEqual(statuses, {
+            'success': Transaction.SUBMITTED,
+            'offline': Transaction.PENDING,
+            'rejected': Transaction.FAILURE,
+            'busy': Transaction.SUBMITTED,
+        })
+        self.assertEqual(changes, [
+            ('success', Transaction.PENDING, Transaction.SUBMITTED),
+            ('rejected', Transaction.PENDING, Transaction.FAILURE),
+            ('busy', Transaction.PENDING, Transaction.SUBMITTED),
+        ])
+        track_mock = get_tracker_mock.return_value.track
+        self.assertEqual(
+            [call[0] for call in track_mock.call_args_list], [('busy', None)])
+
+    @patch('ripple_api.tasks.get_confirmation_tracker')
+    @patch('ripple_api.tasks.submit')
+    def test_changed_meanwhile(self, submit_mock, get_tracker_mock):
+        submitted = create_transaction(tx_blob='submitted',
+                                       status=Transaction.SUBMITTED)
+        changed = create_transaction(tx_blob='changed',
+                                     status=Transaction.PENDING)
+
+        def submit(tx_blob):
+            # checked by another process meanwhile
+            Transaction.objects.filter(pk=changed.pk).update(
+                status=Transaction.SUCCESS)
+            return {'engine_result': 'telINSUF_FEE_P'}
+
+        submit_mock.side_effect = submit
+        changes = []
+        receiver = lambda sender, instance, old_status, **kwargs: \
+            changes.append(instance.pk)
+        transaction_status_changed.connect(receiver)
+        try:
+            submit_batch_task([submitted.pk, changed.pk])
+        finally:
+            transaction_status_changed.disconnect(receiver)
+
+        # only pending transactions are submitted
+        submit_mock.assert_called_once_with('changed')
+        self.assertEqual(Transaction.objects.get(pk=changed.pk).status,
+                         Transaction.SUCCESS)
+        self.assertEqual(changes, [])
+        self.assertFalse(get_tracker_mock.return_value.track.called)
+
+
+class HeldTransactionTestCase(TestCase):
+
+    @override_settings(RIPPLE_API_ALLOCATE_SEQUENCE=True)
+    @patch('ripple_api.tasks.get_confirmation_tracker')
+    @patch('ripple_api.tasks.submit')
+    @patch('ripple_api.ripple_api.call_api')
+    def test_queued_then_validated(self, call_api_mock, submit_mock,
+                                   get_tracker_mock):
+        tracker = ConfirmationTracker(poll_interval=None)
+        get_tracker_mock.return_value = tracker
+        AccountSequence.objects.create(account='account', sequence=9)
+        transaction = create_transaction(tx_blob='blob', hash='hash',
+                                         last_ledger_sequence=120,
+                                         status=Transaction.PENDING)
+
+        submit_mock.return_value = {'engine_result': 'terQUEUED'}
+        submit_task(transaction.pk)
+
+        # queued transaction uses its sequence and may still be validated
+        self.assertEqual(Transaction.objects.get().status,
+                         Transaction.SUBMITTED)
+        self.assertEqual(AccountSequence.objects.get().sequence, 9)
+        self.assertEqual(tracker.pending(), ['hash'])
+
+        # not validated yet, then validated in a later ledger
+        call_api_mock.side_effect = [
+            {'ledger_index': 110},
+            RippleApiError('txnNotFound', 29, 'Transaction not found.'),
+            {'ledger_index': 111},
+            {'hash': 'hash', 'validated': True,
+             'meta': {'TransactionResult': 'tesSUCCESS'}},
+        ]
+        tracker.poll()
+        self.assertEqual(Transaction.objects.get().status,
+                         Transaction.SUBMITTED)
+        tracker.poll()
+        run_stage('retry')
+
+        self.assertEqual(Transaction.objects.get().status,
+                         Transaction.SUCCESS)
+        self.assertEqual(submit_mock.call_count, 1)
@@ -66,7 +66,7 @@ class TrustSetTestCase(TestCase):
     def setUp(self):
         pass
 
-    @patch('requests.post')
+    @patch('requests.Session.post')
     def test_trust_set_error(self, post_mock):
         """Test if RippleApiError raised in case when secret is wrong"""
         response = Response()
@@ -81,7 +81,7 @@ class TrustSetTestCase(TestCase):
                 1, u"USD", flags={"AllowRipple": False, "Freeze": True}
             )
 
-    @patch('requests.post')
+    @patch('requests.Session.post')
     def test_trust_set_success(self, post_mock):
         response = Response()
         response._content = json.dumps({u"result": data})
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+from decimal import Decimal
+
+from django.conf import settings
+from django.test import TestCase
+
+from mock import patch
+
+import ripple_api
+from .test_is_trust import data
+from .trust_lines import TrustLineIndex, line_trusts
+
+
+ISSUER = u'rhhPzptf4EdiRRopSVC3AEbHwDa9df8y2i'
+OTHER_ISSUER = u'rp2PaYDxVwDvaZVLEQv7bHhoFQEyX1mEx7'
+UNTRUSTED = u'rJobmmpNqozqY7MzwGkRs1VLEBJ7H5Pjrp'
+
+
+class TrustLineIndexTestCase(TestCase):
+
+    def setUp(self):
+        self.index = TrustLineIndex(data['lines'] + [{
+            u'account': ISSUER,
+            u'currency': u'EUR',
+            u'limit': u'0.30000000000000001',
+            u'balance': u'0',
+            u'freeze_peer': True,
+            u'authorized': True,
+        }])
+
+    def test_lookup(self):
+        self.assertEqual(len(self.index), 5)
+        self.assertEqual(self.index.balance(ISSUER, 'USD'),
+                         Decimal('1.759565201742073'))
+        self.assertEqual(self.index.limit(OTHER_ISSUER, 'USD'),
+                         Decimal('10000'))
+        self.assertIsNone(self.index.get(ISSUER, 'JPY'))
+        self.assertIsNone(self.index.limit(ISSUER, 'JPY'))
+
+    def test_trusts(self):
+        self.assertTrue(self.index.trusts(ISSUER))
+        self.assertFalse(self.index.trusts(UNTRUSTED))
+        # every issuer has its own line in the same currency
+        self.assertFalse(self.index.trusts(ISSUER, 'USD', 10))
+        self.assertTrue(self.index.trusts(OTHER_ISSUER, 'USD', 10))
+        self.assertFalse(self.index.trusts(ISSUER, 'JPY'))
+
+    def test_trusts_exact(self):
+        # both limits are 0.3 as floats
+        self.assertTrue(
+            self.index.trusts(ISSUER, 'EUR', '0.30000000000000001'))
+        self.assertFalse(
+            self.index.trusts(ISSUER, 'EUR', '0.30000000000000002'))
+        self.assertTrue(self.index.trusts(ISSUER, 'EUR', 0.3))
+        self.assertTrue(self.index.trusts(ISSUER, 'EUR', Decimal('0.3')))
+
+    def test_trusts_float_precision(self):
+        # str of the float is '1234567.12346'
+        self.assertFalse(
+            line_trusts({'limit': '1234567.12346'}, 1234567.1234649))
+        self.assertTrue(
+            line_trusts({'limit': '1234567.1234649'}, 1234567.1234649))
+
+    def test_flags(self):
+        self.assertTrue(self.index.is_frozen(ISSUER, 'EUR'))
+        self.assertFalse(self.index.is_frozen(ISSUER, 'USD'))
+        self.assertTrue(self.index.is_no_ripple(ISSUER, 'CCK', by_peer=True))
+        self.assertFalse(self.index.is_no_ripple(ISSUER, 'CCK'))
+        self.assertTrue(self.index.is_authorized(ISSUER, 'EUR'))
+        self.assertFalse(self.index.is_authorized(ISSUER, 'EUR', by_peer=True))
+        self.assertFalse(self.index.is_frozen(ISSUER, 'JPY'))
+
+    @patch('ripple_api.ripple_api.call_api')
+    def test_trust_line_index(self, call_api_mock):
+        call_api_mock.return_value = data
+
+        index = ripple_api.trust_line_index(
+            u'rJmEYVEB7Bw16Kt9FYHK74Xrgery6gN6AB',
+            servers=settings.RIPPLE_API_DATA)
+
+        self.assertEqual(len(index), 4)
+        self.assertTrue(index.trusts(OTHER_ISSUER, 'CCK', 1000000))
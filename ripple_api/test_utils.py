@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+from django.test import TestCase
+
+from mock import patch
+
+from . import utils
+from .utils import (
+    decode_account_id,
+    encode_account_id,
+    ripple_address_is_valid,
+    validate_many
+)
+
+
+GENESIS_ADDRESS = 'rHb9CJAWyB4rj91VRWn96DkukG4bwdtyTh'
+GENESIS_ACCOUNT_ID = 'B5F762798A53D543A014CAF8B297CFF8F2F937E8'.decode('hex')
+SEED = 'snoPBrXtMeMyMHUVTgbuqAfg1SUTb'
+
+
+class AccountIdTestCase(TestCase):
+
+    def test_encode_decode(self):
+        self.assertEqual(encode_account_id(GENESIS_ACCOUNT_ID),
+                         GENESIS_ADDRESS)
+        self.assertEqual(decode_account_id(GENESIS_ADDRESS),
+                         GENESIS_ACCOUNT_ID)
+        self.assertEqual(encode_account_id('\0' * 20),
+                         'rrrrrrrrrrrrrrrrrrrrrhoLvTp')
+        self.assertEqual(decode_account_id('rrrrrrrrrrrrrrrrrrrrrhoLvTp'),
+                         '\0' * 20)
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, encode_account_id, '\0' * 21)
+        for address in (
+                GENESIS_ADDRESS[:-1] + 'j',  # checksum
+                GENESIS_ADDRESS[:-1] + '0',  # not base58
+                'r' + GENESIS_ADDRESS,  # extra zero byte
+                SEED,  # other prefix
+                '',
+                None):
+            self.assertRaises(ValueError, decode_account_id, address)
+
+
+class AddressIsValidTestCase(TestCase):
+
+    def setUp(self):
+        utils._address_cache.clear()
+
+    def test_valid(self):
+        self.assertEqual(ripple_address_is_valid(GENESIS_ADDRESS),
+                         GENESIS_ADDRESS)
+        self.assertEqual(ripple_address_is_valid(unicode(GENESIS_ADDRESS)),
+                         GENESIS_ADDRESS)
+        self.assertFalse(ripple_address_is_valid(SEED))
+        self.assertFalse(ripple_address_is_valid(GENESIS_ADDRESS.lower()))
+        self.assertFalse(ripple_address_is_valid(None))
+
+    @patch('ripple_api.utils._address_is_valid')
+    def test_cache(self, address_is_valid_mock):
+        address_is_valid_mock.return_value = True
+
+        ripple_address_is_valid(GENESIS_ADDRESS)
+        ripple_address_is_valid(GENESIS_ADDRESS)
+
+        self.assertEqual(address_is_valid_mock.call_count, 1)
+
+    @patch.object(utils._address_cache, 'maxsize', 2)
+    def test_cache_eviction(self):
+        for address in ('a', 'b', 'a', 'c'):
+            ripple_address_is_valid(address)
+
+        # 'b' is the least recently used
+        self.assertIsNone(utils._address_cache.get('b'))
+        self.assertIs(utils._address_cache.get('a'), False)
+
+    def test_validate_many(self):
+        addresses = [GENESIS_ADDRESS, SEED, GENESIS_ADDRESS, None, []]
+
+        with patch('ripple_api.utils._address_is_valid',
+                   wraps=utils._address_is_valid) as address_is_valid_mock:
+            self.assertEqual(
+                validate_many(addresses),
+                [GENESIS_ADDRESS, False, GENESIS_ADDRESS, False, False])
+
+        self.assertEqual(address_is_valid_mock.call_count, 3)
@@ -1,19 +1,35 @@
 # -*- coding: utf-8 -*-
 
 from decimal import Decimal
-import copy
-import time
 import logging
-import os
-from distutils.util import strtobool
 
-from ripple_api import call_api, tx
+from concurrent.futures import Future
+
+from confirmation import get_confirmation_tracker
+from ripple_api import RippleApiError, estimate_fee, sign_and_submit
 
 logger = logging.getLogger(__name__)
 
 
+def _then(future, function):
+    """
+    Returns future completed with `function` of done `future`, without
+    waiting for it.
+    """
+    result = Future()
+
+    def callback(done):
+        try:
+            result.set_result(function(done))
+        except Exception, e:
+            result.set_exception(e)
+
+    future.add_done_callback(callback)
+    return result
+
+
 def sell_all(buy_expected, sell_needed,
-             account, secret, timeout=5, fee=10000,
+             account, secret, timeout=5, fee=None,
              default_precission=Decimal('0.00000001'),
              servers=None):
     """
@@ -34,7 +50,7 @@ def sell_all(buy_expected, sell_needed,
     account            - ripple account
     secret             - ripple secret
     timeout            - trade timeout (default: 5)
-    fee                - ripple fee (default: 10000)
+    fee                - ripple fee (default: estimated)
     default_precission - compare precission(default: 0.00000001)
     servers            - ripple servers (default: none)
 
@@ -44,25 +60,42 @@ def sell_all(buy_expected, sell_needed,
         'sold':        - float  - the amount sold
         'bought':      - float  - the amount bought
     }
+    """
+    return sell_all_future(
+        buy_expected, sell_needed, account, secret, timeout=timeout, fee=fee,
+        default_precission=default_precission, servers=servers).result()
+
 
+def sell_all_future(buy_expected, sell_needed,
+                    account, secret, timeout=5, fee=None,
+                    default_precission=Decimal('0.00000001'),
+                    servers=None):
+    """
+    Same as `sell_all`, but returns ``concurrent.futures.Future`` of the
+    result instead of waiting for the offer to be validated.
     """
     logger.info('Trading %s %s -> %s %s' %
                 (sell_needed['value'], sell_needed['currency'],
                  buy_expected['value'], buy_expected['currency']))
     offer = sell_all_or_cancel(buy_expected, sell_needed, account, secret,
                                timeout=timeout, fee=fee, servers=servers)
-    offer_result = get_trade_result(offer, timeout, servers)
-    offer_result['sell_amount_left'] = Decimal(
-        "%.12f" % float(sell_needed['value'] - offer_result['sold']))
 
-    if offer_result['sold'] >= sell_needed['value'] - default_precission:
-        logger.info("Trade fully funded")
-    elif offer_result['sold']:
-        logger.info("Trade partially happen")
-    else:
-        logger.info("Trade didn't happen")
+    def trade_done(future):
+        offer_result = future.result()
+        offer_result['sell_amount_left'] = Decimal(
+            "%.12f" % float(sell_needed['value'] - offer_result['sold']))
+
+        if offer_result['sold'] >= sell_needed['value'] - default_precission:
+            logger.info("Trade fully funded")
+        elif offer_result['sold']:
+            logger.info("Trade partially happen")
+        else:
+            logger.info("Trade didn't happen")
+
+        return offer_result
 
-    return offer_result
+    return _then(get_trade_result_future(offer, timeout, servers),
+                 trade_done)
 
 
 def get_trade_result(created_offer, timeout, servers=None):
@@ -79,6 +112,14 @@ def get_trade_result(created_offer, timeout, servers=None):
         'bought':      - float - the amount bought
     }
 
+    """
+    return get_trade_result_future(created_offer, timeout, servers).result()
+
+
+def get_trade_result_future(created_offer, timeout, servers=None):
+    """
+    Same as `get_trade_result`, but returns ``concurrent.futures.Future`` of
+    the result instead of waiting for the offer to be validated.
     """
     # check offer result
     if not created_offer or created_offer['engine_result'] != 'tesSUCCESS':
@@ -87,18 +128,23 @@ def get_trade_result(created_offer, timeout, servers=None):
             created_offer['engine_result'] if created_offer \
             else 'Offer was not created'
         logger.info(status_msg)
-        return {'status': 'error',
-                'status_msg': status_msg,
-                'sold': 0,
-                'bought': 0}
+        result = Future()
+        result.set_result({'status': 'error',
+                           'status_msg': status_msg,
+                           'sold': 0,
+                           'bought': 0})
+        return result
 
     logger.info("Offer created: %s" % created_offer)
     tr_hash = created_offer['tx_json']['hash']
     logger.info("Transaction: %s" % tr_hash)
 
     # check transaction result
-    transaction = get_transaction_result(tr_hash, timeout, servers)
+    return _then(get_transaction_result_future(tr_hash, timeout, servers),
+                 lambda future: _trade_result(future.result()))
+
 
+def _trade_result(transaction):
     # if trade didn't happen
     if 'AffectedNodes' not in transaction.get('meta', ''):
         status_msg = "Offer was not identified."
@@ -126,29 +172,41 @@ def get_transaction_result(tr_hash, timeout, servers, attempts=5, wait=2):
 
     takes:
         tr_hash  - str  - ripple transaction hash
-        timeout  - int  - transaction timeout
+        timeout  - int  - request timeout
         servers  - list - ripple servers
-        attempts - int  - number of attempts to check if trade happened
-        wait     - int  - seconds to wait until next check
+        attempts - int  - `attempts` * `wait` is the number of seconds to
+                          wait for the transaction to be validated
+        wait     - int
     returns:
-        transaction result if it's happened or None
+        transaction result if it's validated or {}
 
     """
-    transaction = {}
+    return get_transaction_result_future(
+        tr_hash, timeout, servers, attempts=attempts, wait=wait).result()
 
-    # wait for ripple path find
-    if not strtobool(os.environ.get("TESTING", "no")):
-        time.sleep(wait)
 
-    for i in xrange(attempts):
-        transaction = tx(tr_hash, timeout=timeout, servers=servers)
-        # check if offer happened
-        if 'AffectedNodes' in transaction:
-            break
-        # wait for ripple path find a little more
-        if not strtobool(os.environ.get("TESTING", "no")):
-            time.sleep(wait)
-    return transaction
+def get_transaction_result_future(tr_hash, timeout, servers, attempts=5,
+                                  wait=2):
+    """
+    Same as `get_transaction_result`, but returns
+    ``concurrent.futures.Future`` of the result. The transaction is checked
+    by the confirmation tracker together with other tracked transactions of
+    the process, the caller is not blocked.
+    """
+    def transaction_result(future):
+        if future.cancelled():
+            logger.info("Transaction %s was not validated in time" %
+                        tr_hash)
+            return {}
+        try:
+            return future.result()
+        except RippleApiError, e:
+            logger.info("Transaction %s was not validated: %s" % (tr_hash, e))
+            return {}
+
+    tracker = get_confirmation_tracker(servers, timeout)
+    return _then(tracker.track(tr_hash, timeout=attempts * wait),
+                 transaction_result)
 
 
 def get_sold_received(transaction):
@@ -207,7 +265,7 @@ def restore_taker_values(taker):
 
 def sell_all_or_cancel(taker_pays, taker_gets,
                        account, secret,
-                       timeout, fee=10000, servers=None):
+                       timeout, fee=None, servers=None):
 
     return create_offer(
         taker_pays, taker_gets, account, secret, timeout, fee,
@@ -216,7 +274,7 @@ def sell_all_or_cancel(taker_pays, taker_gets,
 
 def create_offer(taker_pays, taker_gets,
                  account, secret,
-                 timeout, fee=10000, flags=0, servers=None):
+                 timeout, fee=None, flags=0, servers=None):
     """
     Create trading offer.
 
@@ -234,7 +292,7 @@ def create_offer(taker_pays, taker_gets,
         account    - ripple account
         secret     - ripple secret
         timeout    - trade timeout
-        fee        - ripple fee (default: 10000)
+        fee        - ripple fee (default: estimated)
         flags      - trade flags (default: 0)
         servers    - ripple servers (default: none)
 
@@ -245,27 +303,20 @@ def create_offer(taker_pays, taker_gets,
 
     """
 
+    if fee is None:
+        fee = estimate_fee(servers=servers, timeout=timeout)
     taker_pays = taker_pays.copy()
     taker_gets = taker_gets.copy()
     taker_pays['value'] = "%.12f" % taker_pays['value']
     taker_gets['value'] = "%.12f" % taker_gets['value']
     offer = {
-        "method": "submit",
-        "params": [{
-            "secret": secret,
-            "tx_json": {
-                "TransactionType": "OfferCreate",
-                "Fee": str(fee),
-                "Flags": flags,
-                "Account": account,
-                "TakerPays": taker_pays,
-                "TakerGets": taker_gets,
-            },
-        }]
+        "TransactionType": "OfferCreate",
+        "Fee": str(fee),
+        "Flags": flags,
+        "Account": account,
+        "TakerPays": taker_pays,
+        "TakerGets": taker_gets,
     }
 
-    # make offer copy and remove secret
-    log_offer = copy.deepcopy(offer)
-    log_offer['params'][0].pop('secret', None)
-    logger.info('Trade offer: %s' % log_offer)
-    return call_api(offer, timeout=timeout, servers=servers)
+    logger.info('Trade offer: %s' % offer)
+    return sign_and_submit(offer, secret, timeout=timeout, servers=servers)
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+Trust lines of an account indexed once for repeated checks.
+"""
+
+# system imports:
+from decimal import Decimal
+
+
+def _decimal(value):
+    # repr of a float is the shortest string read back as the same float,
+    # e.g. '0.1', str rounds it to 12 significant digits
+    if isinstance(value, float):
+        return Decimal(repr(value))
+    return Decimal(value)
+
+
+def line_trusts(line, limit=0):
+    """
+    Checks if limit of trust `line` is at least `limit`.
+    """
+    return _decimal(limit) <= Decimal(line['limit'])
+
+
+class TrustLineIndex(object):
+    """
+    Trust lines keyed by peer and currency, so every check is a dict lookup
+    instead of a walk over the lines. Amounts are compared as `Decimal`.
+
+    Params:
+        `lines`:
+            Lines as returned by `account_lines`, e.g. from
+            `iter_account_lines`.
+    """
+
+    def __init__(self, lines):
+        self.lines = {}
+        # peer -> currencies of its lines
+        self.currencies = {}
+
+        for line in lines:
+            self.lines[(line['account'], line['currency'])] = line
+            self.currencies.setdefault(line['account'], set()).add(
+                line['currency'])
+
+    def __len__(self):
+        return len(self.lines)
+
+    def get(self, peer, currency):
+        """
+        Returns line with `peer` in `currency` or None.
+        """
+        return self.lines.get((peer, currency))
+
+    def balance(self, peer, currency):
+        """
+        Returns balance of line with `peer` in `currency` or None.
+        """
+        line = self.get(peer, currency)
+        return Decimal(line['balance']) if line is not None else None
+
+    def limit(self, peer, currency):
+        """
+        Returns limit the account trusts `peer` with in `currency` or None.
+        """
+        line = self.get(peer, currency)
+        return Decimal(line['limit']) if line is not None else None
+
+    def trusts(self, peer, currency='', limit=0):
+        """
+        Checks if the account trusts `peer` in `currency` with at least
+        `limit`. Without `currency` checks if there is any line with `peer`.
+        """
+        if not currency:
+            return peer in self.currencies
+        line = self.get(peer, currency)
+        return line is not None and line_trusts(line, limit)
+
+    def is_frozen(self, peer, currency):
+        """
+        Checks if line with `peer` in `currency` is frozen by either side.
+        """
+        line = self.get(peer, currency) or {}
+        return bool(line.get('freeze') or line.get('freeze_peer'))
+
+    def is_no_ripple(self, peer, currency, by_peer=False):
+        """
+        Checks if the account, or `peer` if `by_peer`, has set no ripple flag
+        on line in `currency`.
+        """
+        line = self.get(peer, currency) or {}
+        return bool(line.get('no_ripple_peer' if by_peer else 'no_ripple'))
+
+    def is_authorized(self, peer, currency, by_peer=False):
+        """
+        Checks if the account, or `peer` if `by_peer`, has authorized line
+        in `currency`.
+        """
+        line = self.get(peer, currency) or {}
+        return bool(line.get('peer_authorized' if by_peer else 'authorized'))
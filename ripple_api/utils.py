@@ -1,5 +1,139 @@
 # -*- coding: utf-8 -*-
+from binascii import hexlify, unhexlify
+from collections import OrderedDict
 from hashlib import sha256
+import threading
+
+
+RIPPLE_ALPHABET = 'rpshnaf39wBUDNEGHJKLM4PQRST7VWXYZ2bcdeCg65jkm8oFqi1tuvAxyz'
+
+# value of every base58 digit
+_DIGITS = dict((char, value) for value, char in enumerate(RIPPLE_ALPHABET))
+
+ACCOUNT_ID_PREFIX = '\0'
+ACCOUNT_ID_LENGTH = 20
+
+# addresses are 25 bytes long: prefix, account id and checksum
+_MIN_ADDRESS_LENGTH = 25
+_MAX_ADDRESS_LENGTH = 35
+
+# number of addresses `ripple_address_is_valid` remembers
+ADDRESS_CACHE_SIZE = 4096
+
+
+class _LRUCache(object):
+    """
+    Thread-safe mapping of at most `maxsize` entries, least recently used
+    ones are evicted first.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._entries.pop(key)
+            except KeyError:
+                return default
+            self._entries[key] = value
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = value
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_address_cache = _LRUCache(ADDRESS_CACHE_SIZE)
+
+
+def _checksum(data):
+    return sha256(sha256(data).digest()).digest()[:4]
+
+
+def _decode_base58(string):
+    """
+    Decodes base58 `string` to bytes, leading zero digits are kept as zero
+    bytes. Raises ``ValueError`` if it has non base58 characters.
+    """
+    digits = _DIGITS
+    n = 0
+    try:
+        for char in string:
+            n = n * 58 + digits[char]
+    except KeyError:
+        raise ValueError('Invalid base58 character in %r' % string)
+    zeros = len(string) - len(string.lstrip(RIPPLE_ALPHABET[0]))
+    if not n:
+        return '\0' * zeros
+    h = '%x' % n
+    return '\0' * zeros + unhexlify('0' * (len(h) % 2) + h)
+
+
+def encode_base58check(data):
+    """
+    Encodes binary ``data`` as ripple base58 string with checksum.
+    """
+    data += _checksum(data)
+    n = int(hexlify(data), 16) if data else 0
+    chars = []
+    while n:
+        n, remainder = divmod(n, 58)
+        chars.append(RIPPLE_ALPHABET[remainder])
+    # leading zero bytes are kept as leading zero digits
+    zeros = len(data) - len(data.lstrip('\0'))
+    return RIPPLE_ALPHABET[0] * zeros + ''.join(reversed(chars))
+
+
+def decode_base58check(string):
+    """
+    Decodes ripple base58 ``string`` and returns binary data without
+    checksum. Raises ``ValueError`` if string or its checksum is invalid.
+    """
+    data = _decode_base58(string)
+    if len(data) < 5 or data[-4:] != _checksum(data[:-4]):
+        raise ValueError('Invalid checksum of %s' % string)
+    return data[:-4]
+
+
+def encode_account_id(account_id):
+    """
+    Returns ripple address of 20 bytes long binary ``account_id``.
+    """
+    if len(account_id) != ACCOUNT_ID_LENGTH:
+        raise ValueError('Invalid account id %r' % account_id)
+    return encode_base58check(ACCOUNT_ID_PREFIX + account_id)
+
+
+def decode_account_id(address):
+    """
+    Returns 20 bytes long binary account id of ripple ``address``. Raises
+    ``ValueError`` if address is invalid.
+    """
+    if not isinstance(address, basestring) or \
+            not _MIN_ADDRESS_LENGTH <= len(address) <= _MAX_ADDRESS_LENGTH:
+        raise ValueError('Invalid address %r' % address)
+    data = decode_base58check(address)
+    if len(data) != ACCOUNT_ID_LENGTH + 1 or data[0] != ACCOUNT_ID_PREFIX:
+        raise ValueError('Invalid address %r' % address)
+    return data[1:]
+
+
+def _address_is_valid(address):
+    try:
+        decode_account_id(address)
+    except ValueError:
+        return False
+    return True
 
 
 def ripple_address_is_valid(address):
@@ -7,27 +141,32 @@ def ripple_address_is_valid(address):
     Checks if ripple ``address`` is valid. Return ``address`` or ``False``
 
     """
-    digits58 = 'rpshnaf39wBUDNEGHJKLM4PQRST7VWXYZ2bcdeCg65jkm8oFqi1tuvAxyz'
+    if not isinstance(address, basestring):
+        return False
+    valid = _address_cache.get(address)
+    if valid is None:
+        valid = _address_is_valid(address)
+        _address_cache.set(address, valid)
+    return address if valid else False
 
-    def to_bytes(n, length, endianess='big'):
-        h = '%x' % n
-        s = ('0'*(len(h) % 2) + h).zfill(length*2).decode('hex')
-        return s if endianess == 'big' else s[::-1]
 
-    def decode_base58(bc, length):
-        n = 0
-        for char in bc:
-            n = n * 58 + digits58.index(char)
-        return to_bytes(n, length, 'big')
+def validate_many(addresses):
+    """
+    Checks ripple ``addresses``. Returns list with an address or ``False``
+    for every one of them, like ``ripple_address_is_valid`` does.
 
-    def check_bc(bc):
+    Every distinct address is decoded once, bypassing the cache of
+    ``ripple_address_is_valid`` so that large batches do not evict it.
+    """
+    checked = {}
+    result = []
+    for address in addresses:
         try:
-            bcbytes = decode_base58(bc, 25)
-        except ValueError:
-            return False
-        return bcbytes[-4:] == sha256(sha256(bcbytes[:-4]).digest()).digest()[:4]
-
-    if check_bc(address):
-        return address
-    else:
-        return False
+            valid = checked[address]
+        except KeyError:
+            valid = checked[address] = _address_is_valid(address)
+        except TypeError:
+            # unhashable
+            valid = False
+        result.append(address if valid else False)
+    return result
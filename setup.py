@@ -8,8 +8,9 @@ setup(
     name='django-ripple_api',
     version='0.0.49',
     packages=find_packages(),
-    requires=['python (>= 2.7)', 'requests', 'django_model_utils'],
-    install_requires=['requests>=2.6.0', 'django-model-utils', 'South==1.0.2'],
+    requires=['python (>= 2.7)', 'requests'],
+    install_requires=['requests>=2.6.0', 'South==1.0.2', 'ecdsa>=0.18',
+                      'futures>=3.0; python_version < "3"'],
     tests_require=['mock'],
     description='Python wrapper for the Ripple API',
     long_description=open(join(dirname(__file__), 'README.rst')).read(),